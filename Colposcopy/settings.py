@@ -31,9 +31,39 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Переиспользование соединений: сколько секунд держать соединение открытым между запросами
+        # (0 — закрывать после каждого запроса). Перед повторным использованием соединение проверяется.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
     }
 }
 
+# Режим пулера перед PostgreSQL. DB_POOL_MODE=transaction — для pgbouncer в transaction pooling:
+# соединение сервера меняется между транзакциями, поэтому серверные курсоры (.iterator())
+# и подготовленные выражения psycopg 3 отключаются.
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'session')
+if DB_POOL_MODE == 'transaction':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    try:
+        import psycopg  # noqa: F401 — Django 4.2 выбирает psycopg 3, если он установлен
+    except ImportError:
+        pass  # psycopg2 не использует серверные prepared statements
+    else:
+        DATABASES['default']['OPTIONS'] = {'prepare_threshold': None}
+
+# Реплика для чтения (main/db_router.py): read-only представления читают с нее, записи и
+# все остальное — с default. В тестах реплика — зеркало default (TEST MIRROR)
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['main.db_router.ReplicaRouter']
+# Сколько секунд после записи клиент читает с default (отставание реплики)
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -41,6 +71,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
@@ -48,6 +79,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.RequestMetricsMiddleware',
+    'main.middleware.CompressionMiddleware',
+    'main.db_router.ReplicaRoutingMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -61,6 +95,79 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'Colposcopy.urls'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'main.instrumentation.InstrumentedLocMemCache',
+    }
+}
+
+# Наборы данных в памяти воркера (main/local_cache.py): без LISTEN/NOTIFY живут столько секунд.
+# Listener подключается к DB_LISTEN_HOST:DB_LISTEN_PORT, если заданы (pgbouncer в transaction pooling)
+LOCAL_CACHE_TTL = float(os.getenv('LOCAL_CACHE_TTL', 5))
+LOCAL_CACHE_LISTEN_HOST = os.getenv('DB_LISTEN_HOST')
+LOCAL_CACHE_LISTEN_PORT = os.getenv('DB_LISTEN_PORT')
+
+# Попытки тестов на PostgreSQL секционированы по месяцам (main/partitions.py).
+# Секции создаются на столько месяцев вперед, старше срока хранения выгружаются командой
+# archive_test_results в TEST_RESULTS_ARCHIVE_DIR. История попыток по умолчанию — за TEST_HISTORY_MONTHS
+TEST_RESULTS_PARTITION_MONTHS_AHEAD = 3
+TEST_RESULTS_RETENTION_MONTHS = int(os.getenv('TEST_RESULTS_RETENTION_MONTHS', 36))
+TEST_RESULTS_ARCHIVE_DIR = os.getenv('TEST_RESULTS_ARCHIVE_DIR', BASE_DIR / 'archive')
+TEST_HISTORY_MONTHS = int(os.getenv('TEST_HISTORY_MONTHS', 24))
+
+# Сколько живет выданный пользователю тест (набор кейсов в кэше), секунды
+TEST_SESSION_TIMEOUT = 60 * 10
+
+# Готовые ответы каталога и карточек атласа (main/response_cache.py), секунды. Без listener
+# local_cache (SQLite, LOCAL_CACHE_LISTEN=0) — LOCAL_CACHE_TTL
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 60 * 60))
+
+# Прогрев кэша ответов (main/cache_warming.py, manage.py warm_caches). Схема и хост входят
+# в ключ кэша (ссылки абсолютные) — те же, под которыми приложение открывают клиенты
+CACHE_WARM_HOST = os.getenv('CACHE_WARM_HOST', ALLOWED_HOSTS[0])
+CACHE_WARM_SCHEME = os.getenv('CACHE_WARM_SCHEME', 'https')
+CACHE_WARM_WORKERS = int(os.getenv('CACHE_WARM_WORKERS', 4))
+
+# Снимок атласа (main/atlas_sync.py): записи журнала изменений моложе задержки (секунды)
+# не входят в версию — транзакции с меньшими id могут закоммититься позже
+ATLAS_SYNC_LAG = float(os.getenv('ATLAS_SYNC_LAG', 2))
+
+# Сжатие ответов (main/compression.py): меньше порога не сжимаем, пути аутентификации — никогда (BREACH)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_EXCLUDED_PATHS = ('/api/auth/',)
+
+# Запросы дольше порога (мс) пишутся в лог main.performance вместе с их SQL
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '1000'))
+
+# Выборка медленных SQL (см. main/slow_queries.py и manage.py slow_queries)
+SLOW_QUERY_THRESHOLD_MS = int(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200'))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_SAMPLE_RATE', '1.0'))
+SLOW_QUERY_FLUSH_INTERVAL = int(os.getenv('SLOW_QUERY_FLUSH_INTERVAL', '30'))
+
+# Токен для /api/metrics (Prometheus). Пустой — эндпоинт отвечает 404 (открыт только при DEBUG)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'main.performance': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        # Время прогрева кэша при старте воркера
+        'main.cache_warming': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -79,6 +186,13 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'Colposcopy.wsgi.application'
+ASGI_APPLICATION = 'Colposcopy.asgi.application'
+
+# Отложенные уникальные ограничения (Layer: case + number) создаются только на PostgreSQL
+SILENCED_SYSTEM_CHECKS = ['models.W038']
+
+# Асинхронные варианты read-only представлений (main/async_views.py), включать при запуске под ASGI
+ASYNC_READ_VIEWS = os.getenv('DJANGO_ASYNC_VIEWS', '0') == '1'
 
 
 # Password validation
@@ -125,6 +239,20 @@ else:
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR/'media'
+# Куда gc_media переносит файлы без ссылок в режиме --quarantine
+MEDIA_QUARANTINE_DIR = os.getenv('MEDIA_QUARANTINE_DIR', BASE_DIR / 'media_quarantine')
+
+# Загруженные через API архивы атласа на время импорта (см. main/atlas_bundle.py)
+ATLAS_BUNDLE_DIR = os.getenv('ATLAS_BUNDLE_DIR', BASE_DIR / 'bundles')
+
+# Загрузка видео по частям (main/uploads.py): временные файлы лежат вне MEDIA_ROOT до завершения загрузки
+TUTORIAL_UPLOAD_DIR = os.getenv('TUTORIAL_UPLOAD_DIR', BASE_DIR / 'uploads')
+TUTORIAL_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+TUTORIAL_UPLOAD_MAX_SIZE = 10 * 1024 * 1024 * 1024
+
+# Обработка картинок при загрузке (main/images.py)
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 2560))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 85))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -160,6 +288,16 @@ REST_FRAMEWORK = {
         'main.authenticate.CustomAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': ('rest_framework.permissions.IsAuthenticated',),
+    # JSON через orjson (без него — стандартный json), вывод совпадает с JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'main.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'main.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 SIMPLE_JWT = {
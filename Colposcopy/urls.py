@@ -17,13 +17,22 @@ from main.views import (
     LayerViewSet,
     SchemeViewSet,
     PathologyImageViewSet,
-    SubmitTestView, PathologyListInfoView,
+    SubmitTestView, PathologyListInfoView, PathologyMoveView,
     ClinicalCaseListView, PathologyDetailView, CaseDetailInfoView, GetTestTasksView,
     UserProfileView, UserTestHistoryView, TestResultHistoryView,
     TutorialListView, TutorialDetailView, TutorialCreateView, TutorialDeleteView,
-    TestListInfoView, AdminPathologyListInfoView, TutorialUpdateView, CaseUpdateView, LayerUpdateView, SchemeUpdateView, CaseQuestionsUpdateView
+    TestListInfoView, AdminPathologyListInfoView, TutorialUpdateView, CaseUpdateView, CaseLayersReorderView, LayerUpdateView, SchemeUpdateView, CaseQuestionsUpdateView,
+    RequestMetricsView, SearchView, SearchAutocompleteView, AtlasExportView, AtlasImportView, AtlasSnapshotView,
+    TutorialUploadInitView, TutorialUploadStatusView, TutorialUploadChunkView, TutorialUploadFinalizeView
 )
 
+# Под ASGI (uvicorn) read-only эндпоинты обслуживаются асинхронными представлениями
+if settings.ASYNC_READ_VIEWS:
+    from main.async_views import (
+        PathologyListInfoView, PathologyDetailView, CaseDetailInfoView, TutorialListView, UserTestHistoryView,
+        AtlasSnapshotView
+    )
+
 # РОУТЕРЫ (ViewSets)
 router = DefaultRouter()
 router.register(r'pathologies', PathologyViewSet, basename='pathology')
@@ -55,12 +64,18 @@ urlpatterns = [
     path('api/test/test-list/',TestListInfoView.as_view(), name='test-list-info'), # GET: Получить список всех тестов у которых есть кейсы
     path('api/clincal-cases/cases/', ClinicalCaseListView.as_view(), name='clinical-cases-list'), # GET: Получить список патологий, внутри которых лежат списки ID их клинических случаев.
     path('api/atlas/pathology/<int:id>/', PathologyDetailView.as_view(), name='pathology-detail'),  # GET: Получить полную информацию о конкретной патологии (описание, фотографии) по её ID.
+    path('api/atlas/snapshot/', AtlasSnapshotView.as_view(), name='atlas-snapshot'),                  # GET: Весь атлас одним документом; ?since=<version> — только изменения и удаленные id
+    path('api/atlas/export/', AtlasExportView.as_view(), name='atlas-export'),                          # GET: Архив атласа (?pathologies=1,2), только админы
+    path('api/atlas/import/', AtlasImportView.as_view(), name='atlas-import'),                          # POST: Загрузить архив атласа (multipart: bundle), только админы
+    path('api/search/', SearchView.as_view(), name='search'),                                           # GET: Полнотекстовый поиск по атласу (?q=, ?kind=, ?limit=)
+    path('api/search/autocomplete/', SearchAutocompleteView.as_view(), name='search-autocomplete'),      # GET: Подсказки по началу слов (?q=)
+    path('api/atlas/pathology/<int:id>/move/', PathologyMoveView.as_view(), name='pathology-move'),   # POST: Переместить патологию на позицию {"position": n} (только админы)
     path('api/cases/case/<int:id>/', CaseDetailInfoView.as_view(), name='case-detail-info'), # GET: Получить данные конкретного клинического случая по ID (слои изображений, схемы, описания слоев).
     path('api/test/test-tasks/<str:pathology_ids>/', GetTestTasksView.as_view(), name='get-test-tasks'),    # GET: Сгенерировать тест. Принимает строку ID патологий через дефис (например, "1-3-5").
     path('api/test/submit-answers/', SubmitTestView.as_view(), name='test-submit'),       # POST: Отправить ответы пользователя на проверку.
     path('api/questions/bulk-create/', QuestionBulkCreateView.as_view(), name='questions-bulk-create'), # Убрать?
     path('api/account/profile/', UserProfileView.as_view(), name='current-user-profile'), # GET: Получить данные текущего пользователя (ФИО, работа, email). # PATCH: Изменить данные профиля или сменить пароль.
-    path('api/account/try-list/', UserTestHistoryView.as_view(), name='profile-history'), # GET: Получить список всех попыток прохождения тестов текущего пользователя (Дата, Оценка, Время).
+    path('api/account/try-list/', UserTestHistoryView.as_view(), name='profile-history'), # GET: Получить список попыток прохождения тестов текущего пользователя за последние TEST_HISTORY_MONTHS месяцев (Дата, Оценка, Время). ?all=1 — все попытки.
     path('api/account/attempt/<int:id>/', TestResultHistoryView.as_view(), name='history-detail'),  # GET: Получить детальный разбор конкретной попытки по её ID.
     path('api/admin-zone/', admin.site.urls),    # Админ-панель Django.
     path('api/tutorial/tutorials-list/', TutorialListView.as_view(), name='tutorials-list'),            # GET: Получить список туториалов
@@ -68,12 +83,20 @@ urlpatterns = [
     path('api/tutorial/create/', TutorialCreateView.as_view(), name='tutorial-create'),                 # POST: Создать туториал
     path('api/tutorial/delete/<int:id>/', TutorialDeleteView.as_view(), name='tutorial-delete'),        # DELETE: Удалить туториал
     path('api/tutorial/update/<int:id>/', TutorialUpdateView.as_view(), name='tutorial-update'),        # UPDATE: Редактирование туториала
+    path('api/tutorial/uploads/', TutorialUploadInitView.as_view(), name='tutorial-upload-init'),      # POST: Начать загрузку видео по частям
+    path('api/tutorial/uploads/<uuid:upload_id>/', TutorialUploadStatusView.as_view(), name='tutorial-upload-status'),  # GET: Состояние загрузки (next_chunk)
+    path('api/tutorial/uploads/<uuid:upload_id>/chunks/<int:index>/', TutorialUploadChunkView.as_view(), name='tutorial-upload-chunk'),  # PUT: Часть файла (application/octet-stream)
+    path('api/tutorial/uploads/<uuid:upload_id>/finalize/', TutorialUploadFinalizeView.as_view(), name='tutorial-upload-finalize'),  # POST: Завершить загрузку и сохранить туториал
     path('api/cases/update/<int:id>/', CaseUpdateView.as_view(), name='case-update'),                   # UPDATE: Редактирование случая
+    path('api/cases/reorder-layers/<int:id>/', CaseLayersReorderView.as_view(), name='case-reorder-layers'),  # POST: Новый порядок слоев {"layers": [id, ...]}
     path('api/layers/update/<int:id>/', LayerUpdateView.as_view(), name='layer-update'),                # UPDATE: Редактирование слоя
     path('api/schemes/update/<int:id>/', SchemeUpdateView.as_view(), name='scheme-update'),             # UPDATE : Редактирование схем
 
     path('api/questions/update/<int:id>/', CaseQuestionsUpdateView.as_view(), name='update-case-questions'),
 
+    path('api/monitoring/requests/', RequestMetricsView.as_view(), name='request-metrics'),              # GET: Гистограмма времени ответа по эндпоинтам (только админы). DELETE: Сбросить
+    path('api/metrics', views.metrics_view, name='prometheus-metrics'),                                 # GET: Метрики в формате Prometheus
+
     re_path(r'^media/(?P<path>.*)$', serve,{'document_root': settings.MEDIA_ROOT}),
     re_path(r'^static/(?P<path>.*)$', serve,{'document_root': settings.STATIC_ROOT}),
 
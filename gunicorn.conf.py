@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+# Подхватывается gunicorn автоматически из рабочей папки (/app)
+import os
+import shutil
+
+
+def on_starting(server):
+    # Общий каталог для метрик Prometheus всех воркеров, очищаем при старте мастера
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # Сброс наборов в памяти воркера по LISTEN/NOTIFY (main/local_cache.py); без него — по TTL
+    if os.environ.get("LOCAL_CACHE_LISTEN", "1") == "1":
+        from main.local_cache import local_cache
+        local_cache.start_listener()
+    # Прогрев кэша ответов воркера в фоне (main/cache_warming.py): кэш locmem у каждого воркера
+    # свой, прогревать его можно только здесь. Запросы, пришедшие во время прогрева, ждут ту же
+    # сборку (singleflight), а не строят ответ заново
+    if os.environ.get("WARM_CACHES_ON_START", "0") == "1":
+        import threading
+        from main import cache_warming
+        threading.Thread(target=cache_warming.warm_on_start, name="warm-caches", daemon=True).start()
@@ -1,11 +1,86 @@
-from django.contrib import admin
+from functools import reduce
+from operator import or_
+
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.core.files.uploadedfile import UploadedFile
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, Q, QuerySet
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+from django.utils.text import smart_split, unescape_string_literal
 from django.utils.translation import gettext_lazy as _
 from .models import (
     Account, WorkerProfile, Pathology, PathologyImage,
-    Case, Layer, Scheme, Question, Answer, TestResult, UserTestAnswer
+    Case, Layer, Scheme, Question, Answer, TestResult, UserTestAnswer, SlowQuery, pathology_ordering
 )
-
+from . import images
+from .slow_queries import explain
+
+
+# Списки с миллионами строк
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для списка без фильтров на PostgreSQL число строк берется из статистики
+    (pg_class.reltuples) вместо COUNT(*) по всей таблице. С фильтрами и поиском — обычный COUNT.
+    У секционированной таблицы (partitions.py) своей статистики нет, суммируются ее секции.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        SELECT CASE WHEN parent.relkind = 'p' THEN (
+                            SELECT sum(GREATEST(child.reltuples, 0)) FROM pg_inherits
+                            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                            WHERE pg_inherits.inhparent = parent.oid
+                        ) ELSE parent.reltuples END::bigint
+                        FROM pg_class parent WHERE parent.oid = %s::regclass
+                        """,
+                        [connection.ops.quote_name(queryset.model._meta.db_table)],
+                    )
+                    row = cursor.fetchone()
+                # -1 или 0 (NULL у секционированной без секций), если таблицу еще не анализировали
+                if row and row[0] and row[0] > 0:
+                    return row[0]
+        return super().count
+
+
+class AccountSubquerySearchMixin:
+    """
+    Поля поиска вида user__email ищутся подзапросом user_id IN (SELECT id FROM main_account WHERE ...)
+    вместо JOIN + LIKE '%...%' по всей таблице: подзапрос обслуживается trigram-индексами
+    Account, внешний запрос — индексом по user_id.
+    """
+    account_field = 'user'
+
+    def get_search_results(self, request, queryset, search_term):
+        prefix = f'{self.account_field}__'
+        account_fields = [f[len(prefix):] for f in self.search_fields if f.startswith(prefix)]
+        own_fields = [f for f in self.search_fields if not f.startswith(prefix)]
+        if not search_term or not account_fields:
+            return super().get_search_results(request, queryset, search_term)
+
+        # Как в ModelAdmin: каждое слово должно найтись хотя бы в одном из полей
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            accounts = Account.objects.filter(
+                reduce(or_, (Q(**{f'{field}__icontains': bit}) for field in account_fields))
+            ).values('pk')
+            condition = Q(**{f'{self.account_field}__in': accounts})
+            for field in own_fields:
+                condition |= Q(**{f'{field}__icontains': bit})
+            queryset = queryset.filter(condition)
+        return queryset, False
 
 
 @admin.register(Account)
@@ -33,28 +108,113 @@ class AccountAdmin(UserAdmin):
 
 
 @admin.register(WorkerProfile)
-class WorkerProfileAdmin(admin.ModelAdmin):
+class WorkerProfileAdmin(AccountSubquerySearchMixin, admin.ModelAdmin):
     list_display = ('user', 'work', 'position')
     search_fields = ('user__email', 'user__name', 'user__surname', 'work', 'position')
     raw_id_fields = ('user',)
+    list_select_related = ('user',)
+
+
+
+class ProcessedImagesForm(forms.ModelForm):
+    """
+    Картинки из processed_image_fields обрабатываются так же, как при загрузке через API
+    (ProcessedImagesMixin): уменьшаются, перекодируются, размеры попадают в <поле>_width/_height/_size.
+    """
+    processed_image_fields = ()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name in self.processed_image_fields:
+            upload = cleaned_data.get(name)
+            if upload is False:
+                # Файл очищен — размеры тоже
+                for field in images.dimension_fields(name):
+                    setattr(self.instance, field, None)
+            if not isinstance(upload, UploadedFile):
+                continue
+            try:
+                values = images.process_upload(name, upload)
+            except images.ImageProcessingError as exc:
+                self.add_error(name, str(exc))
+                continue
+            cleaned_data[name] = values.pop(name)
+            for field, value in values.items():
+                setattr(self.instance, field, value)
+        return cleaned_data
+
+
+class PathologyImageForm(ProcessedImagesForm):
+    processed_image_fields = ('image',)
+
+    class Meta:
+        model = PathologyImage
+        fields = '__all__'
+
 
+class LayerForm(ProcessedImagesForm):
+    processed_image_fields = ('layer_img',)
+
+    class Meta:
+        model = Layer
+        fields = '__all__'
+
+
+class SchemeForm(ProcessedImagesForm):
+    processed_image_fields = ('scheme_img', 'scheme_description_img')
+
+    class Meta:
+        model = Scheme
+        fields = '__all__'
 
 
 class PathologyImageInline(admin.TabularInline):
     model = PathologyImage
+    form = PathologyImageForm
     extra = 1
 
 
+class PathologyAdminForm(forms.ModelForm):
+    # Номер только для чтения: его пересчитывает выравнивание порядка, перемещение — через move_to
+    position = forms.IntegerField(
+        min_value=1, required=False, label='Переместить на позицию',
+        help_text='Позиция в атласе, с 1. Пусто — без изменений (новая патология — в конец)'
+    )
+
+    class Meta:
+        model = Pathology
+        exclude = ('number',)
+
+
 @admin.register(Pathology)
 class PathologyAdmin(admin.ModelAdmin):
+    form = PathologyAdminForm
     list_display = ('name', 'cases_count', 'description_preview')
     search_fields = ('name', 'description')
+    readonly_fields = ('number',)
     inlines = [PathologyImageInline]
 
+    def save_model(self, request, obj, form, change):
+        position = form.cleaned_data.get('position')
+        if not change:
+            obj.number = position
+        super().save_model(request, obj, form, change)
+        if change and position is not None and position != obj.number:
+            obj.move_to(position)
+
+    def delete_queryset(self, request, queryset):
+        # Удаление списком идет в обход Pathology.delete()
+        super().delete_queryset(request, queryset)
+        pathology_ordering.deleted()
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(cases_total=Count('cases'))
+
     def cases_count(self, obj):
-        return obj.cases.count()
+        return obj.cases_total
 
     cases_count.short_description = 'Количество кейсов'
+    cases_count.admin_order_field = 'cases_total'
 
     def description_preview(self, obj):
         if len(obj.description) > 100:
@@ -66,8 +226,10 @@ class PathologyAdmin(admin.ModelAdmin):
 
 @admin.register(PathologyImage)
 class PathologyImageAdmin(admin.ModelAdmin):
+    form = PathologyImageForm
     list_display = ('pathology', 'image_preview')
     list_filter = ('pathology',)
+    list_select_related = ('pathology',)
 
     def image_preview(self, obj):
         if obj.image:
@@ -78,11 +240,13 @@ class PathologyImageAdmin(admin.ModelAdmin):
 
 class LayerInline(admin.TabularInline):
     model = Layer
+    form = LayerForm
     extra = 1
 
 
 class SchemeInline(admin.TabularInline):
     model = Scheme
+    form = SchemeForm
     extra = 1
 
 
@@ -92,19 +256,26 @@ class CaseAdmin(admin.ModelAdmin):
     list_filter = ('pathology', 'created_at')
     search_fields = ('name', 'pathology__name')
     inlines = [LayerInline, SchemeInline]
+    list_select_related = ('pathology',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(layers_total=Count('layers'))
 
     def layers_count(self, obj):
-        return obj.layers.count()
+        return obj.layers_total
 
     layers_count.short_description = 'Слои'
+    layers_count.admin_order_field = 'layers_total'
 
 
 @admin.register(Layer)
 class LayerAdmin(admin.ModelAdmin):
+    form = LayerForm
     list_display = ('case', 'number', 'layer_preview')
     list_filter = ('case__pathology', 'case')
     search_fields = ('case__name', 'layer_description')
     ordering = ('case', 'number')
+    list_select_related = ('case',)
 
     def layer_preview(self, obj):
         if obj.layer_img:
@@ -116,8 +287,10 @@ class LayerAdmin(admin.ModelAdmin):
 
 @admin.register(Scheme)
 class SchemeAdmin(admin.ModelAdmin):
+    form = SchemeForm
     list_display = ('case', 'scheme_preview', 'description_preview')
     list_filter = ('case__pathology', 'case')
+    list_select_related = ('case',)
 
     def scheme_preview(self, obj):
         if obj.scheme_img:
@@ -146,6 +319,7 @@ class QuestionAdmin(admin.ModelAdmin):
     list_filter = ('case__pathology', 'case', 'qtype')
     search_fields = ('name', 'instruction')
     inlines = [AnswerInline]
+    list_select_related = ('case',)
 
     def instruction_preview(self, obj):
         if len(obj.instruction) > 50:
@@ -159,6 +333,7 @@ class AnswerAdmin(admin.ModelAdmin):
     list_display = ('question', 'text_preview', 'is_correct')
     list_filter = ('question__case', 'question')
     search_fields = ('text', 'question__name')
+    list_select_related = ('question',)
 
     def text_preview(self, obj):
         if len(obj.text) > 50:
@@ -176,13 +351,38 @@ class UserTestAnswerInline(admin.TabularInline):
 
 
 @admin.register(TestResult)
-class TestResultAdmin(admin.ModelAdmin):
+class TestResultAdmin(AccountSubquerySearchMixin, admin.ModelAdmin):
     list_display = ('user', 'pathology', 'score', 'max_score', 'percentage', 'grade', 'created_at')
     list_filter = ('pathology', 'grade', 'created_at')
     search_fields = ('user__email', 'user__name', 'user__surname')
+    list_select_related = ('user', 'pathology')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
     readonly_fields = ('user', 'pathology', 'score', 'max_score', 'percentage', 'grade', 'created_at')
     inlines = [UserTestAnswerInline]
 
+    # Ответы новых попыток упакованы в answer_ids_packed, старых — лежат строками UserTestAnswer
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None and obj.answer_ids_packed is not None:
+            return self.readonly_fields + ('selected_answers',)
+        return self.readonly_fields
+
+    def get_inline_instances(self, request, obj=None):
+        if obj is not None and obj.answer_ids_packed is not None:
+            return []
+        return super().get_inline_instances(request, obj)
+
+    def selected_answers(self, obj):
+        answers = Answer.objects.filter(id__in=obj.selected_answer_ids).select_related('question')
+        rows = format_html_join(
+            '', '<li>{}: {}{}</li>',
+            ((answer.question, answer, ' ✓' if answer.is_correct else '')
+             for answer in answers.order_by('question_id', 'id'))
+        )
+        return format_html('<ul>{}</ul>', rows) if rows else '—'
+
+    selected_answers.short_description = 'Выбранные ответы'
+
     def has_add_permission(self, request):
         return False
 
@@ -194,6 +394,9 @@ class TestResultAdmin(admin.ModelAdmin):
 class UserTestAnswerAdmin(admin.ModelAdmin):
     list_display = ('test_result', 'question', 'answer', 'is_correct')
     list_filter = ('test_result__pathology',)
+    list_select_related = ('test_result__user', 'question', 'answer')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
     readonly_fields = ('test_result', 'question', 'answer')
 
     def is_correct(self, obj):
@@ -209,6 +412,45 @@ class UserTestAnswerAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('fingerprint', 'sql_preview', 'calls', 'total_time_ms', 'mean_time', 'max_time_ms', 'last_seen')
+    list_filter = ('database',)
+    search_fields = ('normalized_sql',)
+    readonly_fields = (
+        'fingerprint', 'database', 'normalized_sql', 'sample_sql', 'sample_params',
+        'calls', 'total_time_ms', 'max_time_ms', 'first_seen', 'last_seen', 'plan', 'explained_at'
+    )
+    actions = ['run_explain']
+
+    def sql_preview(self, obj):
+        if len(obj.normalized_sql) > 100:
+            return obj.normalized_sql[:100] + '...'
+        return obj.normalized_sql
+
+    sql_preview.short_description = 'Запрос'
+
+    def mean_time(self, obj):
+        return round(obj.mean_time_ms, 2)
+
+    mean_time.short_description = 'Среднее, мс'
+
+    @admin.action(description='Выполнить EXPLAIN (ANALYZE, BUFFERS)')
+    def run_explain(self, request, queryset):
+        for slow_query in queryset:
+            try:
+                explain(slow_query)
+            except Exception as exc:
+                self.message_user(request, f'{slow_query.fingerprint}: {exc}', level=messages.ERROR)
+        self.message_user(request, 'План запроса сохранен, откройте запись для просмотра')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.site_header = "Панель управления"
 admin.site.site_title = "Админ-панель"
 admin.site.index_title = "Добро пожаловать в админ-панель"
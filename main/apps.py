@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from django.core.signals import request_finished
+        from django.db.backends.signals import connection_created
+        from . import atlas_sync, instrumentation, local_cache, response_cache, search, slow_queries
+
+        connection_created.connect(instrumentation.install_db_instrumentation)
+        connection_created.connect(slow_queries.install_slow_query_sampler)
+        request_finished.connect(slow_queries.sampler.flush_if_due)
+        instrumentation.install_serializer_instrumentation()
+        search.connect_signals()
+        local_cache.connect_signals()
+        # Журнал изменений раньше сброса кэша: перенумерация патологий пишется до инвалидации
+        atlas_sync.connect_signals()
+        response_cache.connect_signals()
@@ -0,0 +1,154 @@
+# async_views.py
+# Асинхронные варианты read-only представлений для запуска под ASGI (uvicorn).
+# Подключаются в urls.py вместо синхронных, если ASYNC_READ_VIEWS = True.
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
+from rest_framework import permissions, response, status
+from rest_framework.views import APIView
+
+from . import atlas_sync, partitions, response_cache
+from .models import Case, Pathology, TestResult, VideoTutorial
+from .serializers import (
+    CaseDetailInfoSerializer, PathologyDetailInfoSerializer, PathologyListSerializer, TutorialListSerializer,
+    UserTryInfoSerializer
+)
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView с асинхронным dispatch. Аутентификация, проверка прав, согласование формата
+    и обработка ошибок — те же методы DRF, что и у синхронных представлений; синхронные
+    части с обращением к БД (загрузка пользователя по JWT) выполняются через sync_to_async.
+    """
+    # Все асинхронные представления только читают (db_router.py)
+    read_replica = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response_obj = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response_obj):
+                response_obj = await response_obj
+        except Exception as exc:
+            response_obj = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response_obj, *args, **kwargs)
+        return self.response
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'format': self.format_kwarg, 'view': self}
+
+
+# Каталог и карточки атласа отдаются из response_cache (см. views.py). Попадание читается
+# в event loop через cache.aget; в поток уходят только промах и сборка записи — она
+# синхронная, один раз на поколение атласа
+
+async def acached_response(request, name, build, *key_args):
+    entry = await response_cache.acached_entry(request, name, *key_args)
+    if entry is not None:
+        return response_cache.entry_response(request, entry)
+    return await sync_to_async(response_cache.cached_response)(request, name, build, *key_args)
+
+
+class PathologyListInfoView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, *args, **kwargs):
+        return await acached_response(request, 'atlas-list', self.build)
+
+    def build(self):
+        queryset = Pathology.objects.annotate(
+            images_count=Count('images')
+        ).filter(
+            images_count__gt=0
+        ).order_by('rank', 'id')
+
+        serializer = PathologyListSerializer(queryset, many=True, context=self.get_serializer_context())
+        return {
+            "items": serializer.data
+        }
+
+
+class AtlasSnapshotView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = atlas_sync.parse_version(since)
+            except ValueError:
+                return response.Response(
+                    {"detail": "since должен быть неотрицательным целым числом"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        return await acached_response(
+            request, 'atlas-snapshot', lambda: atlas_sync.snapshot(request, since),
+            'full' if since is None else since
+        )
+
+
+class PathologyDetailView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, id, *args, **kwargs):
+        return await acached_response(request, 'pathology-detail', lambda: self.build(id), id)
+
+    def build(self, id):
+        pathology = get_object_or_404(Pathology.objects.prefetch_related("images"), id=id)
+        return PathologyDetailInfoSerializer(pathology, context=self.get_serializer_context()).data
+
+
+class CaseDetailInfoView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, id, *args, **kwargs):
+        return await acached_response(request, 'case-detail', lambda: self.build(id), id)
+
+    def build(self, id):
+        case = get_object_or_404(Case.objects.prefetch_related('layers', 'schemes'), id=id)
+        return CaseDetailInfoSerializer(case, context=self.get_serializer_context()).data
+
+
+class TutorialListView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, *args, **kwargs):
+        return await acached_response(request, 'tutorials', self.build)
+
+    def build(self):
+        serializer = TutorialListSerializer(
+            VideoTutorial.objects.all(), many=True, context=self.get_serializer_context()
+        )
+        return {
+            "items": serializer.data
+        }
+
+
+class UserTestHistoryView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, *args, **kwargs):
+        queryset = TestResult.objects.filter(user=request.user)
+        if request.query_params.get('all') != '1':
+            queryset = queryset.filter(created_at__gte=partitions.history_cutoff())
+        items = [result async for result in queryset.order_by('-created_at')]
+        serializer = UserTryInfoSerializer(items, many=True, context=self.get_serializer_context())
+        return response.Response({
+            "items": serializer.data
+        })
@@ -0,0 +1,271 @@
+# atlas_bundle.py
+import hashlib
+import io
+import json
+import os
+import posixpath
+import uuid
+import zipfile
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import atlas_sync, local_cache, response_cache, search
+from .models import (
+    Answer, AtlasImportRecord, Case, Layer, Pathology, PathologyImage, Question, Scheme, pathology_ordering,
+)
+from .ordering import RANK_STEP
+
+
+# Перенос атласа между окружениями одним zip-архивом:
+#   manifest.json          — версия формата, bundle_id, количество записей
+#   records/<ключ>.jsonl   — строки моделей, по одной JSON-записи на строку
+#   media/<sha256>         — файлы, каждый уникальный файл один раз
+# Экспорт пишется потоково (zip поверх несикаемого потока), импорт читает записи
+# построчно и пишет пачками через bulk_create, так что память не зависит от размера атласа.
+
+BUNDLE_FORMAT = 1
+COPY_CHUNK_SIZE = 1024 * 1024
+RECORDS_CHUNK_SIZE = 500
+
+# Порядок зависимостей: (ключ, модель, путь фильтра по патологии, {FK: ключ родителя})
+BUNDLE_MODELS = (
+    ("pathology", Pathology, "pk", {}),
+    ("pathology_image", PathologyImage, "pathology", {"pathology": "pathology"}),
+    ("case", Case, "pathology", {"pathology": "pathology"}),
+    ("layer", Layer, "case__pathology", {"case": "case"}),
+    ("scheme", Scheme, "case__pathology", {"case": "case"}),
+    ("question", Question, "case__pathology", {"case": "case"}),
+    ("answer", Answer, "question__case__pathology", {"question": "question"}),
+)
+# Порядок патологий задается позицией в архиве, а не переносимыми значениями
+SKIPPED_FIELDS = {"pathology": {"number", "rank"}}
+
+
+class BundleError(Exception):
+    pass
+
+
+def _file_fields(model):
+    return [f for f in model._meta.concrete_fields if isinstance(f, models.FileField)]
+
+
+def _exported_fields(key, model):
+    skipped = SKIPPED_FIELDS.get(key, set())
+    return [f for f in model._meta.concrete_fields if not f.primary_key and f.name not in skipped]
+
+
+# ЭКСПОРТ
+
+class _ChunkBuffer(io.RawIOBase):
+    """Несикаемый приемник для ZipFile: накопленные байты забираются генератором."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_bundle(pathology_ids=None):
+    """Генератор байтов zip-архива: для StreamingHttpResponse или записи в файл."""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for _ in _write_members(zf, pathology_ids):
+            data = buffer.pop()
+            if data:
+                yield data
+    yield buffer.pop()
+
+
+def export_bundle(path, pathology_ids=None):
+    with open(path, "wb") as f:
+        for chunk in stream_bundle(pathology_ids):
+            f.write(chunk)
+
+
+def _write_members(zf, pathology_ids):
+    counts = {}
+    written_media = set()
+    # имя файла в хранилище -> sha256 (None, если файла нет)
+    hashes_by_name = {}
+
+    for key, model, pathology_path, fks in BUNDLE_MODELS:
+        queryset = model._default_manager.order_by(*(("rank", "pk") if model is Pathology else ("pk",)))
+        if pathology_ids:
+            queryset = queryset.filter(**{f"{pathology_path}__in": pathology_ids})
+        fields = _exported_fields(key, model)
+        file_fields = [f.name for f in _file_fields(model)]
+        counts[key] = 0
+
+        # В zip открыт только один поток записи, поэтому сначала файлы модели, потом ее записи
+        if file_fields:
+            for names in queryset.values_list(*file_fields).iterator(chunk_size=RECORDS_CHUNK_SIZE):
+                for name in names:
+                    if name and name not in hashes_by_name:
+                        yield from _write_media(zf, name, written_media, hashes_by_name)
+
+        with zf.open(f"records/{key}.jsonl", "w") as out:
+            for obj in queryset.iterator(chunk_size=RECORDS_CHUNK_SIZE):
+                record = {"id": obj.pk}
+                for field in fields:
+                    if field.name in file_fields:
+                        name = getattr(obj, field.attname).name
+                        sha256 = hashes_by_name.get(name) if name else None
+                        record[field.name] = {"sha256": sha256, "name": name} if sha256 else None
+                    else:
+                        record[field.attname] = field.value_from_object(obj)
+                out.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False).encode() + b"\n")
+                counts[key] += 1
+                if counts[key] % RECORDS_CHUNK_SIZE == 0:
+                    yield
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "bundle_id": uuid.uuid4().hex,
+        "created_at": timezone.now().isoformat(),
+        "records": counts,
+        "media": len(written_media),
+    }
+    zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+    yield
+
+
+def _write_media(zf, name, written_media, hashes_by_name):
+    """Пишет файл в media/<sha256>, если такого содержимого в архиве еще нет."""
+    if not default_storage.exists(name):
+        hashes_by_name[name] = None
+        return
+
+    digest = hashlib.sha256()
+    with default_storage.open(name, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    sha256 = hashes_by_name[name] = digest.hexdigest()
+    if sha256 in written_media:
+        return
+
+    written_media.add(sha256)
+    # Картинки и видео уже сжаты
+    with default_storage.open(name, "rb") as f, \
+            zf.open(zipfile.ZipInfo(f"media/{sha256}"), "w", force_zip64=True) as out:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            out.write(chunk)
+            yield
+
+
+# ИМПОРТ
+
+def import_bundle(path, batch_size=RECORDS_CHUNK_SIZE, restart=False, log=print):
+    """
+    Загружает архив в текущую базу. Новые объекты получают новые ID, связи переставляются
+    по таблицам соответствия. Соответствия пишутся в AtlasImportRecord в одной транзакции
+    с пачкой — повторный запуск с тем же архивом продолжит с места остановки, не создав
+    уже записанные объекты второй раз.
+    """
+    with zipfile.ZipFile(path) as zf:
+        try:
+            manifest = json.loads(zf.read("manifest.json"))
+        except KeyError:
+            raise BundleError("В архиве нет manifest.json")
+        if manifest.get("format") != BUNDLE_FORMAT:
+            raise BundleError(f"Неподдерживаемая версия архива: {manifest.get('format')}")
+
+        bundle_id = manifest["bundle_id"]
+        records = AtlasImportRecord.objects.filter(bundle_id=bundle_id)
+        if restart:
+            records.delete()
+        ids = {}
+        for kind, old_id, new_id in records.values_list("kind", "old_id", "new_id").iterator():
+            ids.setdefault(kind, {})[old_id] = new_id
+        if ids:
+            log(f"Продолжение импорта {bundle_id}: {({key: len(value) for key, value in ids.items()})}")
+
+        for key, model, _, fks in BUNDLE_MODELS:
+            total = manifest["records"].get(key, 0)
+            done = len(ids.get(key, ()))
+            if done >= total:
+                continue
+
+            with zf.open(f"records/{key}.jsonl") as f:
+                batch = []
+                for line_number, line in enumerate(io.TextIOWrapper(f, encoding="utf-8")):
+                    if line_number < done:
+                        continue
+                    batch.append(json.loads(line))
+                    if len(batch) == batch_size:
+                        _import_batch(zf, bundle_id, key, model, fks, batch, ids)
+                        batch = []
+                if batch:
+                    _import_batch(zf, bundle_id, key, model, fks, batch, ids)
+            log(f"{key}: {len(ids.get(key, ()))}/{total}")
+
+    # bulk_create не вызывает сигналы: переиндексация поиска, выравнивание порядка патологий
+    # и журнал изменений для дозагрузки снимка атласа
+    search.rebuild()
+    pathology_ordering.compact()
+    for key, key_ids in ids.items():
+        if key in atlas_sync.KINDS:
+            atlas_sync.record(key, key_ids.values())
+    local_cache.changed(Case)
+    response_cache.invalidate()
+    AtlasImportRecord.objects.filter(bundle_id=bundle_id).delete()
+    return {key: len(key_ids) for key, key_ids in ids.items()}
+
+
+def _import_batch(zf, bundle_id, key, model, fks, records, ids):
+    file_fields = {f.name: f for f in _file_fields(model)}
+    old_ids = []
+    objs = []
+
+    with transaction.atomic():
+        if key == "pathology":
+            # Импортированные патологии встают в конец атласа
+            rank = Pathology.objects.aggregate(last=models.Max("rank"))["last"] or 0
+
+        for record in records:
+            old_ids.append(record.pop("id"))
+            for fk, parent_key in fks.items():
+                old_parent = record.pop(f"{fk}_id")
+                record[f"{fk}_id"] = ids[parent_key][old_parent] if old_parent is not None else None
+            for name, field in file_fields.items():
+                ref = record.get(name)
+                # Файлы лежат под именем по хешу: повтор пачки после сбоя их не дублирует
+                record[name] = _store_media(zf, ref, field) if ref else ""
+            if key == "pathology":
+                rank += RANK_STEP
+                record["rank"] = rank
+            objs.append(model(**record))
+
+        created = model._default_manager.bulk_create(objs)
+        AtlasImportRecord.objects.bulk_create([
+            AtlasImportRecord(bundle_id=bundle_id, kind=key, old_id=old_id, new_id=obj.pk)
+            for old_id, obj in zip(old_ids, created)
+        ])
+    ids.setdefault(key, {}).update((old_id, obj.pk) for old_id, obj in zip(old_ids, created))
+
+
+def _store_media(zf, ref, field):
+    """Файл кладется под именем по хешу содержимого: одинаковые файлы не дублируются и при повторном импорте."""
+    directory = posixpath.dirname(ref["name"]) or field.upload_to
+    extension = posixpath.splitext(ref["name"])[1]
+    name = posixpath.join(directory, f"{ref['sha256'][:32]}{extension}")
+    if default_storage.exists(name):
+        # Старый файл без ссылок media_gc мог бы удалить до коммита импорта: свежий mtime
+        # защищает его сроком grace
+        os.utime(default_storage.path(name))
+        return name
+    with zf.open(f"media/{ref['sha256']}") as f:
+        return default_storage.save(name, File(f, name=posixpath.basename(name)))
@@ -0,0 +1,177 @@
+# atlas_sync.py
+from collections import defaultdict
+from datetime import timedelta
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import AtlasChange, Case, Layer, Pathology, PathologyImage, Scheme, pathology_ordering
+from .serializers import image_dimensions
+
+
+# Снимок всего атласа одним документом (/api/atlas/snapshot/) и дозагрузка изменений
+# (?since=<версия>). Каждое сохранение или удаление объекта атласа пишет строку в
+# AtlasChange в той же транзакции; версия снимка — id последней записи журнала.
+# Вопросы и ответы в снимок не входят: в них признак правильного ответа.
+#
+# Версия берется из записей старше ATLAS_SYNC_LAG: id выдаются при вставке, а коммитятся
+# транзакции в другом порядке, и запись с меньшим id может стать видна позже. Изменения
+# моложе задержки клиент получит и в следующей дозагрузке — повтор безвреден.
+
+CHUNK_SIZE = 1000
+
+
+def _url(request, file):
+    if not file:
+        return None
+    url = file.url.replace('\\', '/')
+    return request.build_absolute_uri(url) if request else url
+
+
+def _image(request, obj, name):
+    return {"image": _url(request, getattr(obj, name)), **image_dimensions(obj, name)}
+
+
+def _pathology(request, obj):
+    return {"id": obj.id, "name": obj.name, "description": obj.description, "number": obj.number}
+
+
+def _pathology_image(request, obj):
+    return {"id": obj.id, "pathology": obj.pathology_id, **_image(request, obj, "image")}
+
+
+def _case(request, obj):
+    return {"id": obj.id, "pathology": obj.pathology_id, "name": obj.name, "created_at": obj.created_at}
+
+
+def _layer(request, obj):
+    return {
+        "id": obj.id,
+        "case": obj.case_id,
+        "number": obj.number,
+        "description": obj.layer_description,
+        **_image(request, obj, "layer_img"),
+    }
+
+
+def _scheme(request, obj):
+    return {
+        "id": obj.id,
+        "case": obj.case_id,
+        "scheme_img": _image(request, obj, "scheme_img"),
+        "scheme_description_img": _image(request, obj, "scheme_description_img"),
+    }
+
+
+# kind -> (ключ в ответе, модель, сортировка, объект -> dict)
+KINDS = {
+    AtlasChange.Kind.PATHOLOGY: ("pathologies", Pathology, ("rank", "id"), _pathology),
+    AtlasChange.Kind.PATHOLOGY_IMAGE: ("pathology_images", PathologyImage, ("id",), _pathology_image),
+    AtlasChange.Kind.CASE: ("cases", Case, ("id",), _case),
+    AtlasChange.Kind.LAYER: ("layers", Layer, ("case_id", "number"), _layer),
+    AtlasChange.Kind.SCHEME: ("schemes", Scheme, ("id",), _scheme),
+}
+_KIND_BY_MODEL = {model: kind for kind, (_, model, _, _) in KINDS.items()}
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ЖУРНАЛ ИЗМЕНЕНИЙ
+
+def record(kind, ids, deleted=False):
+    """Записывает изменение объектов kind с указанными id (bulk-операции без сигналов)."""
+    ids = list(ids)
+    if not ids:
+        return
+    with transaction.atomic():
+        for chunk in _chunks(ids):
+            created = AtlasChange.objects.bulk_create(
+                [AtlasChange(kind=kind, object_id=object_id, deleted=deleted) for object_id in chunk]
+            )
+            # Прежние записи объектов больше не нужны: клиенту достаточно последнего изменения
+            AtlasChange.objects.filter(
+                kind=kind, object_id__in=chunk, id__lt=min(change.pk for change in created)
+            ).delete()
+
+
+def record_all(kind):
+    record(kind, KINDS[kind][1]._default_manager.values_list("pk", flat=True))
+
+
+def on_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record(_KIND_BY_MODEL[sender], [instance.pk])
+
+
+def on_deleted(sender, instance, **kwargs):
+    record(_KIND_BY_MODEL[sender], [instance.pk], deleted=True)
+
+
+def record_pathology_numbers():
+    # Перенумерация патологий идет одним UPDATE без сигналов, номер есть в снимке
+    record_all(AtlasChange.Kind.PATHOLOGY)
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+
+    for _, model, _, _ in KINDS.values():
+        post_save.connect(on_saved, sender=model, dispatch_uid=f"atlas_sync_{model.__name__}")
+        post_delete.connect(on_deleted, sender=model, dispatch_uid=f"atlas_sync_del_{model.__name__}")
+    pathology_ordering.on_change.append(record_pathology_numbers)
+
+
+# СНИМОК
+
+def parse_version(value):
+    """?since= -> int; ValueError для всего, кроме неотрицательного целого."""
+    version = int(value)
+    if version < 0:
+        raise ValueError(value)
+    return version
+
+
+def current_version():
+    cutoff = timezone.now() - timedelta(seconds=settings.ATLAS_SYNC_LAG)
+    return AtlasChange.objects.filter(created_at__lt=cutoff).aggregate(version=Max("id"))["version"] or 0
+
+
+def snapshot(request=None, since=None):
+    """
+    Весь атлас или, если передан since, только объекты, измененные после этой версии,
+    и id удаленных. since новее журнала (например, после восстановления базы) — полный снимок.
+    """
+    # Версия читается до данных: все, что изменится во время сборки, придет в следующий раз
+    version = current_version()
+    latest = AtlasChange.objects.aggregate(latest=Max("id"))["latest"] or 0
+    full = since is None or since > latest
+    result = {"version": version, "full": full}
+
+    changed = defaultdict(set)
+    if not full:
+        changes = AtlasChange.objects.filter(id__gt=since).values_list("kind", "object_id")
+        for kind, object_id in changes.iterator(chunk_size=CHUNK_SIZE):
+            changed[kind].add(object_id)
+
+    deleted = {}
+    for kind, (key, model, ordering, build) in KINDS.items():
+        queryset = model._default_manager.order_by(*ordering)
+        if full:
+            result[key] = [build(request, obj) for obj in queryset.iterator(chunk_size=CHUNK_SIZE)]
+            continue
+        items = []
+        for chunk in _chunks(sorted(changed[kind])):
+            items.extend(queryset.filter(pk__in=chunk))
+        items.sort(key=attrgetter(*ordering))
+        result[key] = [build(request, obj) for obj in items]
+        # Объекта нет в базе — клиент удаляет его у себя
+        deleted[key] = sorted(changed[kind] - {obj.pk for obj in items})
+    result["deleted"] = deleted
+    return result
@@ -0,0 +1,474 @@
+# benchmark.py
+import io
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import atlas_sync, local_cache, response_cache
+from .models import (
+    Account, Pathology, PathologyImage, Case, Layer, Scheme, Question, Answer, TestResult, UserTestAnswer, pack_ids
+)
+from .ordering import RANK_STEP
+
+
+# ГЕНЕРАТОР ФИКСТУР
+
+BENCHMARK_EMAIL_DOMAIN = "bench.local"
+PLACEHOLDER_VARIANTS = 8
+
+
+def placeholder_images(upload_to, variants=PLACEHOLDER_VARIANTS, size=(640, 480)):
+    """
+    Небольшие PNG-заглушки в хранилище медиа. Генерируются один раз,
+    строки в базе ссылаются на них по кругу.
+    """
+    from PIL import Image, ImageDraw
+
+    names = []
+    for i in range(variants):
+        name = f"{upload_to}bench_{i}.png"
+        if not default_storage.exists(name):
+            image = Image.new("RGB", size, ((i * 53) % 256, (i * 97) % 256, (i * 151) % 256))
+            ImageDraw.Draw(image).text((20, 20), f"{upload_to} #{i}", fill=(255, 255, 255))
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+        names.append(name)
+    return names
+
+
+def seed(users=50, pathologies=20, cases_per_pathology=10, layers_per_case=3, questions_per_case=5,
+         answers_per_question=4, results_per_user=100, batch_size=2000, images=False, legacy_share=0.2, log=print):
+    """
+    Заполняет базу синтетическими данными через bulk_create.
+    Пароль у всех сгенерированных пользователей — "bench".
+    images=True — создать настоящие файлы-заглушки, иначе строки ссылаются на несуществующие файлы.
+    legacy_share — доля попыток в старом формате (кейсы в cases, ответы в UserTestAnswer).
+    """
+    rnd = random.Random(42)
+    now = timezone.now()
+    summary = {}
+
+    if images:
+        pathology_images = placeholder_images("pathology_img/")
+        layer_images = placeholder_images("case_layers/")
+        scheme_images = placeholder_images("schemes/scheme_img/")
+        scheme_description_images = placeholder_images("schemes/scheme_description_img/")
+    else:
+        pathology_images = ["pathology_img/bench.png"]
+        layer_images = ["case_layers/bench.png"]
+        scheme_images = ["schemes/scheme_img/bench.png"]
+        scheme_description_images = ["schemes/scheme_description_img/bench.png"]
+
+    with transaction.atomic():
+        start_number = Pathology.objects.aggregate(max_num=Max("number"))["max_num"] or 0
+        pathology_objs = Pathology.objects.bulk_create([
+            Pathology(name=f"Патология {i}", description=f"Описание патологии {i}. " * 10,
+                      number=start_number + i, rank=(start_number + i) * RANK_STEP)
+            for i in range(1, pathologies + 1)
+        ], batch_size=batch_size)
+        summary["pathologies"] = len(pathology_objs)
+
+        PathologyImage.objects.bulk_create([
+            PathologyImage(pathology=p, image=pathology_images[(p.id + k) % len(pathology_images)])
+            for p in pathology_objs for k in range(2)
+        ], batch_size=batch_size)
+
+        case_objs = Case.objects.bulk_create([
+            Case(pathology=p, name=f"{p.name}: случай {j}")
+            for p in pathology_objs for j in range(1, cases_per_pathology + 1)
+        ], batch_size=batch_size)
+        summary["cases"] = len(case_objs)
+
+        Layer.objects.bulk_create([
+            Layer(case=c, number=n, layer_img=layer_images[(c.id + n) % len(layer_images)],
+                  layer_description=f"Слой {n}")
+            for c in case_objs for n in range(1, layers_per_case + 1)
+        ], batch_size=batch_size)
+        Scheme.objects.bulk_create([
+            Scheme(case=c, scheme_img=scheme_images[c.id % len(scheme_images)],
+                   scheme_description_img=scheme_description_images[c.id % len(scheme_description_images)])
+            for c in case_objs
+        ], batch_size=batch_size)
+        summary["layers"] = len(case_objs) * layers_per_case
+
+        question_objs = Question.objects.bulk_create([
+            Question(case=c, name=f"Вопрос {q}", instruction="Выберите правильный ответ",
+                     qtype="multiple" if q % 3 == 0 else "single")
+            for c in case_objs for q in range(1, questions_per_case + 1)
+        ], batch_size=batch_size)
+        summary["questions"] = len(question_objs)
+
+        answer_objs = Answer.objects.bulk_create([
+            Answer(question=q, text=f"Ответ {a}", is_correct=(a == 1))
+            for q in question_objs for a in range(1, answers_per_question + 1)
+        ], batch_size=batch_size)
+        log(f"Атлас: {len(pathology_objs)} патологий, {len(case_objs)} кейсов, {len(question_objs)} вопросов")
+
+    password = make_password("bench")
+    first_user = Account.objects.filter(email__endswith=f"@{BENCHMARK_EMAIL_DOMAIN}").count()
+    user_objs = Account.objects.bulk_create([
+        Account(email=f"user{i}@{BENCHMARK_EMAIL_DOMAIN}", name=f"Имя{i}", surname=f"Фамилия{i}", password=password)
+        for i in range(first_user, first_user + users)
+    ], batch_size=batch_size)
+    summary["users"] = len(user_objs)
+
+    cases_by_pathology = {}
+    for c in case_objs:
+        cases_by_pathology.setdefault(c.pathology_id, []).append(c)
+    questions_by_case = {}
+    for q in question_objs:
+        questions_by_case.setdefault(q.case_id, []).append(q)
+    answers_by_question = {}
+    for a in answer_objs:
+        answers_by_question.setdefault(a.question_id, []).append(a)
+
+    # Попытки пишем порциями, чтобы не держать в памяти сотни тысяч объектов
+    results_total = 0
+    legacy_total = 0
+    answers_total = 0
+    pending = []
+    for user in user_objs:
+        for _ in range(results_per_user):
+            pathology = rnd.choice(pathology_objs)
+            cases = rnd.sample(cases_by_pathology[pathology.id], min(4, cases_per_pathology))
+            pending.append((user, pathology, cases, rnd.random() < legacy_share))
+            if len(pending) >= batch_size:
+                answers_total += _write_results(pending, questions_by_case, answers_by_question, rnd, now, batch_size)
+                results_total += len(pending)
+                legacy_total += sum(legacy for *_, legacy in pending)
+                pending = []
+                log(f"Попыток: {results_total}")
+    if pending:
+        answers_total += _write_results(pending, questions_by_case, answers_by_question, rnd, now, batch_size)
+        results_total += len(pending)
+        legacy_total += sum(legacy for *_, legacy in pending)
+
+    summary["test_results"] = results_total
+    summary["legacy_test_results"] = legacy_total
+    summary["user_test_answers"] = answers_total
+    # bulk_create не вызывает сигналы: журнал изменений атласа и закэшированные ответы
+    for kind in atlas_sync.KINDS:
+        atlas_sync.record_all(kind)
+    local_cache.changed(Case)
+    response_cache.invalidate()
+    log(f"Готово: {summary}")
+    return summary
+
+
+def _write_results(pending, questions_by_case, answers_by_question, rnd, now, batch_size):
+    """
+    Кейсы и ответы попытки упакованы в ее строку, как при отправке теста; у попыток
+    в старом формате — строки cases и UserTestAnswer (их разбирает history-detail).
+    Возвращает число строк UserTestAnswer.
+    """
+    results = []
+    selections = []
+    for user, pathology, cases, legacy in pending:
+        selected = [
+            (question.id, rnd.choice(answers_by_question[question.id]).id)
+            for case in cases for question in questions_by_case.get(case.id, [])
+        ]
+        selections.append(selected if legacy else None)
+        results.append(TestResult(
+            user=user, pathology=pathology, score=0, max_score=0, grade="Хорошо",
+            time_spent=timedelta(seconds=rnd.randint(60, 1800)),
+            case_ids_packed=None if legacy else pack_ids(case.id for case in cases),
+            answer_ids_packed=None if legacy else pack_ids(sorted(answer_id for _, answer_id in selected)),
+        ))
+
+    with transaction.atomic():
+        results = TestResult.objects.bulk_create(results, batch_size=batch_size)
+        for result in results:
+            # Распределяем попытки по последним двум годам
+            result.created_at = now - timedelta(minutes=rnd.randint(0, 60 * 24 * 730))
+        TestResult.objects.bulk_update(results, ["created_at"], batch_size=batch_size)
+
+        through = TestResult.cases.through
+        legacy_cases = []
+        legacy_answers = []
+        for result, (_, _, cases, _), selected in zip(results, pending, selections):
+            if selected is None:
+                continue
+            legacy_cases.extend(through(testresult_id=result.id, case_id=case.id) for case in cases)
+            legacy_answers.extend(
+                UserTestAnswer(test_result_id=result.id, question_id=question_id, answer_id=answer_id,
+                               created_at=result.created_at)
+                for question_id, answer_id in selected
+            )
+        through.objects.bulk_create(legacy_cases, batch_size=batch_size)
+        UserTestAnswer.objects.bulk_create(legacy_answers, batch_size=batch_size)
+    return len(legacy_answers)
+
+
+# ПЛАНЫ ЗАПРОСОВ ПО ЭНДПОИНТАМ
+
+def endpoint_queries():
+    """
+    Запросы горячих эндпоинтов в том виде, в котором их строят представления,
+    и индексы, на которые они рассчитаны.
+    """
+    user_id = (
+        TestResult.objects.values("user_id").annotate(n=Count("id")).order_by("-n")
+        .values_list("user_id", flat=True).first()
+    )
+    pathology_id = Case.objects.values_list("pathology_id", flat=True).first()
+    # Разбор по UserTestAnswer есть только у попыток в старом формате
+    test_result_id = UserTestAnswer.objects.values_list("test_result_id", flat=True).first()
+    case_ids = list(Case.objects.filter(pathology_id=pathology_id).values_list("id", flat=True)[:4])
+    question_ids = list(Question.objects.filter(case_id__in=case_ids).values_list("id", flat=True))
+
+    return [
+        ("profile-history", TestResult, ["testresult_user_created_idx"],
+         TestResult.objects.filter(user_id=user_id).order_by("-created_at")),
+        ("admin: results by pathology", TestResult, ["testresult_path_created_idx"],
+         TestResult.objects.filter(pathology_id=pathology_id).order_by("-created_at")[:100]),
+        ("get-test-tasks", Case, ["case_pathology_created_idx"],
+         Case.objects.filter(pathology_id=pathology_id).values_list("id", flat=True).order_by("?")[:4]),
+        # Разбор попыток, сохраненных до упаковки ответов в TestResult
+        ("history-detail", UserTestAnswer, ["usertestanswer_result_q_idx"],
+         UserTestAnswer.objects.filter(test_result_id=test_result_id).values_list("answer_id", flat=True)),
+        ("test-submit", Answer, ["answer_question_correct_idx"],
+         Answer.objects.filter(question_id__in=question_ids, is_correct=True)),
+    ]
+
+
+def explain_queryset(queryset, analyze=True):
+    if connection.vendor == "postgresql":
+        return queryset.explain(analyze=analyze, buffers=analyze)
+    return queryset.explain()
+
+
+def compare_plans(analyze=True):
+    """
+    Для каждого эндпоинта строит план с индексом и без него. Индекс удаляется
+    внутри транзакции, которая откатывается, — запускать только на тестовой базе:
+    DROP INDEX держит эксклюзивную блокировку таблицы до конца транзакции.
+    """
+    report = []
+    for endpoint, model, index_names, queryset in endpoint_queries():
+        with_index = explain_queryset(queryset, analyze)
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for name in index_names:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+            without_index = explain_queryset(queryset, analyze)
+            transaction.set_rollback(True)
+
+        report.append({
+            "endpoint": endpoint,
+            "indexes": index_names,
+            "with_index": with_index,
+            "without_index": without_index,
+        })
+    return report
+
+
+# НАГРУЗОЧНЫЙ ПРОГОН ЭНДПОИНТОВ
+
+BENCHMARK_ENDPOINTS = (
+    "atlas-list-info", "case-detail-info", "get-test-tasks", "test-submit", "profile-history", "history-detail",
+)
+
+
+def _benchmark_user():
+    user = (
+        Account.objects.filter(email__endswith=f"@{BENCHMARK_EMAIL_DOMAIN}")
+        .annotate(n=Count("test_results")).order_by("-n").first()
+    )
+    if user is None:
+        user = Account.objects.create_worker(
+            email=f"runner@{BENCHMARK_EMAIL_DOMAIN}", name="Бенчмарк", surname="Бенчмарк", password="bench"
+        )
+    return user
+
+
+def _client_for(user):
+    hosts = [h for h in settings.ALLOWED_HOSTS if h and h != "*" and not h.startswith(".")]
+    client = Client(SERVER_NAME=hosts[0] if hosts else "testserver")
+    token = RefreshToken.for_user(user).access_token
+    client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+
+def _submission_payload(tasks):
+    items = []
+    for case in tasks:
+        answers = []
+        for question in case["testsQuestions"]:
+            selected = [question["answers"][0]["id"]] if question["answers"] else []
+            answers.append({"questionId": question["id"], "selectedAnswers": selected})
+        items.append({"caseId": case["id"], "answers": answers})
+    return {"items": items, "duration": 300}
+
+
+def run_endpoints(iterations=50, warmup=5, endpoints=BENCHMARK_ENDPOINTS, seed_value=0, log=print):
+    """
+    Гоняет эндпоинты через тестовый клиент Django (внутри процесса, без сети)
+    и возвращает перцентили времени ответа и количество SQL-запросов.
+    """
+    rnd = random.Random(seed_value)
+    user = _benchmark_user()
+    client = _client_for(user)
+
+    case_ids = list(Case.objects.values_list("id", flat=True)[:5000])
+    pathology_ids = list(Case.objects.values_list("pathology_id", flat=True).distinct()[:5000])
+    result_ids = list(TestResult.objects.filter(user=user).values_list("id", flat=True)[:5000])
+    if not case_ids or not pathology_ids:
+        raise ValueError("База пуста: сначала выполните manage.py seed_benchmark")
+
+    samples = {name: {"ms": [], "queries": [], "statuses": {}} for name in endpoints}
+    last_tasks = []
+
+    def call(name):
+        nonlocal last_tasks
+        if name == "atlas-list-info":
+            return client.get(reverse(name))
+        if name == "case-detail-info":
+            return client.get(reverse(name, kwargs={"id": rnd.choice(case_ids)}))
+        if name == "get-test-tasks":
+            ids = rnd.sample(pathology_ids, min(len(pathology_ids), rnd.randint(1, 3)))
+            res = client.get(reverse(name, kwargs={"pathology_ids": "-".join(map(str, ids))}))
+            if res.status_code == 200:
+                last_tasks = res.json()["items"]
+            return res
+        if name == "test-submit":
+            if not last_tasks:
+                call("get-test-tasks")
+            res = client.post(reverse(name), _submission_payload(last_tasks), content_type="application/json")
+            if res.status_code == 201:
+                result_ids.append(res.json()["id"])
+            last_tasks = []
+            return res
+        if name == "profile-history":
+            return client.get(reverse(name))
+        if name == "history-detail":
+            if not result_ids:
+                call("test-submit")
+            return client.get(reverse(name, kwargs={"id": rnd.choice(result_ids)}))
+        raise ValueError(f"Неизвестный эндпоинт: {name}")
+
+    for _ in range(warmup):
+        for name in endpoints:
+            call(name)
+
+    for i in range(iterations):
+        for name in endpoints:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                res = call(name)
+                elapsed = (time.perf_counter() - start) * 1000
+            sample = samples[name]
+            sample["ms"].append(elapsed)
+            sample["queries"].append(len(queries))
+            sample["statuses"][res.status_code] = sample["statuses"].get(res.status_code, 0) + 1
+        if (i + 1) % 10 == 0:
+            log(f"Итераций: {i + 1}/{iterations}")
+
+    return {name: _summarize(sample) for name, sample in samples.items()}
+
+
+def _summarize(sample):
+    ms = sorted(sample["ms"])
+    queries = sorted(sample["queries"])
+    return {
+        "requests": len(ms),
+        "p50_ms": _quantile(ms, 0.50),
+        "p95_ms": _quantile(ms, 0.95),
+        "p99_ms": _quantile(ms, 0.99),
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+        "queries_p50": _quantile(queries, 0.50),
+        "queries_max": queries[-1] if queries else 0,
+        "statuses": {str(code): count for code, count in sorted(sample["statuses"].items())},
+    }
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return round(float(sorted_values[index]), 3)
+
+
+# ПРОГОН ПО HTTP (сравнение WSGI и ASGI развертываний)
+
+def http_login(base_url, email, password):
+    req = urllib.request.Request(
+        f"{base_url}/api/auth/login/",
+        data=json.dumps({"email": email, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=30) as res:
+        return json.loads(res.read())["access_token"]
+
+
+def run_http_load(base_url, paths, concurrency, duration, token=None, timeout=30):
+    """
+    Держит concurrency одновременных клиентов, которые duration секунд по кругу
+    запрашивают paths. Возвращает пропускную способность и перцентили задержки.
+    """
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+    latencies = []
+    errors = {}
+
+    def worker(offset):
+        i = offset
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(base_url + path, headers=headers),
+                                            timeout=timeout) as res:
+                    res.read()
+                    code = res.status
+            except urllib.error.HTTPError as exc:
+                code = exc.code
+            except (urllib.error.URLError, OSError) as exc:
+                code = type(exc).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors[str(code)] = errors.get(str(code), 0) + 1
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for n in range(concurrency):
+            pool.submit(worker, n)
+    wall = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": _quantile(latencies, 0.50),
+        "p95_ms": _quantile(latencies, 0.95),
+        "p99_ms": _quantile(latencies, 0.99),
+        "errors": errors,
+    }
@@ -0,0 +1,141 @@
+# cache_warming.py
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.test import RequestFactory
+
+from .local_cache import local_cache
+from .models import Case, Pathology
+from .views import (
+    AdminPathologyListInfoView, AtlasSnapshotView, CaseDetailInfoView, ClinicalCaseListView, GetTestTasksView,
+    PathologyDetailView, PathologyListInfoView, TestListInfoView, TutorialListView,
+)
+
+
+# Прогрев кэша ответов после релиза или перезапуска воркера: каталог, карточки патологий
+# и кейсов, данные кейсов для тестов, туториалы и снимок атласа собираются заранее теми же
+# представлениями и под теми же ключами (response_cache), что и при запросе клиента.
+# Кэш по умолчанию — locmem, свой у каждого воркера: прогревать нужно в самом воркере
+# (gunicorn.conf.py, WARM_CACHES_ON_START=1). manage.py warm_caches заполняет только кэш
+# своего процесса и полезен с общим бэкендом кэша (Redis, Memcached).
+
+# Сколько ждать подключения listener local_cache перед прогревом, секунды
+LISTENER_WAIT = 30
+
+logger = logging.getLogger("main.cache_warming")
+
+
+def _view(view_class, request, **kwargs):
+    # Обработчик вызывается напрямую, без dispatch: проверка прав не нужна, ответ не отдается
+    view = view_class(args=(), kwargs=kwargs, format_kwarg=None)
+    view.request = view.initialize_request(request)
+    return view
+
+
+def _list(view_class):
+    def build(request):
+        view = _view(view_class, request)
+        return view.list(view.request)
+    return build
+
+
+def _retrieve(view_class, object_id):
+    def build(request):
+        view = _view(view_class, request, id=object_id)
+        return view.retrieve(view.request, id=object_id)
+    return build
+
+
+def _snapshot(request):
+    view = _view(AtlasSnapshotView, request)
+    return view.get(view.request)
+
+
+def _test_task(case_id):
+    def build(request):
+        view = _view(GetTestTasksView, request)
+        return view.cached_task(view.request, case_id)
+    return build
+
+
+def targets():
+    """(имя, функция request -> ...) для всего, что кэширует response_cache."""
+    items = [
+        ("atlas-list", _list(PathologyListInfoView)),
+        ("admin-atlas-list", _list(AdminPathologyListInfoView)),
+        ("test-list", _list(TestListInfoView)),
+        ("clinical-cases", _list(ClinicalCaseListView)),
+        ("tutorials", _list(TutorialListView)),
+        ("atlas-snapshot", _snapshot),
+    ]
+    for pathology_id in Pathology.objects.order_by("rank", "id").values_list("id", flat=True):
+        items.append(("pathology-detail", _retrieve(PathologyDetailView, pathology_id)))
+    for case_id in Case.objects.order_by("id").values_list("id", flat=True):
+        items.append(("case-detail", _retrieve(CaseDetailInfoView, case_id)))
+        items.append(("test-task", _test_task(case_id)))
+    return items
+
+
+def warm(host=None, scheme=None, workers=None, log=logger.info):
+    """
+    Собирает все записи targets() в workers потоков. Возвращает статистику по именам:
+    {имя: {"count", "seconds", "max", "errors"}} и общее время в "total".
+    """
+    host = host or settings.CACHE_WARM_HOST
+    scheme = scheme or settings.CACHE_WARM_SCHEME
+    workers = workers or settings.CACHE_WARM_WORKERS
+    request = RequestFactory().get("/", HTTP_HOST=host, secure=scheme == "https")
+    start = time.monotonic()
+
+    # Наборы в памяти процесса (id кейсов по патологиям, туториалы)
+    for name in ("cases", "tutorials"):
+        local_cache.get(name)
+
+    items = targets()
+    # Потоки получают по своей доле целей и закрывают соединения с базой в конце
+    shares = [items[i::workers] for i in range(workers)]
+    stats = defaultdict(lambda: {"count": 0, "seconds": 0.0, "max": 0.0, "errors": 0})
+
+    def run(share):
+        timings = []
+        try:
+            for name, build in share:
+                item_start = time.monotonic()
+                try:
+                    build(request)
+                    error = False
+                except Exception:
+                    logger.exception("Прогрев кэша: ошибка сборки %s", name)
+                    error = True
+                timings.append((name, time.monotonic() - item_start, error))
+        finally:
+            connections.close_all()
+        return timings
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warm-caches") as executor:
+        for timings in executor.map(run, shares):
+            for name, seconds, error in timings:
+                entry = stats[name]
+                entry["count"] += 1
+                entry["seconds"] += seconds
+                entry["max"] = max(entry["max"], seconds)
+                entry["errors"] += error
+
+    for name in dict.fromkeys(name for name, _ in items):
+        entry = stats[name]
+        log(f"{name}: {entry['count']} шт., {entry['seconds']:.2f} с, макс. {entry['max'] * 1000:.0f} мс"
+            + (f", ошибок: {entry['errors']}" if entry["errors"] else ""))
+    total = time.monotonic() - start
+    log(f"Кэш прогрет за {total:.2f} с ({scheme}://{host}, потоков: {workers})")
+    return {"total": total, **stats}
+
+
+def warm_on_start():
+    """Прогрев в воркере gunicorn после запуска listener (gunicorn.conf.py)."""
+    # Подключение listener сбрасывает кэш ответов — прогретое до него пропало бы
+    local_cache.wait_listener(LISTENER_WAIT)
+    warm()
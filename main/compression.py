@@ -0,0 +1,80 @@
+# compression.py
+import gzip
+
+from django.conf import settings
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Сжатие ответов: выбор кодировки по Accept-Encoding и само сжатие.
+# Используется CompressionMiddleware (динамические ответы) и response_cache
+# (кэшированные ответы хранятся уже сжатыми, по варианту на кодировку).
+
+# В порядке предпочтения при равном q
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+COMPRESSIBLE_TYPES = ("application/json", "text/plain")
+
+BROTLI_QUALITY = 5
+# Для кэша сжимаем один раз, поэтому сильнее
+CACHED_BROTLI_QUALITY = 11
+CACHED_GZIP_LEVEL = 9
+
+
+def accepted_encodings(header):
+    """Accept-Encoding -> {кодировка: q}."""
+    result = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        result[name] = q
+    return result
+
+
+def choose_encoding(request, available=SUPPORTED_ENCODINGS):
+    """Лучшая из доступных кодировок, которую принимает клиент, или None."""
+    accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING"))
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body, encoding, cached=False):
+    if encoding == "br":
+        return brotli.compress(body, quality=CACHED_BROTLI_QUALITY if cached else BROTLI_QUALITY)
+    if cached:
+        # Кэшированные ответы одинаковы для всех и не содержат секретов — случайное
+        # дополнение против BREACH им не нужно, а mtime=0 дает одинаковые байты
+        return gzip.compress(body, compresslevel=CACHED_GZIP_LEVEL, mtime=0)
+    # Как в GZipMiddleware: случайные байты в заголовке gzip меняют длину ответа (BREACH)
+    return compress_string(body, max_random_bytes=100)
+
+
+def is_compressible(request, response):
+    if response.streaming or response.has_header("Content-Encoding"):
+        return False
+    if response.get("Content-Type", "").split(";")[0].strip() not in COMPRESSIBLE_TYPES:
+        return False
+    if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+        return False
+    # Ответы с токенами и куками не сжимаем: секрет рядом с данными запроса — условие BREACH
+    if response.cookies or request.path.startswith(settings.COMPRESSION_EXCLUDED_PATHS):
+        return False
+    return True
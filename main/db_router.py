@@ -0,0 +1,108 @@
+# db_router.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+# Чтение с реплики PostgreSQL (алиас "replica", задается DB_REPLICA_HOST в settings.py).
+# Реплика используется только внутри запроса на чтение (GET/HEAD/OPTIONS) к представлению
+# с read_replica = True; все остальное, включая записи, идет в default.
+# Read-your-writes: после успешного запроса на запись клиент получает куку на
+# DB_REPLICA_STICKY_SECONDS секунд, и пока она есть, его запросы читают с default —
+# отставание реплики не спрячет только что отправленный тест.
+
+REPLICA = "replica"
+STICKY_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Чтение с реплики (или, с enabled=False, принудительно с default) внутри блока."""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def primary_reads():
+    return replica_reads(False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_configured():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия default, объекты из обеих баз связаны
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            # Синхронный process_view Django под ASGI вызывал бы через sync_to_async, в потоке
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.finish_reads(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.finish_reads(request)
+        return self.process_response(request, response)
+
+    @staticmethod
+    def finish_reads(request):
+        # Не reset(token): под ASGI process_view и __call__ выполняются в разных контекстах
+        if getattr(request, "_replica_reads", False):
+            _use_replica.set(False)
+
+    @staticmethod
+    def process_response(request, response):
+        if (request.method not in SAFE_METHODS and response.status_code < 400 and replica_configured()):
+            response.set_cookie(
+                STICKY_COOKIE, "1", max_age=settings.DB_REPLICA_STICKY_SECONDS,
+                httponly=True, samesite="Lax", secure=request.is_secure(),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+        if (request.method in SAFE_METHODS and getattr(view_class, "read_replica", False)
+                and STICKY_COOKIE not in request.COOKIES and replica_configured()):
+            request._replica_reads = True
+            _use_replica.set(True)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        ReplicaRoutingMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
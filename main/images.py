@@ -0,0 +1,99 @@
+# images.py
+import io
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import models
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# Обработка картинок при загрузке: размер ограничивается IMAGE_MAX_DIMENSION по большей
+# стороне, EXIF удаляется (ориентация применяется к пикселям), картинка перекодируется
+# в JPEG с качеством IMAGE_JPEG_QUALITY или в PNG, если есть прозрачность.
+# Размеры и объем файла сохраняются рядом с полем: <поле>_width, <поле>_height, <поле>_size —
+# клиент может зарезервировать место под картинку, не скачивая ее.
+#
+# Память: для JPEG декодер через draft() сразу распаковывает уменьшенную в 2–8 раз картинку,
+# для остальных форматов thumbnail() сначала уменьшает в целое число раз через reduce()
+# и только потом применяет точный фильтр.
+
+# Запас для reduce(): итоговое сглаживание идет по картинке не больше чем в 3 раза крупнее результата
+REDUCING_GAP = 3.0
+# Форматы, которые можно оставить как есть, если картинка уже небольшая и без EXIF
+PASSTHROUGH_FORMATS = {"JPEG", "PNG"}
+
+
+class ImageProcessingError(Exception):
+    pass
+
+
+def dimension_fields(name):
+    return f"{name}_width", f"{name}_height", f"{name}_size"
+
+
+def image_fields():
+    """(модель, имя поля) для всех ImageField приложения, у которых есть поля размеров."""
+    for model in apps.get_app_config("main").get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.ImageField):
+                width_field = dimension_fields(field.name)[0]
+                if any(f.name == width_field for f in model._meta.concrete_fields):
+                    yield model, field.name
+
+
+def read_dimensions(file):
+    """Размеры по заголовку файла, без декодирования пикселей."""
+    with Image.open(file) as img:
+        width, height = img.size
+    return width, height
+
+
+def process_upload(name, upload):
+    """Значения для сохранения поля name: обработанный файл и его размеры."""
+    content, width, height = process_image(upload)
+    width_field, height_field, size_field = dimension_fields(name)
+    return {name: content, width_field: width, height_field: height, size_field: content.size}
+
+
+def process_image(upload):
+    max_side = settings.IMAGE_MAX_DIMENSION
+    upload.seek(0)
+    try:
+        with Image.open(upload) as img:
+            source_format = img.format
+            if (source_format in PASSTHROUGH_FORMATS and max(img.size) <= max_side
+                    and not img.getexif()):
+                width, height = img.size
+                upload.seek(0)
+                return ContentFile(upload.read(), name=os.path.basename(upload.name)), width, height
+
+            # Только заголовок прочитан: draft() выбирает масштаб декодирования JPEG
+            img.draft(None, (max_side, max_side))
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+            img = ImageOps.exif_transpose(img)
+            return _encode(img, upload.name)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        raise ImageProcessingError(f"Не удалось обработать изображение: {exc}")
+    except OSError as exc:
+        # Обрезанный или поврежденный файл
+        raise ImageProcessingError(f"Поврежденное изображение: {exc}")
+
+
+def _encode(img, original_name):
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+    base = os.path.splitext(os.path.basename(original_name))[0]
+    buffer = io.BytesIO()
+    # EXIF не передается; цветовой профиль оставляем, иначе поплывут цвета
+    options = {"icc_profile": img.info.get("icc_profile")} if img.info.get("icc_profile") else {}
+
+    if has_alpha:
+        img = img.convert("RGBA")
+        img.save(buffer, "PNG", optimize=True, **options)
+        name = f"{base}.png"
+    else:
+        img = img.convert("RGB")
+        img.save(buffer, "JPEG", quality=settings.IMAGE_JPEG_QUALITY, optimize=True, progressive=True, **options)
+        name = f"{base}.jpg"
+    return ContentFile(buffer.getvalue(), name=name), img.width, img.height
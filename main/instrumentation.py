@@ -0,0 +1,220 @@
+# instrumentation.py
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework import serializers
+
+
+# Сколько последних запросов храним на каждый url_name
+ROLLING_WINDOW = 1000
+# Границы бакетов гистограммы (мс)
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Сколько SQL держим в памяти на один запрос (для лога медленных запросов)
+MAX_CAPTURED_QUERIES = 50
+
+_current_stats = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = (
+        "started", "query_count", "db_time", "queries", "db_connections",
+        "cache_hits", "cache_misses", "serializer_time", "_serializer_depth",
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.queries = []
+        self.db_connections = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.serializer_time = 0.0
+        self._serializer_depth = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current_stats.set(stats)
+
+
+def finish_request(token):
+    _current_stats.reset(token)
+
+
+def current_stats():
+    return _current_stats.get()
+
+
+# БАЗА ДАННЫХ
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        stats.query_count += 1
+        stats.db_time += duration
+        if len(stats.queries) < MAX_CAPTURED_QUERIES:
+            stats.queries.append((sql, duration))
+
+
+def install_db_instrumentation(sender, connection, **kwargs):
+    # Вызывается по сигналу connection_created для каждого нового соединения
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+    # Запрос, который ходил в БД и не открыл ни одного соединения, считается переиспользованием
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.db_connections += 1
+
+
+# КЭШ
+
+class InstrumentedCacheMixin:
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = super().get(key, sentinel, version=version)
+        hit = value is not sentinel
+        _record_cache(hits=int(hit), misses=int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        _record_cache(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    # Память процесса без ввода-вывода: BaseCache.aget увел бы чтение в поток sync_to_async
+    async def aget(self, key, default=None, version=None):
+        return self.get(key, default, version=version)
+
+
+def _record_cache(hits=0, misses=0):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+# СЕРИАЛИЗАТОРЫ
+
+def _timed_data(fget):
+    def data(self):
+        stats = _current_stats.get()
+        if stats is None:
+            return fget(self)
+        # Вложенные .data (например HistoryAnswerSerializer внутри HistoryQuestionSerializer)
+        # не должны учитываться дважды
+        stats._serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            stats._serializer_depth -= 1
+            if stats._serializer_depth == 0:
+                stats.serializer_time += time.perf_counter() - start
+
+    data._instrumented = True
+    return data
+
+
+def install_serializer_instrumentation():
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        fget = cls.data.fget
+        if not getattr(fget, "_instrumented", False):
+            cls.data = property(_timed_data(fget))
+
+
+# СКОЛЬЗЯЩАЯ ГИСТОГРАММА
+
+class RequestMetricsRegistry:
+    def __init__(self, window=ROLLING_WINDOW, buckets=HISTOGRAM_BUCKETS_MS):
+        self.window = window
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals = defaultdict(int)
+
+    def record(self, url_name, stats, status_code):
+        sample = (
+            stats.elapsed * 1000,
+            stats.query_count,
+            stats.db_time * 1000,
+            stats.cache_hits,
+            stats.cache_misses,
+            stats.serializer_time * 1000,
+            status_code,
+            stats.db_connections,
+        )
+        with self._lock:
+            self._samples[url_name].append(sample)
+            self._totals[url_name] += 1
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+    def snapshot(self):
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            totals = dict(self._totals)
+
+        result = {}
+        for name, values in samples.items():
+            durations = sorted(v[0] for v in values)
+            count = len(values)
+            with_db = [v for v in values if v[1]]
+            histogram = {}
+            for bound in self.buckets:
+                histogram[f"le_{bound}"] = sum(1 for d in durations if d <= bound)
+            histogram["le_inf"] = count
+
+            result[name] = {
+                "total_requests": totals.get(name, count),
+                "window": count,
+                "wall_ms": {
+                    "p50": _percentile(durations, 50),
+                    "p95": _percentile(durations, 95),
+                    "p99": _percentile(durations, 99),
+                    "max": round(durations[-1], 3),
+                },
+                "histogram_ms": histogram,
+                "avg_queries": round(sum(v[1] for v in values) / count, 2),
+                "avg_db_ms": round(sum(v[2] for v in values) / count, 3),
+                "cache_hits": sum(v[3] for v in values),
+                "cache_misses": sum(v[4] for v in values),
+                "avg_serializer_ms": round(sum(v[5] for v in values) / count, 3),
+                "errors": sum(1 for v in values if v[6] >= 500),
+                "db_connections_opened": sum(v[7] for v in values),
+                "db_connection_reuse": round(
+                    sum(1 for v in with_db if not v[7]) / len(with_db), 3
+                ) if with_db else None,
+            }
+        return result
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 3)
+
+
+registry = RequestMetricsRegistry()
@@ -0,0 +1,234 @@
+# local_cache.py
+import logging
+import os
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from . import db_router
+from .models import Case, Pathology, VideoTutorial
+
+
+# Небольшие часто читаемые наборы данных в памяти процесса (воркера gunicorn):
+# id кейсов по патологиям и туториалы. Чтение — без запроса к базе и без сети.
+#
+# Сброс между воркерами идет через PostgreSQL LISTEN/NOTIFY: запись в модели делает
+# pg_notify в своей транзакции (уведомление доставляется только после коммита), а поток
+# listener в каждом воркере получает его и сбрасывает набор. Тот же канал разносит сброс
+# response_cache: кэш Django по умолчанию — locmem, у каждого воркера свой.
+# Без listener (runserver, тесты, команды, SQLite) наборы живут LOCAL_CACHE_TTL секунд.
+
+CHANNEL = "main_local_cache"
+# Как часто listener проверяет флаг остановки, секунды
+POLL_TIMEOUT = 5
+RECONNECT_DELAY = 5
+
+logger = logging.getLogger("main.local_cache")
+
+
+class LocalCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> загрузчик; name -> (значение, время загрузки); name -> номер сброса
+        self._loaders = {}
+        self._entries = {}
+        self._versions = {}
+        # тема -> обработчики уведомлений (сброс наборов и, например, response_cache)
+        self._subscribers = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._connected = threading.Event()
+        self.listening = False
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+        self._versions[name] = 0
+        self.subscribe(name, lambda: self.invalidate_local(name))
+
+    def subscribe(self, topic, callback):
+        self._subscribers.setdefault(topic, []).append(callback)
+
+    # Чтение
+
+    def get(self, name):
+        entry = self._entries.get(name)
+        if entry is not None:
+            value, loaded_at = entry
+            if self.listening or time.monotonic() - loaded_at < settings.LOCAL_CACHE_TTL:
+                return value
+        version = self._versions[name]
+        # Набор живет до уведомления об изменении: читаем с default, а не с отстающей реплики
+        with db_router.primary_reads():
+            value = self._loaders[name]()
+        with self._lock:
+            # Сброс во время загрузки: значение могло быть прочитано до изменения, не сохраняем.
+            # В транзакции видны незакоммиченные изменения, которые еще могут откатиться
+            if self._versions[name] == version and not connection.in_atomic_block:
+                self._entries[name] = (value, time.monotonic())
+        return value
+
+    # Сброс
+
+    def invalidate_local(self, name=None):
+        with self._lock:
+            for key in [name] if name else list(self._loaders):
+                self._versions[key] += 1
+                self._entries.pop(key, None)
+
+    def publish(self, *topics):
+        """
+        Сбрасывает темы в этом процессе сейчас и после коммита, в остальных — через NOTIFY.
+        На PostgreSQL уведомление уходит в транзакции и при откате не доставляется.
+        """
+        self._deliver(topics)
+        transaction.on_commit(lambda: self._deliver(topics))
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, ",".join(topics)])
+
+    def _deliver(self, topics):
+        for topic in topics:
+            for callback in self._subscribers.get(topic, ()):
+                callback()
+
+    def _deliver_all(self):
+        # Пока listener не был подключен, уведомления могли потеряться
+        self._deliver(list(self._subscribers))
+
+    # Listener
+
+    def start_listener(self):
+        """Запускается в каждом воркере после fork (gunicorn.conf.py: post_worker_init)."""
+        if connection.vendor != "postgresql" or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="local-cache-listener", daemon=True)
+        self._thread.start()
+
+    def wait_listener(self, timeout):
+        """Ждет подключения listener, если он запущен: при подключении все сбрасывается."""
+        if self._thread and self._thread.is_alive():
+            return self._connected.wait(timeout)
+        return False
+
+    def stop_listener(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(POLL_TIMEOUT + 1)
+
+    def _listen_forever(self):
+        while not self._stop.is_set():
+            wrapper = None
+            try:
+                wrapper = self._connect()
+                self.listening = True
+                self._deliver_all()
+                self._connected.set()
+                self._poll(wrapper.connection)
+            except Exception:
+                logger.exception("local cache listener: соединение потеряно, переподключение")
+            finally:
+                # Без уведомлений наборы снова живут по TTL
+                self._connected.clear()
+                self.listening = False
+                self._deliver_all()
+                if wrapper is not None:
+                    try:
+                        wrapper.close()
+                    except Exception:
+                        pass
+            self._stop.wait(RECONNECT_DELAY)
+
+    def _connect(self):
+        # Отдельное соединение в autocommit. За pgbouncer в transaction pooling LISTEN не работает —
+        # тогда DB_LISTEN_HOST/DB_LISTEN_PORT указывают на PostgreSQL напрямую
+        wrapper = connections.create_connection("default")
+        if settings.LOCAL_CACHE_LISTEN_HOST:
+            wrapper.settings_dict = {
+                **wrapper.settings_dict,
+                "HOST": settings.LOCAL_CACHE_LISTEN_HOST,
+                "PORT": settings.LOCAL_CACHE_LISTEN_PORT or wrapper.settings_dict["PORT"],
+            }
+        wrapper.connect()
+        wrapper.set_autocommit(True)
+        with wrapper.connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        logger.info("local cache listener: pid %s слушает %s", os.getpid(), CHANNEL)
+        return wrapper
+
+    def _poll(self, raw):
+        if hasattr(raw, "poll"):
+            # psycopg2
+            while not self._stop.is_set():
+                if select.select([raw], [], [], POLL_TIMEOUT) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    self._deliver(raw.notifies.pop(0).payload.split(","))
+        else:
+            # psycopg 3
+            while not self._stop.is_set():
+                for notify in raw.notifies(timeout=POLL_TIMEOUT):
+                    self._deliver(notify.payload.split(","))
+
+
+local_cache = LocalCache()
+
+
+# НАБОРЫ ДАННЫХ
+
+def load_cases():
+    by_pathology = {}
+    pathology_by_case = {}
+    for case_id, pathology_id in Case.objects.order_by("id").values_list("id", "pathology_id"):
+        by_pathology.setdefault(pathology_id, []).append(case_id)
+        pathology_by_case[case_id] = pathology_id
+    return {"by_pathology": by_pathology, "pathology": pathology_by_case}
+
+
+def load_tutorials():
+    return {tutorial.id: tutorial for tutorial in VideoTutorial.objects.all()}
+
+
+local_cache.register("cases", load_cases)
+local_cache.register("tutorials", load_tutorials)
+
+# модель -> наборы, которые от нее зависят
+DATASETS_BY_MODEL = {
+    Pathology: ("cases",),
+    Case: ("cases",),
+    VideoTutorial: ("tutorials",),
+}
+
+
+def case_ids_by_pathology():
+    return local_cache.get("cases")["by_pathology"]
+
+
+def pathology_of_case(case_id):
+    return local_cache.get("cases")["pathology"].get(case_id)
+
+
+def tutorial(tutorial_id):
+    return local_cache.get("tutorials").get(tutorial_id)
+
+
+def changed(*models):
+    """Сброс наборов, зависящих от моделей (и после bulk-операций без сигналов)."""
+    local_cache.publish(*sorted({name for model in models for name in DATASETS_BY_MODEL[model]}))
+
+
+def on_changed(sender, raw=False, **kwargs):
+    if not raw:
+        changed(sender)
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+
+    for model in DATASETS_BY_MODEL:
+        post_save.connect(on_changed, sender=model, dispatch_uid=f"local_cache_{model.__name__}")
+        post_delete.connect(on_changed, sender=model, dispatch_uid=f"local_cache_del_{model.__name__}")
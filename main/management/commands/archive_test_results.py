@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from main import partitions
+
+
+class Command(BaseCommand):
+    help = ("Подготовить секции попыток тестов на ближайшие месяцы и выгрузить в архив (CSV.gz) "
+            "и удалить секции старше срока хранения. Только PostgreSQL")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-months", type=int,
+                            help="Сколько месяцев хранить в базе (по умолчанию TEST_RESULTS_RETENTION_MONTHS)")
+        parser.add_argument("--months-ahead", type=int,
+                            help="На сколько месяцев вперед создать секции "
+                                 "(по умолчанию TEST_RESULTS_PARTITION_MONTHS_AHEAD)")
+        parser.add_argument("--output-dir", help="Каталог архива (по умолчанию TEST_RESULTS_ARCHIVE_DIR)")
+        parser.add_argument("--keep-tables", action="store_true",
+                            help="Не удалять отсоединенные секции, оставить отдельными таблицами")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет архивировано")
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported(connection):
+            raise CommandError("Секционирование попыток тестов поддерживается только на PostgreSQL")
+        log = self.stdout.write
+        output_dir = str(options["output_dir"] or settings.TEST_RESULTS_ARCHIVE_DIR)
+        months = partitions.archive_candidates(options["keep_months"])
+
+        if options["dry_run"]:
+            for month in months:
+                log(f"{month:%Y-%m}: будет выгружен в {output_dir}")
+            self.stdout.write(self.style.SUCCESS(f"Месяцев к архивации: {len(months)}"))
+            return
+
+        created = partitions.ensure_partitions(options["months_ahead"], log=log)
+        rows = 0
+        for month in months:
+            rows += sum(partitions.archive_month(month, output_dir, options["keep_tables"], log=log).values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано секций: {created}, архивировано месяцев: {len(months)}, выгружено строк: {rows}"
+        ))
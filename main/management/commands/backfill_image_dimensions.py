@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from main import images
+
+
+class Command(BaseCommand):
+    help = ("Заполнить размеры картинок, загруженных до обработки при загрузке "
+            "(--reencode: заодно уменьшить и перекодировать их)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reencode", action="store_true",
+                            help="Прогнать картинки через images.process_image; старые файлы остаются для gc_media")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model, name in images.image_fields():
+            width_field, height_field, size_field = images.dimension_fields(name)
+            queryset = model._default_manager.order_by().exclude(**{name: ""})
+            if not options["reencode"]:
+                queryset = queryset.filter(**{f"{width_field}__isnull": True})
+
+            updated = failed = 0
+            for obj in queryset.only("pk", name).iterator(chunk_size=options["batch_size"]):
+                file = getattr(obj, name)
+                try:
+                    with file.open("rb"):
+                        if options["reencode"]:
+                            content, width, height = images.process_image(file)
+                        else:
+                            width, height = images.read_dimensions(file)
+                    values = {width_field: width, height_field: height}
+                    if options["reencode"]:
+                        file.save(content.name, content, save=False)
+                        values[name] = file.name
+                        values[size_field] = content.size
+                    else:
+                        values[size_field] = file.size
+                except (OSError, images.ImageProcessingError) as exc:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {obj.pk} {file.name}: {exc}")
+                    continue
+                model._default_manager.filter(pk=obj.pk).update(**values)
+                updated += 1
+            self.stdout.write(f"{model.__name__}.{name}: обновлено {updated}, ошибок {failed}")
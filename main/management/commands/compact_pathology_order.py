@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.models import pathology_ordering
+
+
+class Command(BaseCommand):
+    help = "Выровнять номера и ранги патологий (обычно делается автоматически в фоне после изменений)"
+
+    def handle(self, *args, **options):
+        updated = pathology_ordering.compact()
+        self.stdout.write(f"Обновлено строк: {updated}")
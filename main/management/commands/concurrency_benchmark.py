@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import benchmark
+
+
+DEFAULT_PATHS = (
+    "/api/atlas/atlas-list/",
+    "/api/tutorial/tutorials-list/",
+    "/api/account/try-list/",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузка по HTTP на запущенный сервер с растущим числом одновременных клиентов. "
+        "Запустите против WSGI (docker-compose.yml) и ASGI (docker-compose.asgi.yml) и сравните отчеты."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://localhost:8000")
+        parser.add_argument("--email", default="user0@bench.local")
+        parser.add_argument("--password", default="bench")
+        parser.add_argument("--concurrency", default="1,10,50,100",
+                            help="Уровни параллельности через запятую")
+        parser.add_argument("--duration", type=int, default=20, help="Секунд на каждый уровень")
+        parser.add_argument("--path", action="append", help="Путь для запросов (можно несколько раз)")
+        parser.add_argument("--label", default="", help="Подпись прогона в отчете, например wsgi или asgi")
+        parser.add_argument("--output", help="Записать отчет в файл")
+
+    def handle(self, *args, **options):
+        base_url = options["url"].rstrip("/")
+        try:
+            token = benchmark.http_login(base_url, options["email"], options["password"])
+        except OSError as exc:
+            raise CommandError(f"Не удалось войти на {base_url}: {exc}")
+
+        paths = options["path"] or list(DEFAULT_PATHS)
+        levels = []
+        for concurrency in [int(x) for x in options["concurrency"].split(",") if x.strip()]:
+            result = benchmark.run_http_load(base_url, paths, concurrency, options["duration"], token=token)
+            self.stderr.write(
+                f"c={concurrency}: {result['rps']} rps, p50={result['p50_ms']} ms, "
+                f"p99={result['p99_ms']} ms, errors={result['errors']}"
+            )
+            levels.append(result)
+
+        payload = json.dumps({"label": options["label"], "url": base_url, "paths": paths, "levels": levels},
+                             ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(payload)
+        self.stdout.write(payload)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main.atlas_bundle import export_bundle
+
+
+class Command(BaseCommand):
+    help = "Выгрузить атлас (патологии, кейсы, слои, схемы, вопросы, ответы и файлы) в zip-архив"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Путь к создаваемому архиву")
+        parser.add_argument("--pathology", type=int, action="append", dest="pathologies",
+                            help="ID патологии (можно несколько раз). По умолчанию — весь атлас")
+
+    def handle(self, *args, **options):
+        export_bundle(options["output"], pathology_ids=options["pathologies"])
+        self.stdout.write(f"Архив записан: {options['output']}")
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from main import media_gc
+
+
+class Command(BaseCommand):
+    help = "Удалить из MEDIA_ROOT файлы, на которые не ссылается ни одно FileField/ImageField"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет удалено")
+        parser.add_argument("--quarantine", action="store_true",
+                            help="Переносить в MEDIA_QUARANTINE_DIR вместо удаления")
+        parser.add_argument("--grace-hours", type=float, default=24,
+                            help="Не трогать файлы моложе этого срока (по умолчанию 24)")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--pause", type=float, default=0.0, help="Пауза между пачками, секунды")
+        parser.add_argument("--limit", type=int, help="Остановиться после стольких файлов (кратно пачке)")
+        parser.add_argument("--purge-quarantine-days", type=float,
+                            help="Удалить из карантина файлы, перенесенные раньше этого срока")
+        parser.add_argument("--upload-ttl-days", type=float, default=7,
+                            help="Брошенные загрузки видео старше этого срока считаются неудачными (по умолчанию 7)")
+
+    def handle(self, *args, **options):
+        log = self.stdout.write
+        dry_run = options["dry_run"]
+
+        stats = media_gc.collect(
+            grace=timedelta(hours=options["grace_hours"]), batch_size=options["batch_size"],
+            quarantine=options["quarantine"], dry_run=dry_run, limit=options["limit"],
+            pause=options["pause"], log=log,
+        )
+        uploads_removed = media_gc.clean_stale_uploads(
+            timedelta(days=options["upload_ttl_days"]), dry_run=dry_run, log=log
+        )
+        purged = 0
+        if options["purge_quarantine_days"] is not None:
+            purged = media_gc.purge_quarantine(
+                timedelta(days=options["purge_quarantine_days"]), dry_run=dry_run, log=log
+            )
+
+        action = "будет удалено" if dry_run else ("перенесено в карантин" if options["quarantine"] else "удалено")
+        self.stdout.write(self.style.SUCCESS(
+            f"Просмотрено файлов: {stats['scanned']}, ссылок в базе: {stats['referenced']}, "
+            f"без ссылок: {stats['orphaned']} ({stats['bytes'] / 1024 / 1024:.1f} МБ), {action}: "
+            f"{stats['orphaned'] if dry_run else stats['removed']}. "
+            f"Временных файлов загрузок: {uploads_removed}, очищено из карантина: {purged}"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.atlas_bundle import RECORDS_CHUNK_SIZE, BundleError, import_bundle
+
+
+class Command(BaseCommand):
+    help = "Загрузить архив атласа (см. export_atlas). Прерванный импорт продолжается при повторном запуске"
+
+    def add_arguments(self, parser):
+        parser.add_argument("bundle", help="Путь к архиву")
+        parser.add_argument("--batch-size", type=int, default=RECORDS_CHUNK_SIZE)
+        parser.add_argument("--restart", action="store_true", help="Игнорировать сохраненный прогресс")
+
+    def handle(self, *args, **options):
+        try:
+            created = import_bundle(
+                options["bundle"], batch_size=options["batch_size"],
+                restart=options["restart"], log=self.stdout.write,
+            )
+        except BundleError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Импортировано: {created}"))
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from main import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Планы запросов горячих эндпоинтов с составными индексами и без них. "
+        "Только для тестовой базы: индексы временно удаляются в откатываемой транзакции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", action="store_true", help="Сначала сгенерировать фикстуры")
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--pathologies", type=int, default=30)
+        parser.add_argument("--cases-per-pathology", type=int, default=20)
+        parser.add_argument("--results-per-user", type=int, default=200)
+        parser.add_argument("--no-analyze", action="store_true", help="EXPLAIN без выполнения запросов")
+        parser.add_argument("--json", action="store_true")
+        parser.add_argument("--yes", action="store_true", help="Не спрашивать подтверждение")
+
+    def handle(self, *args, **options):
+        if not options["yes"] and connection.vendor == "postgresql":
+            answer = input(f"База {connection.settings_dict['NAME']}: индексы будут временно удалены. Продолжить? [y/N] ")
+            if answer.lower() != "y":
+                raise CommandError("Отменено")
+
+        if options["seed"]:
+            benchmark.seed(
+                users=options["users"],
+                pathologies=options["pathologies"],
+                cases_per_pathology=options["cases_per_pathology"],
+                results_per_user=options["results_per_user"],
+                log=self.stdout.write,
+            )
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+
+        report = benchmark.compare_plans(analyze=not options["no_analyze"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        for item in report:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{item['endpoint']} ({', '.join(item['indexes'])})"))
+            self.stdout.write(self.style.SUCCESS("С индексом:"))
+            self.stdout.write(item["with_index"])
+            self.stdout.write(self.style.WARNING("Без индекса:"))
+            self.stdout.write(item["without_index"])
+            self.stdout.write("")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main import search
+
+
+class Command(BaseCommand):
+    help = "Переиндексировать атлас для полнотекстового поиска (после импорта или массовых изменений)"
+
+    def handle(self, *args, **options):
+        total = search.rebuild()
+        self.stdout.write(f"Проиндексировано документов: {total}")
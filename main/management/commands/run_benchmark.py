@@ -0,0 +1,66 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from main import benchmark
+
+
+class Command(BaseCommand):
+    help = "Прогоняет основные эндпоинты и выводит p50/p95/p99 и количество SQL в JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--endpoint", action="append", choices=benchmark.BENCHMARK_ENDPOINTS,
+                            help="Ограничить прогон эндпоинтом (можно несколько раз)")
+        parser.add_argument("--output", help="Записать отчет в файл")
+        parser.add_argument("--compare", help="Отчет предыдущего прогона для сравнения p95")
+
+    def handle(self, *args, **options):
+        results = benchmark.run_endpoints(
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            endpoints=options["endpoint"] or benchmark.BENCHMARK_ENDPOINTS,
+            log=self.stderr.write,
+        )
+        report = {
+            "meta": {
+                "commit": self.git_commit(),
+                "created_at": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "iterations": options["iterations"],
+            },
+            "endpoints": results,
+        }
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(payload)
+        self.stdout.write(payload)
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                previous = json.load(f)["endpoints"]
+            for name, current in results.items():
+                if name not in previous:
+                    continue
+                before, after = previous[name]["p95_ms"], current["p95_ms"]
+                change = (after - before) / before * 100 if before else 0.0
+                self.stderr.write(
+                    f"{name}: p95 {before:.2f} -> {after:.2f} ms ({change:+.1f}%), "
+                    f"queries {previous[name]['queries_p50']} -> {current['queries_p50']}"
+                )
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
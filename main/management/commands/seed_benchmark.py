@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from main import benchmark
+
+
+class Command(BaseCommand):
+    help = "Генерирует синтетический атлас и историю тестов для нагрузочных замеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pathologies", type=int, default=1000)
+        parser.add_argument("--cases-per-pathology", type=int, default=4)
+        parser.add_argument("--layers-per-case", type=int, default=3)
+        parser.add_argument("--questions-per-case", type=int, default=3)
+        parser.add_argument("--answers-per-question", type=int, default=4)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--results-per-user", type=int, default=400)
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--no-images", action="store_true", help="Не создавать файлы-заглушки в MEDIA_ROOT")
+        parser.add_argument("--legacy-share", type=float, default=0.2,
+                            help="Доля попыток в старом формате с ответами в UserTestAnswer")
+
+    def handle(self, *args, **options):
+        benchmark.seed(
+            users=options["users"],
+            pathologies=options["pathologies"],
+            cases_per_pathology=options["cases_per_pathology"],
+            layers_per_case=options["layers_per_case"],
+            questions_per_case=options["questions_per_case"],
+            answers_per_question=options["answers_per_question"],
+            results_per_user=options["results_per_user"],
+            batch_size=options["batch_size"],
+            images=not options["no_images"],
+            legacy_share=options["legacy_share"],
+            log=self.stdout.write,
+        )
@@ -0,0 +1,76 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from main.models import SlowQuery
+from main.slow_queries import explain, sampler
+
+
+ORDERINGS = {
+    "total": "-total_time_ms",
+    "max": "-max_time_ms",
+    "calls": "-calls",
+    "recent": "-last_seen",
+}
+
+
+class Command(BaseCommand):
+    help = "Отчет по самым медленным SQL-запросам (с EXPLAIN по запросу)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--order", choices=sorted(ORDERINGS), default="total")
+        parser.add_argument("--explain", action="store_true",
+                            help="Выполнить EXPLAIN (ANALYZE, BUFFERS) для попавших в отчет запросов")
+        parser.add_argument("--no-analyze", action="store_true",
+                            help="EXPLAIN без ANALYZE — запрос не выполняется")
+        parser.add_argument("--json", action="store_true", help="Вывести отчет в JSON")
+        parser.add_argument("--reset", action="store_true", help="Удалить накопленную статистику")
+
+    def handle(self, *args, **options):
+        sampler.flush()
+
+        if options["reset"]:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(f"Удалено записей: {deleted}")
+            return
+
+        queries = list(SlowQuery.objects.order_by(ORDERINGS[options["order"]])[:options["limit"]])
+
+        if options["explain"]:
+            for slow_query in queries:
+                try:
+                    explain(slow_query, analyze=not options["no_analyze"])
+                except Exception as exc:
+                    self.stderr.write(f"{slow_query.fingerprint}: не удалось выполнить EXPLAIN: {exc}")
+
+        if options["json"]:
+            self.stdout.write(json.dumps([
+                {
+                    "fingerprint": q.fingerprint,
+                    "database": q.database,
+                    "sql": q.normalized_sql,
+                    "calls": q.calls,
+                    "total_ms": round(q.total_time_ms, 2),
+                    "mean_ms": round(q.mean_time_ms, 2),
+                    "max_ms": round(q.max_time_ms, 2),
+                    "last_seen": q.last_seen.isoformat(),
+                    "plan": q.plan,
+                }
+                for q in queries
+            ], ensure_ascii=False, indent=2))
+            return
+
+        if not queries:
+            self.stdout.write("Медленных запросов не зафиксировано")
+            return
+
+        for q in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"[{q.fingerprint}] calls={q.calls} total={q.total_time_ms:.1f}ms "
+                f"mean={q.mean_time_ms:.1f}ms max={q.max_time_ms:.1f}ms db={q.database}"
+            ))
+            self.stdout.write(q.normalized_sql)
+            if q.plan:
+                self.stdout.write(q.plan)
+            self.stdout.write("")
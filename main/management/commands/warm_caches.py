@@ -0,0 +1,30 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from main import cache_warming
+
+
+class Command(BaseCommand):
+    help = ("Заранее собрать закэшированные ответы атласа: каталоги, карточки патологий и кейсов, "
+            "кейсы для тестов, туториалы, снимок атласа")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", help="Хост, под которым приложение открывают клиенты "
+                                           "(по умолчанию CACHE_WARM_HOST)")
+        parser.add_argument("--scheme", choices=["http", "https"],
+                            help="Схема ссылок (по умолчанию CACHE_WARM_SCHEME)")
+        parser.add_argument("--workers", type=int, help="Число потоков (по умолчанию CACHE_WARM_WORKERS)")
+
+    def handle(self, *args, **options):
+        if isinstance(caches["default"], LocMemCache):
+            self.stdout.write(self.style.WARNING(
+                "Кэш locmem — свой у каждого процесса: команда прогреет только базу. "
+                "Для воркеров gunicorn включите WARM_CACHES_ON_START=1"
+            ))
+        stats = cache_warming.warm(
+            host=options["host"], scheme=options["scheme"], workers=options["workers"], log=self.stdout.write
+        )
+        errors = sum(entry["errors"] for name, entry in stats.items() if name != "total")
+        style = self.style.ERROR if errors else self.style.SUCCESS
+        self.stdout.write(style(f"Готово за {stats['total']:.2f} с, ошибок: {errors}"))
@@ -0,0 +1,168 @@
+# media_gc.py
+import os
+import shutil
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from . import uploads
+from .models import TutorialUpload
+
+
+# Сборка мусора в MEDIA_ROOT. Django не удаляет файлы при удалении строки или замене
+# файла в FileField, поэтому в media копятся файлы, на которые никто не ссылается.
+# Проход:
+#   1. множество путей из всех FileField/ImageField приложения (потоково, values_list + iterator)
+#   2. обход MEDIA_ROOT через os.scandir
+#   3. файлы без ссылок и старше grace — пачками: перед удалением пачка еще раз сверяется
+#      с базой (ссылки, закоммиченные после шага 1). Незакоммиченные ссылки не видны:
+#      их защищает grace по mtime — новые файлы свежие, а файл, заново использованный
+#      импортом атласа с тем же содержимым, получает свежий mtime (atlas_bundle._store_media)
+# Файлы удаляются или переносятся в MEDIA_QUARANTINE_DIR с сохранением относительного пути.
+# Рассчитано на FileSystemStorage.
+
+REFERENCES_CHUNK_SIZE = 2000
+
+
+def file_fields():
+    for model in apps.get_app_config("main").get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field.name
+
+
+def referenced_paths():
+    paths = set()
+    for model, name in file_fields():
+        queryset = model._default_manager.order_by().exclude(**{name: ""}).exclude(**{f"{name}__isnull": True})
+        for path in queryset.values_list(name, flat=True).iterator(chunk_size=REFERENCES_CHUNK_SIZE):
+            paths.add(os.path.normpath(path))
+    return paths
+
+
+def still_referenced(paths):
+    """Какие из путей сейчас используются (повторная проверка пачки перед удалением)."""
+    found = set()
+    for model, name in file_fields():
+        found.update(model._default_manager.filter(**{f"{name}__in": paths}).values_list(name, flat=True))
+    return {os.path.normpath(path) for path in found}
+
+
+def walk(root, skip=()):
+    """Относительные пути и DirEntry всех файлов под root."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.abspath(entry.path) not in skip:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield os.path.relpath(entry.path, root), entry
+
+
+def collect(grace=timedelta(hours=24), batch_size=500, quarantine=False, dry_run=False, limit=None,
+            pause=0.0, log=print):
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    quarantine_dir = os.path.abspath(settings.MEDIA_QUARANTINE_DIR)
+    referenced = referenced_paths()
+    cutoff = time.time() - grace.total_seconds()
+    stats = {"scanned": 0, "referenced": len(referenced), "orphaned": 0, "removed": 0, "bytes": 0}
+
+    batch = {}
+    for path, entry in walk(root, skip={quarantine_dir}):
+        stats["scanned"] += 1
+        if path in referenced:
+            continue
+        stat = entry.stat(follow_symlinks=False)
+        # Свежие файлы могли быть только что сохранены, а строка еще не закоммичена
+        if stat.st_mtime > cutoff:
+            continue
+        batch[path] = stat.st_size
+        if len(batch) == batch_size:
+            _flush(batch, root, quarantine_dir, quarantine, dry_run, stats, log)
+            batch = {}
+            if limit and stats["orphaned"] >= limit:
+                return stats
+            if pause:
+                time.sleep(pause)
+    if batch:
+        _flush(batch, root, quarantine_dir, quarantine, dry_run, stats, log)
+    return stats
+
+
+def _flush(batch, root, quarantine_dir, quarantine, dry_run, stats, log):
+    for path in still_referenced(list(batch)):
+        batch.pop(path, None)
+    stats["orphaned"] += len(batch)
+    stats["bytes"] += sum(batch.values())
+
+    for path in sorted(batch):
+        source = os.path.join(root, path)
+        if dry_run:
+            log(f"[dry-run] {path}")
+            continue
+        try:
+            if quarantine:
+                target = os.path.join(quarantine_dir, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(source, target)
+                # Время переноса — от него считается срок хранения в карантине
+                os.utime(target)
+            else:
+                os.remove(source)
+        except FileNotFoundError:
+            continue
+        stats["removed"] += 1
+        log(path)
+
+
+def purge_quarantine(older_than, dry_run=False, log=print):
+    quarantine_dir = os.path.abspath(settings.MEDIA_QUARANTINE_DIR)
+    if not os.path.isdir(quarantine_dir):
+        return 0
+    cutoff = time.time() - older_than.total_seconds()
+    removed = 0
+    for path, entry in walk(quarantine_dir):
+        if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+            continue
+        log(f"[dry-run] quarantine/{path}" if dry_run else f"quarantine/{path}")
+        if not dry_run:
+            os.remove(entry.path)
+        removed += 1
+    return removed
+
+
+def clean_stale_uploads(older_than, dry_run=False, log=print):
+    """Временные файлы брошенных и завершенных загрузок видео (uploads.py)."""
+    upload_dir = os.path.abspath(settings.TUTORIAL_UPLOAD_DIR)
+    if not os.path.isdir(upload_dir):
+        return 0
+    stale = TutorialUpload.objects.filter(
+        status=TutorialUpload.Status.UPLOADING, updated_at__lt=timezone.now() - older_than
+    )
+    if not dry_run:
+        stale.update(status=TutorialUpload.Status.FAILED, updated_at=timezone.now())
+    active = {
+        os.path.basename(uploads.staging_path(upload))
+        for upload in TutorialUpload.objects.filter(status=TutorialUpload.Status.UPLOADING).only("pk")
+    }
+    if dry_run:
+        active -= {os.path.basename(uploads.staging_path(upload)) for upload in stale.only("pk")}
+
+    cutoff = time.time() - older_than.total_seconds()
+    removed = 0
+    for path, entry in walk(upload_dir):
+        # Свежий файл может принадлежать загрузке, начатой уже после выборки active
+        if path in active or entry.stat(follow_symlinks=False).st_mtime > cutoff:
+            continue
+        log(f"[dry-run] uploads/{path}" if dry_run else f"uploads/{path}")
+        if not dry_run:
+            os.remove(entry.path)
+        removed += 1
+    return removed
@@ -0,0 +1,113 @@
+# metrics.py
+import os
+import threading
+import time
+
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+
+
+# Метрики в формате Prometheus.
+# При запуске под gunicorn с несколькими воркерами нужно задать PROMETHEUS_MULTIPROC_DIR
+# (см. gunicorn.conf.py) — тогда каждый воркер пишет значения в общий каталог,
+# а эндпоинт /api/metrics собирает их вместе.
+
+REQUEST_LATENCY = Histogram(
+    "colposcopy_request_duration_seconds",
+    "Время обработки запроса по представлениям",
+    ["view", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+DB_QUERIES = Counter(
+    "colposcopy_db_queries_total",
+    "Количество SQL-запросов по представлениям",
+    ["view"],
+)
+DB_TIME = Counter(
+    "colposcopy_db_time_seconds_total",
+    "Суммарное время SQL-запросов по представлениям",
+    ["view"],
+)
+DB_CONNECTIONS = Counter(
+    "colposcopy_db_connection_requests_total",
+    "Запросы, ходившие в БД: result=reused — на уже открытом соединении, opened — с открытием нового",
+    ["result"],
+)
+CACHE_REQUESTS = Counter(
+    "colposcopy_cache_requests_total",
+    "Обращения к кэшу (result=hit|miss), hit ratio = hit / (hit + miss)",
+    ["result"],
+)
+ACTIVE_TEST_SESSIONS = Gauge(
+    "colposcopy_active_test_sessions",
+    "Сгенерированные, но еще не отправленные тесты (приблизительно: сумма счетчиков воркеров)",
+    multiprocess_mode="livesum",
+)
+TEST_SUBMISSIONS = Counter(
+    "colposcopy_test_submissions_total",
+    "Отправленные тесты, в минуту: rate(colposcopy_test_submissions_total[1m]) * 60",
+)
+MEDIA_BYTES_SERVED = Counter(
+    "colposcopy_media_bytes_served_total",
+    "Байты медиафайлов, отданные через Django",
+)
+
+# Активные тесты этого процесса: user_id -> время истечения.
+# Тест живет столько же, сколько его ключ в кэше (TEST_SESSION_TIMEOUT),
+# поэтому брошенные тесты сами выпадают из счетчика.
+# Счетчик приблизительный: у каждого воркера свой, общий кэш, из которого его можно было бы
+# посчитать, отсутствует (locmem). Тест, выданный одним воркером и отправленный в другой,
+# остается в сумме до истечения срока.
+_active_sessions = {}
+_active_sessions_lock = threading.Lock()
+
+
+def observe_request(url_name, request, response, stats):
+    REQUEST_LATENCY.labels(view=url_name, method=request.method).observe(stats.elapsed)
+    if stats.query_count:
+        DB_QUERIES.labels(view=url_name).inc(stats.query_count)
+        DB_TIME.labels(view=url_name).inc(stats.db_time)
+        DB_CONNECTIONS.labels(result="opened" if stats.db_connections else "reused").inc()
+    if stats.cache_hits:
+        CACHE_REQUESTS.labels(result="hit").inc(stats.cache_hits)
+    if stats.cache_misses:
+        CACHE_REQUESTS.labels(result="miss").inc(stats.cache_misses)
+
+    if request.path.startswith(settings.MEDIA_URL) and response.status_code == 200:
+        length = response.get("Content-Length")
+        if length:
+            MEDIA_BYTES_SERVED.inc(int(length))
+
+
+def test_session_started(user_id):
+    with _active_sessions_lock:
+        _active_sessions[user_id] = time.monotonic() + settings.TEST_SESSION_TIMEOUT
+        _update_active_sessions()
+
+
+def test_submitted(user_id):
+    TEST_SUBMISSIONS.inc()
+    with _active_sessions_lock:
+        _active_sessions.pop(user_id, None)
+        _update_active_sessions()
+
+
+def _update_active_sessions():
+    now = time.monotonic()
+    for user_id in [u for u, expires in _active_sessions.items() if expires < now]:
+        del _active_sessions[user_id]
+    ACTIVE_TEST_SESSIONS.set(len(_active_sessions))
+
+
+def render_latest():
+    with _active_sessions_lock:
+        _update_active_sessions()
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,126 @@
+# middleware.py
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import compression, instrumentation, metrics
+
+logger = logging.getLogger("main.performance")
+
+
+class RequestMetricsMiddleware:
+    """
+    Замеряет время запроса, количество и время SQL, попадания в кэш и время сериализации.
+    Результат отдается в заголовке Server-Timing и копится в скользящей гистограмме по url_name.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats, token = instrumentation.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.finish_request(token)
+        return self.process_finished(request, response, stats)
+
+    async def __acall__(self, request):
+        stats, token = instrumentation.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.finish_request(token)
+        return self.process_finished(request, response, stats)
+
+    def process_finished(self, request, response, stats):
+        url_name = self.get_url_name(request)
+        instrumentation.registry.record(url_name, stats, response.status_code)
+        metrics.observe_request(url_name, request, response, stats)
+        response["Server-Timing"] = self.server_timing(stats)
+        self.log_if_slow(request, url_name, stats)
+        return response
+
+    @staticmethod
+    def get_url_name(request):
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return "unresolved"
+        return match.url_name or match.view_name or "unnamed"
+
+    @staticmethod
+    def server_timing(stats):
+        return ", ".join([
+            f'db;dur={stats.db_time * 1000:.2f};desc="{stats.query_count} queries, {stats.db_connections} new conn"',
+            f'cache;desc="hits={stats.cache_hits} misses={stats.cache_misses}"',
+            f"serialize;dur={stats.serializer_time * 1000:.2f}",
+            f"total;dur={stats.elapsed * 1000:.2f}",
+        ])
+
+    @staticmethod
+    def log_if_slow(request, url_name, stats):
+        threshold_ms = getattr(settings, "SLOW_REQUEST_THRESHOLD_MS", None)
+        elapsed_ms = stats.elapsed * 1000
+        if threshold_ms is None or elapsed_ms < threshold_ms:
+            return
+
+        queries = "\n".join(f"  [{duration * 1000:.2f} ms] {sql}" for sql, duration in stats.queries)
+        logger.warning(
+            "Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in DB\n%s",
+            request.method, request.path, url_name, elapsed_ms,
+            stats.query_count, stats.db_time * 1000, queries,
+        )
+
+
+class CompressionMiddleware:
+    """
+    Сжимает JSON-ответы в br или gzip по Accept-Encoding. Ответы, уже сжатые заранее
+    (response_cache), пропускаются; /api/auth/ и ответы с куками не сжимаются (BREACH).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    @staticmethod
+    def process_response(request, response):
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if not compression.is_compressible(request, response):
+            return response
+        encoding = compression.choose_encoding(request)
+        if encoding is None:
+            return response
+
+        compressed = compression.compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # Сжатое представление побайтно отличается от исходного
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
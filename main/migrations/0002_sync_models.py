@@ -0,0 +1,36 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='answer',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterModelOptions(
+            name='question',
+            options={'ordering': ['id']},
+        ),
+        migrations.AddField(
+            model_name='pathology',
+            name='number',
+            field=models.IntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='cases',
+            field=models.ManyToManyField(blank=True, related_name='included_in_tests', to='main.case'),
+        ),
+        migrations.AddField(
+            model_name='videotutorial',
+            name='tutorial_file',
+            field=models.FileField(blank=True, null=True, upload_to='tutorials/'),
+        ),
+    ]
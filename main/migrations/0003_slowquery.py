@@ -0,0 +1,37 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:04
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_sync_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True)),
+                ('normalized_sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('sample_sql', models.TextField(verbose_name='Образец SQL')),
+                ('sample_params', models.JSONField(blank=True, default=list, verbose_name='Параметры образца')),
+                ('database', models.CharField(default='default', max_length=64)),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='Вызовов')),
+                ('total_time_ms', models.FloatField(default=0.0, verbose_name='Суммарно, мс')),
+                ('max_time_ms', models.FloatField(default=0.0, verbose_name='Максимум, мс')),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('plan', models.TextField(blank=True, verbose_name='План запроса')),
+                ('explained_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-total_time_ms',),
+            },
+        ),
+    ]
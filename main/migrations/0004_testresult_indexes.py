@@ -0,0 +1,25 @@
+# Индексы создаются через CREATE INDEX CONCURRENTLY, поэтому миграция неатомарная
+
+from django.db import migrations, models
+
+import main.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('main', '0003_slowquery'),
+    ]
+
+    operations = [
+        main.operations.AddIndexConcurrently(
+            model_name='testresult',
+            index=models.Index(fields=['user', '-created_at'], name='testresult_user_created_idx'),
+        ),
+        main.operations.AddIndexConcurrently(
+            model_name='testresult',
+            index=models.Index(fields=['pathology', '-created_at'], name='testresult_path_created_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Индексы создаются через CREATE INDEX CONCURRENTLY, поэтому миграция неатомарная
+
+from django.db import migrations, models
+
+import main.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('main', '0004_testresult_indexes'),
+    ]
+
+    operations = [
+        main.operations.AddIndexConcurrently(
+            model_name='case',
+            index=models.Index(fields=['pathology', 'created_at'], name='case_pathology_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Индексы создаются через CREATE INDEX CONCURRENTLY, поэтому миграция неатомарная
+
+from django.db import migrations, models
+
+import main.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('main', '0005_case_indexes'),
+    ]
+
+    operations = [
+        main.operations.AddIndexConcurrently(
+            model_name='usertestanswer',
+            index=models.Index(fields=['test_result', 'question'], name='usertestanswer_result_q_idx'),
+        ),
+        main.operations.AddIndexConcurrently(
+            model_name='answer',
+            index=models.Index(fields=['question', 'is_correct'], name='answer_question_correct_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+RANK_STEP = 1 << 16
+
+
+def fill_ranks(apps, schema_editor):
+    # Текущий порядок (по number, без номера — в конце) переносится в ранги с зазором
+    Pathology = apps.get_model('main', 'Pathology')
+    pathologies = list(Pathology.objects.order_by(models.F('number').asc(nulls_last=True), 'id'))
+    for position, pathology in enumerate(pathologies, start=1):
+        pathology.number = position
+        pathology.rank = position * RANK_STEP
+    Pathology.objects.bulk_update(pathologies, ['number', 'rank'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_answer_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='pathology',
+            options={'ordering': ('rank', 'id')},
+        ),
+        migrations.AddField(
+            model_name='pathology',
+            name='rank',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='pathology',
+            name='number',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_ranks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pathology',
+            index=models.Index(fields=['rank', 'id'], name='pathology_rank_idx'),
+        ),
+    ]
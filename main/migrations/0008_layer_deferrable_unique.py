@@ -0,0 +1,22 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:13
+
+from django.db import migrations, models
+import django.db.models.constraints
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_pathology_rank'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='layer',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='layer',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('case', 'number'), name='layer_case_number_uniq'),
+        ),
+    ]
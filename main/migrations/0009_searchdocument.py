@@ -0,0 +1,46 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+import main.operations
+from main import search
+
+
+def fill_search_documents(apps, schema_editor):
+    # Объекты, созданные до миграции, попадают в поиск сразу, а не после ручного rebuild
+    search.rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_layer_deferrable_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('pathology', 'Патология'), ('case', 'Клинический случай'), ('layer', 'Слой'), ('question', 'Вопрос'), ('tutorial', 'Туториал')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('parent_id', models.BigIntegerField(blank=True, null=True)),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='searchdocument_kind_object_uniq'),
+        ),
+        # GIN-индекс создается только на PostgreSQL
+        main.operations.AddPostgresIndex(
+            model_name='searchdocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['vector'], name='searchdocument_vector_gin'),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Trigram-индексы для поиска в админке. Только PostgreSQL: расширение pg_trgm и
+# CREATE INDEX CONCURRENTLY, поэтому миграция неатомарная
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+from django.db import migrations
+import django.db.models.functions.text
+
+import main.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('main', '0009_searchdocument'),
+    ]
+
+    operations = [
+        # На остальных СУБД CreateExtension ничего не делает
+        django.contrib.postgres.operations.TrigramExtension(),
+        main.operations.AddPostgresIndexConcurrently(
+            model_name='account',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('email'), name='gin_trgm_ops'), name='account_email_trgm'),
+        ),
+        main.operations.AddPostgresIndexConcurrently(
+            model_name='account',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='account_name_trgm'),
+        ),
+        main.operations.AddPostgresIndexConcurrently(
+            model_name='account',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('surname'), name='gin_trgm_ops'), name='account_surname_trgm'),
+        ),
+    ]
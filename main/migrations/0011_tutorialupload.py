@@ -0,0 +1,36 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_account_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TutorialUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('total_size', models.BigIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('received_chunks', models.PositiveIntegerField(default=0)),
+                ('received_bytes', models.BigIntegerField(default=0)),
+                ('chunk_hashes', models.JSONField(blank=True, default=list)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(choices=[('uploading', 'Загружается'), ('complete', 'Завершена'), ('failed', 'Ошибка')], default='uploading', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tutorial', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='uploads', to='main.videotutorial')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tutorial_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AtlasChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('pathology', 'Патология'), ('pathology_image', 'Фото патологии'), ('case', 'Клинический случай'), ('layer', 'Слой'), ('scheme', 'Схема')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='atlaschange_kind_object_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+from main import partitions
+
+
+def fill_answer_created_at(apps, schema_editor):
+    # Ответ попадает в секцию месяца своей попытки
+    TestResult = apps.get_model('main', 'TestResult')
+    UserTestAnswer = apps.get_model('main', 'UserTestAnswer')
+    UserTestAnswer.objects.update(created_at=models.Subquery(
+        TestResult.objects.filter(pk=models.OuterRef('test_result_id')).values('created_at')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_atlaschange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usertestanswer',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='testresult',
+            name='cases',
+            field=models.ManyToManyField(blank=True, db_constraint=False, related_name='included_in_tests', to='main.case'),
+        ),
+        migrations.AlterField(
+            model_name='usertestanswer',
+            name='test_result',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='user_answers', to='main.testresult'),
+        ),
+        migrations.RunPython(fill_answer_created_at, migrations.RunPython.noop),
+        # Только PostgreSQL: пересоздание таблиц секционированными с копированием данных
+        migrations.RunPython(partitions.partition_tables, partitions.unpartition_tables),
+    ]
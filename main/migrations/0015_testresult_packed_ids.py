@@ -0,0 +1,23 @@
+# Generated by Django 4.2.25 on 2026-10-19 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_partition_test_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testresult',
+            name='answer_ids_packed',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='case_ids_packed',
+            field=models.BinaryField(null=True),
+        ),
+    ]
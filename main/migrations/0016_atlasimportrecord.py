@@ -0,0 +1,27 @@
+# Generated by Django 4.2.25 on 2026-10-19 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_testresult_packed_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AtlasImportRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bundle_id', models.CharField(max_length=64)),
+                ('kind', models.CharField(max_length=20)),
+                ('old_id', models.BigIntegerField()),
+                ('new_id', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='atlasimportrecord',
+            constraint=models.UniqueConstraint(fields=('bundle_id', 'kind', 'old_id'), name='atlasimportrecord_uniq'),
+        ),
+    ]
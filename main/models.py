@@ -1,8 +1,18 @@
 # models.py
+import sys
+import uuid
+from array import array
+from operator import attrgetter
+
 from django.conf import settings
-from django.db import models, transaction
+from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
-from django.db.models import F
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
+
+from .ordering import RankedOrdering
 
 
 # ACCOUNT / AUTHENTICATION
@@ -104,6 +114,15 @@ class Account(AbstractBaseUser, PermissionsMixin):
     # Поля, обязательные при создании суперюзера через консоль (кроме email и пароля)
     REQUIRED_FIELDS = ["name", "surname"]
 
+    class Meta:
+        # Поиск в админке (icontains -> UPPER(col::text) LIKE UPPER('%...%')) идет по trigram-индексам.
+        # Только PostgreSQL с расширением pg_trgm
+        indexes = [
+            GinIndex(OpClass(Upper("email"), name="gin_trgm_ops"), name="account_email_trgm"),
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="account_name_trgm"),
+            GinIndex(OpClass(Upper("surname"), name="gin_trgm_ops"), name="account_surname_trgm"),
+        ]
+
     def __str__(self):
         # Красивое отображение ФИО
         full_name = f"{self.surname} {self.name} {self.patronymic}".strip()
@@ -145,34 +164,50 @@ class WorkerProfile(models.Model):
 class Pathology(models.Model):
     name = models.CharField(max_length=255, null=False, blank=False)
     description = models.TextField(null=False, blank=False)
-    number = models.IntegerField(null=True, blank=True, unique=True)
+    # Порядковый номер в атласе (с 1). Выравнивается в фоне, см. ordering.py
+    number = models.IntegerField(null=True, blank=True)
+    rank = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        ordering = ("rank", "id")
+        indexes = [
+            models.Index(fields=["rank", "id"], name="pathology_rank_idx"),
+        ]
 
     def save(self, *args, **kwargs):
-        if self.number is None:
-            with transaction.atomic():
-                # Блокируем таблицу для предотвращения конфликтов
-                max_num = Pathology.objects.select_for_update().aggregate(
-                    max_num=models.Max('number')
-                )['max_num']
-                self.number = (max_num or 0) + 1
+        # Новая патология встает на позицию number, если она указана, иначе в конец
+        if self._state.adding and not self.rank:
+            pathology_ordering.place(self, position=self.number)
         super().save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        pathology_ordering.deleted()
+        return result
+
+    def move_to(self, position):
+        pathology_ordering.move(self, position)
+
+    @classmethod
     def delete_and_renumber(cls, instance):
-        with transaction.atomic():
-            instance.delete()
-            cls.objects.select_for_update().filter(
-                number__gt=instance.number
-            ).update(number=F('number') - 1)
+        # Номера остальных патологий выравниваются в фоне, без сдвига всех строк
+        instance.delete()
 
     def __str__(self):
         return self.name
 
 
+pathology_ordering = RankedOrdering(Pathology)
+
+
 class VideoTutorial(models.Model):
     name = models.CharField(max_length=255, null=False, blank=False, verbose_name="Название туториала")
     video = models.FileField(upload_to='videos/', null=True, blank=True, verbose_name="Видео файл")
     description = models.TextField(null=False, blank=False, verbose_name="Описание туториала")
     poster = models.ImageField(upload_to='posters/', null=True, blank=True, verbose_name="Постер")
+    poster_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    poster_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    poster_size = models.PositiveIntegerField(null=True, blank=True, editable=False)
     tutorial_file = models.FileField(upload_to="tutorials/", null=True, blank=True)
     class Meta:
         verbose_name = "Видео-туториал"
@@ -180,9 +215,50 @@ class VideoTutorial(models.Model):
     def __str__(self):
         return self.name
 
+
+class TutorialUpload(models.Model):
+    """Загрузка видео туториала по частям (см. uploads.py). Файл копится во временном каталоге вне media."""
+
+    class Status(models.TextChoices):
+        UPLOADING = "uploading", "Загружается"
+        COMPLETE = "complete", "Завершена"
+        FAILED = "failed", "Ошибка"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="tutorial_uploads")
+    # Заполнен, если загрузка заменяет видео существующего туториала, и после завершения
+    tutorial = models.ForeignKey(VideoTutorial, on_delete=models.SET_NULL, null=True, blank=True, related_name="uploads")
+    name = models.CharField(max_length=255, blank=True)
+    description = models.TextField(blank=True)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    received_chunks = models.PositiveIntegerField(default=0)
+    received_bytes = models.BigIntegerField(default=0)
+    # sha256 каждой принятой части, по порядку
+    chunk_hashes = models.JSONField(default=list, blank=True)
+    # Ожидаемый sha256 всего файла (необязательно)
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.UPLOADING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def total_chunks(self):
+        return -(-self.total_size // self.chunk_size)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received_chunks}/{self.total_chunks})"
+
+
 class PathologyImage(models.Model):
     pathology = models.ForeignKey(Pathology, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to="pathology_img/", null=False, blank=False)
+    # Размеры картинок заполняются при загрузке (images.py), у старых записей — командой
+    # backfill_image_dimensions
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_size = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
 
 class Case(models.Model):
@@ -190,19 +266,56 @@ class Case(models.Model):
     name = models.CharField(max_length=255, blank=False, null=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["pathology", "created_at"], name="case_pathology_created_idx"),
+        ]
+
     def __str__(self):
         return self.name or f"Case {self.pk}"
 
+    def reorder_layers(self, ordered_ids):
+        """
+        Перенумеровывает слои в порядке ordered_ids (полный список ID слоев кейса)
+        одним UPDATE ... CASE. Если слои загружены через prefetch_related, они
+        обновляются на месте, и ответ собирается без повторного запроса.
+        """
+        layers = list(self.layers.all())
+        positions = {layer_id: number for number, layer_id in enumerate(ordered_ids, start=1)}
+        changed = [layer.pk for layer in layers if layer.number != positions[layer.pk]]
+
+        if changed:
+            # Уникальность (case, number) проверяется при коммите, промежуточные совпадения номеров не мешают
+            Layer.objects.filter(pk__in=changed).update(number=models.Case(
+                *[models.When(pk=pk, then=models.Value(positions[pk])) for pk in changed],
+                output_field=models.PositiveIntegerField(),
+            ))
+
+        for layer in layers:
+            layer.number = positions[layer.pk]
+        prefetched = getattr(self, '_prefetched_objects_cache', {}).get('layers')
+        if prefetched is not None:
+            prefetched._result_cache.sort(key=attrgetter('number'))
+        return layers
+
 
 class Layer(models.Model):
     case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name="layers")
     number = models.PositiveIntegerField(default=1)
     layer_img = models.ImageField(upload_to="case_layers/")
+    layer_img_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    layer_img_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    layer_img_size = models.PositiveIntegerField(null=True, blank=True, editable=False)
     layer_description = models.TextField(blank=True)
 
     class Meta:
-        unique_together = ("case", "number")
         ordering = ("number",)
+        constraints = [
+            # Отложенная проверка: обмен номерами внутри транзакции не нарушает уникальность
+            models.UniqueConstraint(
+                fields=["case", "number"], name="layer_case_number_uniq", deferrable=models.Deferrable.DEFERRED
+            ),
+        ]
 
     def __str__(self):
         return f"{self.case} — Layer {self.number}"
@@ -211,7 +324,13 @@ class Layer(models.Model):
 class Scheme(models.Model):
     case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name="schemes")
     scheme_img = models.ImageField(upload_to="schemes/scheme_img/")
+    scheme_img_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    scheme_img_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    scheme_img_size = models.PositiveIntegerField(null=True, blank=True, editable=False)
     scheme_description_img = models.ImageField(upload_to="schemes/scheme_description_img/")
+    scheme_description_img_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    scheme_description_img_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    scheme_description_img_size = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
 
 # Тестовые модели
@@ -242,11 +361,31 @@ class Answer(models.Model):
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            models.Index(fields=["question", "is_correct"], name="answer_question_correct_idx"),
+        ]
 
     def __str__(self):
         return self.text
 
 
+def pack_ids(ids):
+    """Список id -> bytes: int64 little-endian подряд, 8 байт на id."""
+    packed = array('q', ids)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_ids(data):
+    packed = array('q')
+    # На PostgreSQL BinaryField читается как memoryview
+    packed.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tolist()
+
+
 class TestResult(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="test_results")
     pathology = models.ForeignKey(Pathology, on_delete=models.SET_NULL, null=True, related_name="test_results")
@@ -259,18 +398,172 @@ class TestResult(models.Model):
     # Текстовая оценка (Отлично, Хорошо, Удовлетворительно, Неудовлетворительно)
     grade = models.CharField(max_length=30, blank=True)
     time_spent = models.DurationField(null=True, blank=True)
-    cases = models.ManyToManyField(Case, related_name='included_in_tests', blank=True)
+    # На PostgreSQL таблица секционирована по месяцам created_at (partitions.py): ссылки на
+    # попытку — без ограничения внешнего ключа в базе
+    cases = models.ManyToManyField(Case, related_name='included_in_tests', blank=True, db_constraint=False)
+    # Кейсы и выбранные ответы попытки внутри строки (pack_ids): отправка теста — один INSERT,
+    # разбор попытки — без join. NULL у попыток, сохраненных раньше: их кейсы в cases,
+    # ответы в UserTestAnswer. Читать через case_ids и selected_answer_ids
+    case_ids_packed = models.BinaryField(null=True, editable=False)
+    answer_ids_packed = models.BinaryField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # История попыток пользователя (profile-history)
+            models.Index(fields=["user", "-created_at"], name="testresult_user_created_idx"),
+            # Статистика по патологии
+            models.Index(fields=["pathology", "-created_at"], name="testresult_path_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user} - {self.percentage}% ({self.grade})"
 
+    @property
+    def case_ids(self):
+        if self.case_ids_packed is None:
+            return list(self.cases.values_list('id', flat=True))
+        return unpack_ids(self.case_ids_packed)
+
+    @property
+    def selected_answer_ids(self):
+        if self.answer_ids_packed is None:
+            # Ответы лежат в секции месяца попытки
+            answers = self.user_answers.filter(created_at__gte=self.created_at)
+            return set(answers.values_list('answer_id', flat=True))
+        return set(unpack_ids(self.answer_ids_packed))
+
 
 class UserTestAnswer(models.Model):
-    test_result = models.ForeignKey(TestResult, on_delete=models.CASCADE, related_name='user_answers')
+    test_result = models.ForeignKey(
+        TestResult, on_delete=models.CASCADE, related_name='user_answers', db_constraint=False
+    )
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
+    # Ключ секционирования, равен test_result.created_at: ответы лежат в секции месяца своей попытки
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["test_result", "question"], name="usertestanswer_result_q_idx"),
+        ]
+
+    def __str__(self):
+        return f"Result {self.test_result_id} - Ans {self.answer_id}"
+
+
+
+# Поиск
+
+class SearchDocument(models.Model):
+    """Текст объекта атласа для полнотекстового поиска (заполняется в search.py)."""
+
+    class Kind(models.TextChoices):
+        PATHOLOGY = "pathology", "Патология"
+        CASE = "case", "Клинический случай"
+        LAYER = "layer", "Слой"
+        QUESTION = "question", "Вопрос"
+        TUTORIAL = "tutorial", "Туториал"
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    # Для слоя и вопроса — ID кейса, для кейса — ID патологии
+    parent_id = models.BigIntegerField(null=True, blank=True)
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    # Только PostgreSQL: взвешенный tsvector (title — A, body — B) с русской морфологией
+    vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="searchdocument_kind_object_uniq"),
+        ]
+        indexes = [
+            GinIndex(fields=["vector"], name="searchdocument_vector_gin"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} {self.title}"
+
+
+# Перенос атласа
+
+class AtlasImportRecord(models.Model):
+    """
+    Соответствие id из архива атласа новому id при импорте (см. atlas_bundle.py). Пишется в той же
+    транзакции, что и пачка объектов: прерванный импорт продолжается ровно с первой незаписанной
+    строки. Удаляется после завершения импорта.
+    """
+    bundle_id = models.CharField(max_length=64)
+    kind = models.CharField(max_length=20)
+    old_id = models.BigIntegerField()
+    new_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["bundle_id", "kind", "old_id"], name="atlasimportrecord_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.bundle_id} {self.kind}:{self.old_id} -> {self.new_id}"
+
+
+# Синхронизация атласа
+
+class AtlasChange(models.Model):
+    """
+    Журнал изменений атласа для /api/atlas/snapshot/?since= (см. atlas_sync.py).
+    id — версия атласа. Для объекта хранится только последняя запись, старые удаляются.
+    """
+
+    class Kind(models.TextChoices):
+        PATHOLOGY = "pathology", "Патология"
+        PATHOLOGY_IMAGE = "pathology_image", "Фото патологии"
+        CASE = "case", "Клинический случай"
+        LAYER = "layer", "Слой"
+        SCHEME = "scheme", "Схема"
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "object_id"], name="atlaschange_kind_object_idx"),
+        ]
 
     def __str__(self):
-        return f"Result {self.test_result.id} - Ans {self.answer.id}"
+        return f"{self.pk}: {self.kind}:{self.object_id}{' (удален)' if self.deleted else ''}"
+
 
+# Мониторинг
+
+class SlowQuery(models.Model):
+    fingerprint = models.CharField(max_length=40, unique=True)
+    normalized_sql = models.TextField(verbose_name="Нормализованный SQL")
+    sample_sql = models.TextField(verbose_name="Образец SQL")
+    sample_params = models.JSONField(default=list, blank=True, verbose_name="Параметры образца")
+    database = models.CharField(max_length=64, default="default")
+
+    calls = models.PositiveIntegerField(default=0, verbose_name="Вызовов")
+    total_time_ms = models.FloatField(default=0.0, verbose_name="Суммарно, мс")
+    max_time_ms = models.FloatField(default=0.0, verbose_name="Максимум, мс")
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    plan = models.TextField(blank=True, verbose_name="План запроса")
+    explained_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-total_time_ms",)
+        verbose_name = "Медленный запрос"
+        verbose_name_plural = "Медленные запросы"
+
+    @property
+    def mean_time_ms(self):
+        return self.total_time_ms / self.calls if self.calls else 0.0
+
+    def __str__(self):
+        return f"{self.fingerprint}: {self.normalized_sql[:80]}"
@@ -0,0 +1,49 @@
+# operations.py
+# Операции миграций, которые зависят от СУБД
+from django.contrib.postgres import operations as postgres_operations
+from django.db import migrations
+
+
+class AddIndexConcurrently(postgres_operations.AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY на PostgreSQL (таблица не блокируется на запись),
+    обычный CREATE INDEX на остальных СУБД (SQLite в тестах).
+    Миграция с этой операцией должна быть atomic = False.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """
+    Индекс, который поддерживается только PostgreSQL (GIN по tsvector и т.п.).
+    На остальных СУБД меняется только состояние моделей.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class AddPostgresIndexConcurrently(postgres_operations.AddIndexConcurrently):
+    """То же, что AddPostgresIndex, но через CREATE INDEX CONCURRENTLY (миграция atomic = False)."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
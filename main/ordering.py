@@ -0,0 +1,160 @@
+# ordering.py
+import logging
+import threading
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+
+logger = logging.getLogger(__name__)
+
+# Порядок хранится в разреженном ранге: между соседями остается зазор RANK_STEP,
+# поэтому вставка и перемещение меняют одну строку. Видимый номер (number) и ранги
+# выравниваются позже одним UPDATE в фоне — без блокировки таблицы и без
+# уникального ограничения, которое пришлось бы обходить при сдвиге.
+RANK_STEP = 1 << 16
+# Задержка фонового выравнивания: несколько изменений подряд выравниваются одним проходом
+COMPACT_DELAY = 2.0
+
+
+class RankedOrdering:
+    def __init__(self, model, rank_field="rank", number_field="number"):
+        self.model = model
+        self.rank_field = rank_field
+        self.number_field = number_field
+        self._timer = None
+        self._timer_lock = threading.Lock()
+        # Вызываются после коммита изменений порядка (UPDATE идут в обход сигналов моделей)
+        self.on_change = []
+
+    def queryset(self):
+        return self.model._default_manager.order_by(self.rank_field, "pk")
+
+    # Выбор ранга
+
+    def rank_for_position(self, position, exclude_pk=None):
+        """
+        Ранг, при котором объект окажется на позиции position (с 1) в текущем порядке.
+        None или позиция за концом списка — в конец.
+        """
+        qs = self.queryset()
+        if exclude_pk is not None:
+            qs = qs.exclude(pk=exclude_pk)
+
+        if position is None or position < 1:
+            return self._rank_after_last(qs)
+
+        # Два соседа: на позиции position - 1 и position
+        offset = position - 1
+        neighbours = list(qs.values_list(self.rank_field, flat=True)[max(offset - 1, 0):offset + 1])
+        if offset == 0:
+            before, after = None, (neighbours[0] if neighbours else None)
+        else:
+            before = neighbours[0] if neighbours else None
+            after = neighbours[1] if len(neighbours) > 1 else None
+
+        if after is None:
+            return self._rank_after_last(qs)
+        if before is None:
+            return after - RANK_STEP
+        if after - before > 1:
+            return (before + after) // 2
+
+        # Зазор исчерпан — выравниваем ранги сразу и считаем заново
+        self.compact()
+        return self.rank_for_position(position, exclude_pk=exclude_pk)
+
+    def _rank_after_last(self, qs):
+        last = qs.aggregate(last=Max(self.rank_field))["last"]
+        return (last or 0) + RANK_STEP
+
+    def _number_after_last(self):
+        last = self.model._default_manager.aggregate(last=Max(self.number_field))["last"]
+        return (last or 0) + 1
+
+    # Операции
+
+    def place(self, instance, position=None):
+        """Заполняет ранг и предварительный номер для нового объекта перед сохранением."""
+        setattr(instance, self.rank_field, self.rank_for_position(position))
+        # Номер уточнится при выравнивании
+        setattr(instance, self.number_field, position or self._number_after_last())
+        self.schedule_compaction()
+
+    def move(self, instance, position):
+        rank = self.rank_for_position(position, exclude_pk=instance.pk)
+        self.model._default_manager.filter(pk=instance.pk).update(**{
+            self.rank_field: rank,
+            self.number_field: position,
+        })
+        setattr(instance, self.rank_field, rank)
+        setattr(instance, self.number_field, position)
+        self._notify()
+        self.schedule_compaction()
+
+    def deleted(self):
+        # После удаления номера остальных выравниваются в фоне
+        self.schedule_compaction()
+
+    # Выравнивание
+
+    def compact(self):
+        """
+        Переписывает number = позиция и rank = позиция * RANK_STEP одним UPDATE.
+        Трогает только строки, у которых что-то изменилось. На PostgreSQL параллельные
+        выравнивания сериализуются advisory lock'ом, обычные записи не блокируются.
+        """
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        pk = connection.ops.quote_name(self.model._meta.pk.column)
+        rank = connection.ops.quote_name(self.model._meta.get_field(self.rank_field).column)
+        number = connection.ops.quote_name(self.model._meta.get_field(self.number_field).column)
+
+        sql = f"""
+            UPDATE {table}
+            SET {number} = ordered.position, {rank} = ordered.position * %s
+            FROM (
+                SELECT {pk} AS id, ROW_NUMBER() OVER (ORDER BY {rank}, {pk}) AS position
+                FROM {table}
+            ) AS ordered
+            WHERE {table}.{pk} = ordered.id
+              AND ({table}.{number} IS NULL
+                   OR {table}.{number} <> ordered.position
+                   OR {table}.{rank} <> ordered.position * %s)
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if connection.vendor == "postgresql":
+                    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [self.model._meta.db_table])
+                cursor.execute(sql, [RANK_STEP, RANK_STEP])
+                updated = cursor.rowcount
+            if updated:
+                self._notify()
+        return updated
+
+    def _notify(self):
+        for callback in self.on_change:
+            transaction.on_commit(callback)
+
+    def schedule_compaction(self):
+        # Запуск только после коммита: откат не должен оставлять запланированную работу
+        transaction.on_commit(self._start_timer)
+
+    def _start_timer(self):
+        with self._timer_lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(COMPACT_DELAY, self._compact_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _compact_in_background(self):
+        with self._timer_lock:
+            self._timer = None
+        try:
+            updated = self.compact()
+            logger.debug("%s: выровнено строк: %s", self.model.__name__, updated)
+        except Exception:
+            logger.exception("Не удалось выровнять порядок %s", self.model.__name__)
+        finally:
+            # Соединение этого потока больше не понадобится
+            connection.close()
@@ -0,0 +1,41 @@
+# parsers.py
+import io
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser на orjson. orjson, как и JSONParser в строгом режиме, не принимает NaN/Infinity;
+    тело не в UTF-8 и все, что orjson отверг, разбирается стандартным парсером — результат
+    и текст ошибки те же, что у JSONParser.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read() if stream is not None else b''
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+class OctetStreamParser(BaseParser):
+    """
+    Тело application/octet-stream отдается представлению как поток, без чтения в память:
+    части загрузки (uploads.py) копируются из него на диск кусками.
+    """
+    media_type = "application/octet-stream"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream
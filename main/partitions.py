@@ -0,0 +1,272 @@
+# partitions.py
+import gzip
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+# Помесячное секционирование попыток тестов на PostgreSQL (PARTITION BY RANGE (created_at)).
+# TestResult и UserTestAnswer секционируются по created_at; у ответа created_at равен
+# created_at его попытки, поэтому месяц попытки и ее ответы лежат в секциях одного месяца
+# и архивируются вместе.
+#
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования: в базе он
+# (id, created_at), для Django — по-прежнему id (уникальность дает общая последовательность).
+# Внешние ключи на TestResult (ответы, TestResult.cases) поэтому без ограничения в базе,
+# каскадное удаление делает Django.
+#
+# Секции: <таблица>_pYYYY_MM и <таблица>_default для строк вне созданных секций. Новая секция
+# забирает свои строки из default, так что опоздавшая подготовка секций ничего не ломает.
+
+PARTITION_KEY = "created_at"
+
+
+def partitioned_tables(apps=None):
+    """(модель, таблица) в порядке архивации: сначала ответы, потом попытки."""
+    from django.apps import apps as global_apps
+
+    apps = apps or global_apps
+    models = [apps.get_model("main", "UserTestAnswer"), apps.get_model("main", "TestResult")]
+    return [(model, model._meta.db_table) for model in models]
+
+
+def is_supported(conn=connection):
+    return conn.vendor == "postgresql"
+
+
+# МЕСЯЦЫ
+
+def month_start(value):
+    value = timezone.localtime(value, dt_timezone.utc) if timezone.is_aware(value) else value
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def month_of_partition(table, name):
+    suffix = name[len(table) + 2:]
+    try:
+        return datetime.strptime(suffix, "%Y_%m").replace(tzinfo=dt_timezone.utc)
+    except ValueError:
+        return None
+
+
+def history_cutoff(months=None):
+    """Начало окна истории попыток: запросы с created_at >= cutoff читают только свежие секции."""
+    months = settings.TEST_HISTORY_MONTHS if months is None else months
+    return add_months(month_start(timezone.now()), -months)
+
+
+# СЕКЦИИ
+
+def partitions(cursor, table):
+    """Месяцы существующих секций таблицы (без default), по возрастанию."""
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        """,
+        [table],
+    )
+    months = (month_of_partition(table, name) for (name,) in cursor.fetchall())
+    return sorted(month for month in months if month is not None)
+
+
+def create_partition(cursor, table, month):
+    """Секция месяца; строки этого месяца, попавшие в default, переносятся в нее."""
+    name = partition_name(table, month)
+    start, end = month, add_months(month, 1)
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{table}_default" WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s '
+        f'RETURNING *) INSERT INTO "{name}" SELECT * FROM moved',
+        [start, end],
+    )
+    cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [start, end])
+
+
+def ensure_partitions(months_ahead=None, log=print):
+    """Секции на текущий месяц и months_ahead вперед для всех секционированных таблиц."""
+    months_ahead = settings.TEST_RESULTS_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(timezone.now())
+    created = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for _, table in partitioned_tables():
+            existing = set(partitions(cursor, table))
+            for offset in range(months_ahead + 1):
+                month = add_months(current, offset)
+                if month not in existing:
+                    create_partition(cursor, table, month)
+                    log(f"{partition_name(table, month)}: создана")
+                    created += 1
+    return created
+
+
+# ПЕРЕХОД СХЕМЫ (миграция 0014)
+
+def partition_tables(apps, schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    for model, table in reversed(partitioned_tables(apps)):
+        _convert(schema_editor, model, table, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    for model, table in reversed(partitioned_tables(apps)):
+        _convert(schema_editor, model, table, partitioned=False)
+
+
+def _convert(schema_editor, model, table, partitioned):
+    """
+    Пересоздает таблицу секционированной (или обычной) с теми же колонками, индексами и
+    внешними ключами и переносит данные. Таблица блокируется на время копирования.
+    """
+    old = f"{table}_old"
+    seq = f"{table}_id_seq"
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT is_identity FROM information_schema.columns WHERE table_name = %s AND column_name = 'id'",
+            [table],
+        )
+        is_identity = cursor.fetchone()[0] == "YES"
+
+    execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    # Последовательность id создается заново под новой таблицей
+    if is_identity:
+        execute(f'ALTER TABLE "{old}" ALTER COLUMN id DROP IDENTITY')
+    else:
+        execute(f'ALTER TABLE "{old}" ALTER COLUMN id DROP DEFAULT')
+        execute(f'DROP SEQUENCE IF EXISTS "{seq}"')
+    # Имена индексов и ограничений уникальны в схеме: старой таблице они больше не нужны
+    for index in _index_names(schema_editor, old):
+        execute(f'DROP INDEX "{index}"')
+    for constraint in _constraint_names(schema_editor, old):
+        execute(f'ALTER TABLE "{old}" DROP CONSTRAINT "{constraint}" CASCADE')
+
+    partition_clause = f" PARTITION BY RANGE ({PARTITION_KEY})" if partitioned else ""
+    execute(f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS){partition_clause}')
+    execute(f'CREATE SEQUENCE "{seq}" OWNED BY "{table}".id')
+    execute(f"ALTER TABLE \"{table}\" ALTER COLUMN id SET DEFAULT nextval('{seq}')")
+    primary_key = f"id, {PARTITION_KEY}" if partitioned else "id"
+    execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY ({primary_key})')
+
+    if partitioned:
+        execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'SELECT min({PARTITION_KEY}) FROM "{old}"')
+            first = cursor.fetchone()[0]
+            month = month_start(first or timezone.now())
+            last = add_months(month_start(timezone.now()), settings.TEST_RESULTS_PARTITION_MONTHS_AHEAD)
+            while month <= last:
+                create_partition(cursor, table, month)
+                month = add_months(month, 1)
+
+    execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+    execute(f"SELECT setval('{seq}', COALESCE((SELECT max(id) FROM \"{table}\"), 0) + 1, false)")
+    execute(f'DROP TABLE "{old}" CASCADE')
+
+    for sql in schema_editor._model_indexes_sql(model):
+        execute(sql)
+    for field in model._meta.local_fields:
+        if field.remote_field and field.db_constraint:
+            execute(schema_editor._create_fk_sql(model, field, "_fk_%(to_table)s_%(to_column)s"))
+
+
+def _index_names(schema_editor, table):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexname NOT IN "
+            "(SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)",
+            [table, table],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+def _constraint_names(schema_editor, table):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'f', 'u')",
+                       [table])
+        return [name for (name,) in cursor.fetchall()]
+
+
+# АРХИВАЦИЯ
+
+def archive_candidates(keep_months=None):
+    keep_months = settings.TEST_RESULTS_RETENTION_MONTHS if keep_months is None else keep_months
+    cutoff = add_months(month_start(timezone.now()), -keep_months)
+    with connection.cursor() as cursor:
+        months = set()
+        for _, table in partitioned_tables():
+            months.update(month for month in partitions(cursor, table) if month < cutoff)
+    return sorted(months)
+
+
+def archive_month(month, output_dir, keep_tables=False, log=print):
+    """
+    Выгружает секции месяца в <output_dir>/YYYY_MM/<таблица>.csv.gz (COPY ... CSV), затем
+    отсоединяет их и удаляет (с keep_tables — оставляет отдельными таблицами).
+    Строки TestResult.cases для попыток месяца выгружаются и удаляются вместе с ними.
+    """
+    from .models import TestResult
+
+    results_table = TestResult._meta.db_table
+    through = TestResult.cases.through._meta.db_table
+    directory = os.path.join(output_dir, f"{month:%Y_%m}")
+    os.makedirs(directory, exist_ok=True)
+    exported = {}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        tables = [table for _, table in partitioned_tables() if month in partitions(cursor, table)]
+        exports = [(table, f'SELECT * FROM "{partition_name(table, month)}"') for table in tables]
+        if results_table in tables:
+            results = partition_name(results_table, month)
+            exports.append((through, f'SELECT t.* FROM "{through}" t JOIN "{results}" r ON r.id = t.testresult_id'))
+
+        for table, query in exports:
+            exported[table] = _export(cursor, query, os.path.join(directory, f"{table}.csv.gz"))
+            log(f"{month:%Y-%m} {table}: выгружено строк: {exported[table]}")
+
+        if results_table in tables:
+            cursor.execute(f'DELETE FROM "{through}" WHERE testresult_id IN (SELECT id FROM "{results}")')
+        for table in tables:
+            name = partition_name(table, month)
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+            if not keep_tables:
+                cursor.execute(f'DROP TABLE "{name}"')
+    return exported
+
+
+def _export(cursor, query, path):
+    # COPY пишет поток прямо в gzip; файл появляется под своим именем только целиком
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    sql = f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)"
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+        if is_psycopg3:
+            # copy_expert есть только в psycopg2; в psycopg 3 данные читаются блоками из cursor.copy()
+            with cursor.copy(sql) as copy:
+                for block in copy:
+                    gz.write(block)
+        else:
+            cursor.copy_expert(sql, gz)
+        count = cursor.rowcount
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
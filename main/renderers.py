@@ -0,0 +1,75 @@
+# renderers.py
+import dataclasses
+import math
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Быстрый JSON для DRF. Вывод совпадает с JSONRenderer: компактные разделители, UTF-8 без
+# \u-экранирования, U+2028/U+2029 экранируются, типы вне JSON (datetime с "Z", Decimal, lazy-строки,
+# QuerySet и т.д.) приводятся тем же JSONEncoder.default. Отличие в байтах — запись float
+# в экспоненциальной форме (1e-05 у json, 1e-5 у orjson), значение то же.
+# Без orjson, при отступах (BrowsableAPI, ?indent) и на том, что orjson не умеет (целые
+# больше 64 бит, одиночные суррогаты), работает обычный JSONRenderer. Он же — для NaN и ±inf:
+# orjson молча пишет их как null, а JSONRenderer при STRICT_JSON выдает ValueError.
+
+_LINE_SEPARATORS = (("\u2028".encode(), b"\\u2028"), ("\u2029".encode(), b"\\u2029"))
+
+
+def _has_non_finite(obj):
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(key) or _has_non_finite(value) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(item) for item in obj)
+    return False
+
+
+def _default(obj):
+    # orjson сам сериализует dataclass, а json — нет; ведем себя как json
+    if dataclasses.is_dataclass(obj):
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return JSONEncoder().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    if orjson is not None:
+        # datetime/date/time и dataclass — через _default, как у JSONEncoder;
+        # ключи-не-строки (int, bool, None) переводятся в строки, как в json
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # STRICT_JSON = False: NaN/inf пишутся литералами, orjson так не умеет
+        if orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Приведенное через _default (генераторы одноразовые) — для проверки на NaN/inf ниже
+        converted = []
+
+        def default(obj):
+            ret = _default(obj)
+            converted.append(ret)
+            return ret
+
+        try:
+            ret = orjson.dumps(data, default=default, option=self.options)
+        except orjson.JSONEncodeError:
+            # Тот же результат или та же ошибка, что у стандартного рендерера
+            return super().render(data, accepted_media_type, renderer_context)
+        # NaN/inf orjson записал как null; обход данных нужен, только если null вообще есть в ответе
+        if b"null" in ret and (_has_non_finite(data) or _has_non_finite(converted)):
+            raise ValueError("Out of range float values are not JSON compliant")
+
+        for raw, escaped in _LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
@@ -0,0 +1,142 @@
+# response_cache.py
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.response import Response
+
+from . import compression, db_router, singleflight
+from .local_cache import local_cache
+from .models import Answer, Case, Layer, Pathology, PathologyImage, Question, Scheme, VideoTutorial, pathology_ordering
+from .renderers import FastJSONRenderer
+
+
+# Кэш готовых ответов атласа (каталог, карточки патологий и кейсов). Запись хранит JSON
+# один раз отрендеренным и сразу сжатым во всех поддерживаемых кодировках — горячий
+# ответ не сериализуется и не сжимается заново на каждый запрос.
+# Ключ содержит поколение атласа: любое изменение контента увеличивает его, и все
+# старые записи перестают читаться (и вытесняются по таймауту). Кэш у каждого воркера
+# свой (locmem), поэтому сброс разносится по воркерам через local_cache.publish. Без
+# listener (SQLite, runserver, LOCAL_CACHE_LISTEN=0) сброс из других воркеров не приходит,
+# и записи живут LOCAL_CACHE_TTL, как наборы local_cache.
+
+GENERATION_KEY = "response_cache:atlas:generation"
+TOPIC = "response_cache"
+ATLAS_MODELS = (Pathology, PathologyImage, Case, Layer, Scheme, Question, Answer, VideoTutorial)
+
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        # Начальное значение от времени: после вытеснения ключа поколение не повторится
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def invalidate_local():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation()
+
+
+def invalidate():
+    # Сразу и еще раз после коммита (запрос, успевший закэшировать данные до коммита,
+    # не оставит их в кэше), в других воркерах — по NOTIFY
+    local_cache.publish(TOPIC)
+
+
+def invalidate_on_change(*args, **kwargs):
+    invalidate()
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+
+    for model in ATLAS_MODELS:
+        post_save.connect(invalidate_on_change, sender=model, dispatch_uid=f"response_cache_{model.__name__}")
+        post_delete.connect(invalidate_on_change, sender=model, dispatch_uid=f"response_cache_del_{model.__name__}")
+    # Перенумерация патологий идет одним UPDATE без сигналов
+    pathology_ordering.on_change.append(invalidate)
+    local_cache.subscribe(TOPIC, invalidate_local)
+
+
+def make_entry(data):
+    body = FastJSONRenderer().render(data)
+    entry = {
+        "etag": f'W/"{hashlib.md5(body).hexdigest()}"',
+        "identity": body,
+    }
+    if len(body) >= settings.COMPRESSION_MIN_SIZE:
+        for encoding in compression.SUPPORTED_ENCODINGS:
+            entry[encoding] = compression.compress(body, encoding, cached=True)
+    return entry
+
+
+def cache_key(request, name, *key_args, atlas_generation=None):
+    # Ссылки на картинки абсолютные, поэтому в ключе схема и хост запроса
+    if atlas_generation is None:
+        atlas_generation = generation()
+    return ":".join([
+        "response_cache", name, str(atlas_generation), request.scheme, request.get_host(), *map(str, key_args)
+    ])
+
+
+def on_primary(build):
+    # Запись живет до следующего изменения атласа: строим с default, а не с отстающей реплики
+    def wrapped():
+        with db_router.primary_reads():
+            return build()
+    return wrapped
+
+
+def entry_timeout():
+    return settings.RESPONSE_CACHE_TIMEOUT if local_cache.listening else settings.LOCAL_CACHE_TTL
+
+
+def serves_json(request):
+    # В записи готовый JSON; для ?format=api и других рендереров ответ собирает DRF.
+    # Без согласования (прогрев кэша вызывает list() напрямую) — JSON
+    renderer = getattr(request, "accepted_renderer", None)
+    return renderer is None or renderer.format == "json"
+
+
+def cached_response(request, name, build, *key_args):
+    """Ответ из кэша или build() -> данные для JSON. Пересборку делает один запрос (singleflight)."""
+    if not serves_json(request):
+        return Response(build())
+    entry = singleflight.get_or_build(
+        cache_key(request, name, *key_args), on_primary(lambda: make_entry(build())), entry_timeout()
+    )
+    return entry_response(request, entry)
+
+
+async def acached_entry(request, name, *key_args):
+    """Готовая запись для async-представлений без ухода в поток; None — строить через cached_response."""
+    atlas_generation = await cache.aget(GENERATION_KEY)
+    if atlas_generation is None or not serves_json(request):
+        return None
+    return await singleflight.aget_fresh(cache_key(request, name, *key_args, atlas_generation=atlas_generation))
+
+
+def cached_data(request, name, build, *key_args):
+    """То же для части ответа: build() -> данные, которые ответ собирает сам."""
+    return singleflight.get_or_build(cache_key(request, name, *key_args), on_primary(build), entry_timeout())
+
+
+def entry_response(request, entry):
+    if request.META.get("HTTP_IF_NONE_MATCH") == entry["etag"]:
+        res = HttpResponseNotModified()
+    else:
+        available = [encoding for encoding in compression.SUPPORTED_ENCODINGS if encoding in entry]
+        encoding = compression.choose_encoding(request, available)
+        res = HttpResponse(entry[encoding or "identity"], content_type="application/json")
+        if encoding:
+            res["Content-Encoding"] = encoding
+        res["Content-Length"] = str(len(res.content))
+    res["ETag"] = entry["etag"]
+    res["Vary"] = "Accept-Encoding"
+    return res
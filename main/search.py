@@ -0,0 +1,287 @@
+# search.py
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+
+from .models import Case, Layer, Pathology, Question, SearchDocument, VideoTutorial
+
+
+# Полнотекстовый поиск по атласу.
+# Каждый объект атласа хранит свою строку в SearchDocument (заголовок + текст), строки
+# обновляются сигналами post_save/post_delete. На PostgreSQL по ним поддерживается
+# tsvector с русской морфологией и GIN-индекс; на SQLite (тесты) поиск идет по
+# инвертированному индексу в памяти процесса.
+
+SEARCH_CONFIG = "russian"
+SNIPPET_LENGTH = 160
+
+# kind -> (модель, функция: объект -> (title, body, parent_id))
+SOURCES = {
+    SearchDocument.Kind.PATHOLOGY: (Pathology, lambda p: (p.name, p.description, None)),
+    SearchDocument.Kind.CASE: (Case, lambda c: (c.name, "", c.pathology_id)),
+    SearchDocument.Kind.LAYER: (Layer, lambda l: (f"Слой {l.number}", l.layer_description, l.case_id)),
+    SearchDocument.Kind.QUESTION: (Question, lambda q: (q.name, q.instruction, q.case_id)),
+    SearchDocument.Kind.TUTORIAL: (VideoTutorial, lambda t: (t.name, t.description, None)),
+}
+_KIND_BY_MODEL = {model: kind for kind, (model, _) in SOURCES.items()}
+
+
+def _vector():
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("body", weight="B", config=SEARCH_CONFIG)
+    )
+
+
+# ИНДЕКСАЦИЯ
+
+def index_object(obj):
+    kind = _KIND_BY_MODEL[type(obj)]
+    title, body, parent_id = SOURCES[kind][1](obj)
+    doc, _ = SearchDocument.objects.update_or_create(
+        kind=kind, object_id=obj.pk,
+        defaults={"title": title[:255], "body": body or "", "parent_id": parent_id},
+    )
+    if connection.vendor == "postgresql":
+        SearchDocument.objects.filter(pk=doc.pk).update(vector=_vector())
+    fallback_index.invalidate()
+
+
+def index_objects(objects):
+    """index_object для объектов одной модели после UPDATE без сигналов: постоянное число запросов."""
+    objects = list(objects)
+    if not objects:
+        return
+    kind = _KIND_BY_MODEL[type(objects[0])]
+    extract = SOURCES[kind][1]
+    ids = [obj.pk for obj in objects]
+    docs = []
+    for obj in objects:
+        title, body, parent_id = extract(obj)
+        docs.append(SearchDocument(kind=kind, object_id=obj.pk, title=title[:255], body=body or "", parent_id=parent_id))
+    with transaction.atomic():
+        SearchDocument.objects.filter(kind=kind, object_id__in=ids).delete()
+        SearchDocument.objects.bulk_create(docs)
+        if connection.vendor == "postgresql":
+            SearchDocument.objects.filter(kind=kind, object_id__in=ids).update(vector=_vector())
+    fallback_index.invalidate()
+
+
+def remove_object(obj):
+    SearchDocument.objects.filter(kind=_KIND_BY_MODEL[type(obj)], object_id=obj.pk).delete()
+    fallback_index.invalidate()
+
+
+def on_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_object(instance)
+
+
+def on_deleted(sender, instance, **kwargs):
+    remove_object(instance)
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+
+    for model, _ in SOURCES.values():
+        post_save.connect(on_saved, sender=model, dispatch_uid=f"search_index_{model.__name__}")
+        post_delete.connect(on_deleted, sender=model, dispatch_uid=f"search_unindex_{model.__name__}")
+
+
+def rebuild(batch_size=1000, apps=None):
+    """
+    Полная переиндексация (после bulk_create/update, которые не вызывают сигналы).
+    apps — реестр моделей миграции: 0009 заполняет индекс при создании таблицы.
+    """
+    def get_model(model):
+        return model if apps is None else apps.get_model(model._meta.app_label, model.__name__)
+
+    documents = get_model(SearchDocument)._default_manager
+    with transaction.atomic():
+        documents.all().delete()
+        total = 0
+        for kind, (model, extract) in SOURCES.items():
+            docs = []
+            for obj in get_model(model)._default_manager.order_by().iterator(chunk_size=batch_size):
+                title, body, parent_id = extract(obj)
+                docs.append(documents.model(
+                    kind=kind, object_id=obj.pk, title=title[:255], body=body or "", parent_id=parent_id
+                ))
+            documents.bulk_create(docs, batch_size=batch_size)
+            total += len(docs)
+        if connection.vendor == "postgresql":
+            documents.update(vector=_vector())
+    fallback_index.invalidate()
+    return total
+
+
+# ПОИСК
+
+def search(text, kinds=None, limit=20):
+    text = (text or "").strip()
+    if not text:
+        return []
+    if connection.vendor != "postgresql":
+        return fallback_index.search(text, kinds=kinds, limit=limit)
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    documents = SearchDocument.objects.filter(vector=query)
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    documents = documents.annotate(
+        rank=SearchRank("vector", query),
+        snippet=SearchHeadline(
+            "body", query, config=SEARCH_CONFIG, max_words=30, min_words=10, start_sel="<b>", stop_sel="</b>"
+        ),
+    ).order_by("-rank", "id")[:limit]
+    return [_result(doc, doc.snippet, doc.rank) for doc in documents]
+
+
+def autocomplete(prefix, limit=10):
+    """Подсказки заголовков по началу слов: "кольп иссл" найдет "Кольпоскопическое исследование"."""
+    terms = _WORD_RE.findall((prefix or "").lower())
+    if not terms:
+        return []
+    if connection.vendor != "postgresql":
+        return fallback_index.autocomplete(terms, limit=limit)
+
+    raw = " & ".join(f"{term}:*" for term in terms)
+    query = SearchQuery(raw, config=SEARCH_CONFIG, search_type="raw")
+    documents = (
+        SearchDocument.objects.filter(vector=query)
+        .annotate(rank=SearchRank("vector", query))
+        .order_by("-rank", "title")
+        .values_list("title", flat=True)
+    )
+    return _unique(documents[:limit * 3], limit)
+
+
+def _result(doc, snippet, rank):
+    return {
+        "kind": doc.kind,
+        "id": doc.object_id,
+        "parent_id": doc.parent_id,
+        "title": doc.title,
+        "snippet": snippet,
+        "rank": round(float(rank), 4),
+    }
+
+
+def _unique(titles, limit):
+    result = []
+    for title in titles:
+        if title not in result:
+            result.append(title)
+            if len(result) == limit:
+                break
+    return result
+
+
+# ИНДЕКС В ПАМЯТИ (SQLite)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+MIN_STEM_LENGTH = 4
+# Окончания для грубого стемминга, от длинных к коротким
+_RUSSIAN_ENDINGS = sorted((
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ая", "яя", "ое", "ее", "ые", "ие", "ой", "ей",
+    "ий", "ый", "ом", "ем", "ам", "ям", "ах", "ях", "ую", "юю", "ов", "ев", "ию", "ия", "ье", "а", "я",
+    "о", "е", "ы", "и", "у", "ю", "ь",
+), key=len, reverse=True)
+
+
+def stem(word):
+    word = word.lower().replace("ё", "е")
+    for ending in _RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+class InMemoryIndex:
+    TITLE_WEIGHT = 2.0
+    BODY_WEIGHT = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stale = True
+        self._documents = {}
+        self._postings = {}
+        self._terms = []
+
+    def invalidate(self):
+        self._stale = True
+
+    def _ensure_built(self):
+        with self._lock:
+            if not self._stale:
+                return
+            documents = {}
+            postings = defaultdict(dict)
+            for doc in SearchDocument.objects.defer("vector").iterator():
+                documents[doc.pk] = doc
+                for weight, text in ((self.TITLE_WEIGHT, doc.title), (self.BODY_WEIGHT, doc.body)):
+                    for word in _WORD_RE.findall(text):
+                        term = stem(word)
+                        postings[term][doc.pk] = postings[term].get(doc.pk, 0.0) + weight
+            self._documents = documents
+            self._postings = dict(postings)
+            self._terms = sorted(postings)
+            self._stale = False
+
+    def _prefix_terms(self, prefix):
+        start = bisect_left(self._terms, prefix)
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def _similar_terms(self, term):
+        # Стемминг грубый ("эпителий" -> "эпител", "эпителием" -> "эпители"), поэтому
+        # основы считаются совпавшими, если одна начинается с другой
+        yield from self._prefix_terms(term)
+        for length in range(MIN_STEM_LENGTH, len(term)):
+            if term[:length] in self._postings:
+                yield term[:length]
+
+    def _score(self, terms, prefix=False):
+        scores = None
+        for term in terms:
+            matched = defaultdict(float)
+            for indexed in (self._prefix_terms(term) if prefix else self._similar_terms(term)):
+                for pk, weight in self._postings.get(indexed, {}).items():
+                    matched[pk] += weight
+            # Все слова запроса должны встретиться (как & в tsquery)
+            scores = matched if scores is None else {pk: s + matched[pk] for pk, s in scores.items() if pk in matched}
+        return scores or {}
+
+    def search(self, text, kinds=None, limit=20):
+        self._ensure_built()
+        terms = [stem(word) for word in _WORD_RE.findall(text)]
+        scores = self._score(terms)
+        docs = [self._documents[pk] for pk in scores]
+        if kinds:
+            docs = [doc for doc in docs if doc.kind in kinds]
+        docs.sort(key=lambda doc: (-scores[doc.pk], doc.pk))
+        return [_result(doc, self._snippet(doc.body, terms), scores[doc.pk]) for doc in docs[:limit]]
+
+    def autocomplete(self, terms, limit=10):
+        self._ensure_built()
+        # Слова могут быть недописаны, поэтому ищем индексированные основы, начинающиеся с основы запроса
+        scores = self._score([stem(term) for term in terms], prefix=True)
+        docs = sorted((self._documents[pk] for pk in scores), key=lambda doc: (-scores[doc.pk], doc.title))
+        return _unique((doc.title for doc in docs), limit)
+
+    @staticmethod
+    def _snippet(body, terms):
+        lowered = body.lower()
+        positions = [lowered.find(term) for term in terms if term in lowered]
+        start = max(min(positions) - SNIPPET_LENGTH // 4, 0) if positions else 0
+        return body[start:start + SNIPPET_LENGTH]
+
+
+fallback_index = InMemoryIndex()
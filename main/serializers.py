@@ -2,8 +2,10 @@
 from django.db import transaction
 from rest_framework import serializers, generics
 from django.contrib.auth import get_user_model
+from . import images
 from .models import (
-    WorkerProfile, Case, Layer, Question, Pathology, Scheme, Answer, PathologyImage, TestResult, VideoTutorial
+    WorkerProfile, Case, Layer, Question, Pathology, Scheme, Answer, PathologyImage, TestResult, VideoTutorial,
+    TutorialUpload
 )
 
 
@@ -116,31 +118,64 @@ class WorkerProfileSerializer(serializers.ModelSerializer):
 
 # ОСНОВНОЙ КОНТЕНТ (АТЛАС, КЕЙСЫ)
 
-class PathologyInfoSerializer(serializers.ModelSerializer):
+class ProcessedImagesMixin:
+    """
+    Картинки из processed_image_fields уменьшаются и перекодируются при загрузке (images.py),
+    их размеры попадают в <поле>_width/_height/_size.
+    """
+    processed_image_fields = ()
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        for name in self.processed_image_fields:
+            upload = attrs.get(name)
+            if not upload:
+                continue
+            try:
+                attrs.update(images.process_upload(name, upload))
+            except images.ImageProcessingError as exc:
+                raise serializers.ValidationError({name: str(exc)})
+        return attrs
+
+
+def image_dimension_fields(*names):
+    return tuple(field for name in names for field in images.dimension_fields(name))
+
+
+class PathologyInfoSerializer(ProcessedImagesMixin, serializers.ModelSerializer):
+    processed_image_fields = ('image',)
+
     class Meta:
         model = PathologyImage
-        fields = ['id', 'image', 'pathology']
+        fields = ['id', 'image', 'pathology', *image_dimension_fields('image')]
+
+class PathologyImageSerializer(ProcessedImagesMixin, serializers.ModelSerializer):
+    processed_image_fields = ('image',)
 
-class PathologyImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = PathologyImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', *image_dimension_fields('image')]
+
+class LayerSerializer(ProcessedImagesMixin, serializers.ModelSerializer):
+    processed_image_fields = ('layer_img',)
 
-class LayerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Layer
         # 1. Добавляем 'case' в поля
-        fields = ['id', 'case', 'number', 'layer_img', 'layer_description']
+        fields = ['id', 'case', 'number', 'layer_img', 'layer_description', *image_dimension_fields('layer_img')]
 
         # 2. Делаем его необязательным для валидатора, чтобы не ломалось
         # создание большого JSON (где case создается автоматически)
         extra_kwargs = {'case': {'required': False}}
 
-class SchemeSerializer(serializers.ModelSerializer):
+class SchemeSerializer(ProcessedImagesMixin, serializers.ModelSerializer):
+    processed_image_fields = ('scheme_img', 'scheme_description_img')
+
     class Meta:
         model = Scheme
         # То же самое для схем
-        fields = ['id', 'case', 'scheme_img', 'scheme_description_img']
+        fields = ['id', 'case', 'scheme_img', 'scheme_description_img',
+                  *image_dimension_fields('scheme_img', 'scheme_description_img')]
         extra_kwargs = {'case': {'required': False}}
 
 class AnswerSerializer(serializers.ModelSerializer):
@@ -264,6 +299,9 @@ class PathologyListSerializer(serializers.ModelSerializer):
         model = Pathology
         fields = ("id", "name",'number')
 
+class PathologyMoveSerializer(serializers.Serializer):
+    position = serializers.IntegerField(min_value=1)
+
 class TestListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Pathology
@@ -295,6 +333,21 @@ class PathologyDetailInfoSerializer(serializers.ModelSerializer):
         fields = ("id", "description", "imgContainer")
 
 
+# Слои упорядочены по number через Layer.Meta.ordering, поэтому obj.layers.all()
+# берет данные из prefetch_related без отдельного запроса. То же для схемы:
+# obj.schemes.first() всегда делает запрос, а здесь используется уже загруженный список.
+def first_scheme(case):
+    return min(case.schemes.all(), key=lambda scheme: scheme.pk, default=None)
+
+
+# Размеры картинки для клиента, чтобы зарезервировать место до загрузки. Ссылка в таких
+# объектах лежит под ключом "image", поэтому и размеры — image_width/_height/_size, как у
+# сериализаторов с image_dimension_fields
+def image_dimensions(obj, name):
+    values = (getattr(obj, field) for field in images.dimension_fields(name))
+    return dict(zip(images.dimension_fields('image'), values))
+
+
 class CaseDetailInfoSerializer(serializers.ModelSerializer):
     imgContainer = serializers.SerializerMethodField()
     descriptionContainer = serializers.SerializerMethodField()
@@ -307,7 +360,7 @@ class CaseDetailInfoSerializer(serializers.ModelSerializer):
     def get_imgContainer(self, obj):
         request = self.context.get('request')
         items = []
-        layers = obj.layers.all().order_by('number')
+        layers = obj.layers.all()
         for layer in layers:
             if layer.layer_img:
                 url = layer.layer_img.url
@@ -319,9 +372,10 @@ class CaseDetailInfoSerializer(serializers.ModelSerializer):
                 items.append({
                     "id": layer.id,
                     "image": url,
+                    **image_dimensions(layer, 'layer_img'),
                 })
 
-        scheme = obj.schemes.first()
+        scheme = first_scheme(obj)
         if scheme and scheme.scheme_img:
             url_scheme = scheme.scheme_img.url
             url_scheme = url_scheme.replace('\\', '/')
@@ -332,13 +386,14 @@ class CaseDetailInfoSerializer(serializers.ModelSerializer):
             items.append({
                 "id": scheme.id,
                 "image": url_scheme,
+                **image_dimensions(scheme, 'scheme_img'),
             })
 
         return items
 
     def get_imgSchema(self, obj):
         request = self.context.get('request')
-        scheme = obj.schemes.first()
+        scheme = first_scheme(obj)
 
         if scheme and scheme.scheme_description_img:
             url = scheme.scheme_description_img.url
@@ -349,12 +404,13 @@ class CaseDetailInfoSerializer(serializers.ModelSerializer):
             # Возвращаем объект, а не строку
             return {
                 "id": scheme.id,
-                "image": url
+                "image": url,
+                **image_dimensions(scheme, 'scheme_description_img'),
             }
         return None
 
     def get_descriptionContainer(self, obj):
-        layers = obj.layers.all().order_by('number')
+        layers = obj.layers.all()
         descriptions = []
         for layer in layers:
             if layer.layer_description:
@@ -394,7 +450,7 @@ class TestTaskSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         urls = []
         # Слои
-        for layer in obj.layers.all().order_by('number'):
+        for layer in obj.layers.all():
             if layer.layer_img:
                 url = layer.layer_img.url.replace('\\', '/')
                 if request: url = request.build_absolute_uri(url)
@@ -553,13 +609,13 @@ class HistoryTaskSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         urls = []
         # Слои
-        for layer in obj.layers.all().order_by('number'):
+        for layer in obj.layers.all():
             if layer.layer_img:
                 url = layer.layer_img.url.replace('\\', '/')
                 if request: url = request.build_absolute_uri(url)
                 urls.append(url)
         # Схема (если есть)
-        scheme = obj.schemes.first()
+        scheme = first_scheme(obj)
         if scheme and scheme.scheme_img:
             s_url = scheme.scheme_img.url.replace('\\', '/')
             if request: s_url = request.build_absolute_uri(s_url)
@@ -582,22 +638,50 @@ class TutorialListSerializer(serializers.ModelSerializer):
 class TutorialDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = VideoTutorial
-        fields = ('id', 'name', 'video', 'poster', 'description','tutorial_file')
+        fields = ('id', 'name', 'video', 'poster', 'description','tutorial_file', *image_dimension_fields('poster'))
+
+class TutorialCreateSerializer(ProcessedImagesMixin, serializers.ModelSerializer):
+    processed_image_fields = ('poster',)
 
-class TutorialCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = VideoTutorial
-        fields = ('id', 'name', 'video', 'poster', 'description','tutorial_file')
+        fields = ('id', 'name', 'video', 'poster', 'description','tutorial_file', *image_dimension_fields('poster'))
 
 class TutorialDeleteSerializer(serializers.ModelSerializer):
     class Meta:
         model = VideoTutorial
         fields = ('id',)
 
-class TutorialUpdateSerializer(serializers.ModelSerializer):
+class TutorialUpdateSerializer(ProcessedImagesMixin, serializers.ModelSerializer):
+    processed_image_fields = ('poster',)
+
     class Meta:
         model = VideoTutorial
-        fields = ('id', 'name', 'video', 'poster', 'description', 'tutorial_file')
+        fields = ('id', 'name', 'video', 'poster', 'description', 'tutorial_file', *image_dimension_fields('poster'))
+
+# Начало загрузки видео по частям. Без tutorial создается новый туториал (нужны name и description)
+class TutorialUploadInitSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, default='')
+    tutorial = serializers.PrimaryKeyRelatedField(queryset=VideoTutorial.objects.all(), required=False, allow_null=True)
+    name = serializers.CharField(max_length=255, required=False, default='')
+    description = serializers.CharField(required=False, default='')
+
+    def validate(self, attrs):
+        if attrs.get('tutorial') is None and not (attrs['name'] and attrs['description']):
+            raise serializers.ValidationError("Для нового туториала нужны name и description")
+        return attrs
+
+class TutorialUploadSerializer(serializers.ModelSerializer):
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    next_chunk = serializers.IntegerField(source='received_chunks', read_only=True)
+    total_chunks = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = TutorialUpload
+        fields = ('upload_id', 'status', 'filename', 'total_size', 'chunk_size', 'total_chunks',
+                  'next_chunk', 'received_bytes', 'tutorial')
 
 # Для обновления названия кейса
 class CaseUpdateSerializer(serializers.ModelSerializer):
@@ -606,16 +690,32 @@ class CaseUpdateSerializer(serializers.ModelSerializer):
         fields = ("id", "name")
 
 # Для обновления слоя (картинка + описание)
-class LayerUpdateSerializer(serializers.ModelSerializer):
+class LayerUpdateSerializer(ProcessedImagesMixin, serializers.ModelSerializer):
+    processed_image_fields = ("layer_img",)
+
     class Meta:
         model = Layer
-        fields = ("id", "layer_img", "layer_description")
+        fields = ("id", "layer_img", "layer_description", *image_dimension_fields("layer_img"))
+
+# Новый порядок слоев кейса: полный список ID его слоев
+class LayerOrderSerializer(serializers.Serializer):
+    layers = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_layers(self, value):
+        case = self.context['case']
+        current = {layer.id for layer in case.layers.all()}
+        if len(value) != len(set(value)) or set(value) != current:
+            raise serializers.ValidationError("Нужно передать каждый слой кейса ровно один раз")
+        return value
 
 # Для обновления схемы (обе картинки)
-class SchemeUpdateSerializer(serializers.ModelSerializer):
+class SchemeUpdateSerializer(ProcessedImagesMixin, serializers.ModelSerializer):
+    processed_image_fields = ("scheme_img", "scheme_description_img")
+
     class Meta:
         model = Scheme
-        fields = ("id", "scheme_img", "scheme_description_img")
+        fields = ("id", "scheme_img", "scheme_description_img",
+                  *image_dimension_fields("scheme_img", "scheme_description_img"))
 
 
 class AnswerDtoSerializer(serializers.ModelSerializer):
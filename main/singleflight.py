@@ -0,0 +1,78 @@
+# singleflight.py
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+
+
+# Защита от «стада» при пересборке дорогих данных в кэше Django.
+#   - Блокировка: пересобирает тот, кто первым взял ключ <key>:lock через cache.add
+#     (аренда на lease секунд — упавший держатель не заблокирует ключ навсегда).
+#   - Досрочная пересборка (XFetch): незадолго до истечения запись с вероятностью, растущей
+#     к концу срока и с длительностью сборки, считается устаревшей — один из запросов
+#     пересобирает ее заранее, пока остальные читают текущую.
+#   - Stale-while-revalidate: запись живет в кэше дольше своего срока на stale секунд;
+#     пока идет пересборка, остальные получают прежнее значение, а не ждут.
+# Ждать приходится только при отсутствии записи: ожидающие опрашивают кэш до конца аренды,
+# потом строят сами.
+
+LEASE = 10
+# >1 — пересобирать раньше, <1 — позже
+BETA = 1.0
+WAIT_INTERVAL = 0.05
+
+
+def get_or_build(key, build, timeout, stale=None, lease=LEASE, beta=BETA):
+    lock_key = f"{key}:lock"
+    stale = timeout if stale is None else stale
+    deadline = None
+    while True:
+        entry = cache.get(key)
+        now = time.time()
+        if entry is not None:
+            value, expires_at, delta = entry
+            if not _recompute_early(now, expires_at, delta, beta):
+                return value
+
+        token = uuid.uuid4().hex
+        if cache.add(lock_key, token, lease):
+            try:
+                return _build(key, build, timeout, stale)
+            finally:
+                # Не снимаем чужую блокировку, если наша аренда уже истекла
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        if entry is not None:
+            return value
+        if deadline is None:
+            deadline = now + lease
+        elif now >= deadline:
+            # Держатель блокировки не уложился в аренду
+            return _build(key, build, timeout, stale)
+        time.sleep(WAIT_INTERVAL)
+
+
+async def aget_fresh(key, beta=BETA):
+    """Значение без блокировок для async-кода; None — записи нет или ее пора пересобрать через get_or_build."""
+    entry = await cache.aget(key)
+    if entry is not None:
+        value, expires_at, delta = entry
+        if not _recompute_early(time.time(), expires_at, delta, beta):
+            return value
+    return None
+
+
+def _recompute_early(now, expires_at, delta, beta):
+    # log(u) < 0 для u из (0, 1]: сдвиг вперед тем больше, чем дольше сборка
+    return now - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def _build(key, build, timeout, stale):
+    start = time.monotonic()
+    value = build()
+    delta = time.monotonic() - start
+    cache.set(key, (value, time.time() + timeout, delta), timeout + stale)
+    return value
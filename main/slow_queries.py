@@ -0,0 +1,192 @@
+# slow_queries.py
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+# Выборка медленных SQL-запросов.
+# Запросы дольше SLOW_QUERY_THRESHOLD_MS нормализуются (литералы и списки IN заменяются
+# на плейсхолдеры), группируются по отпечатку и копятся в памяти процесса. Раз в
+# SLOW_QUERY_FLUSH_INTERVAL секунд накопленное сбрасывается в таблицу SlowQuery.
+
+_STRING_RE = re.compile(r"'(?:''|[^'])*'")
+_NUMBER_RE = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+_VALUES_RE = re.compile(r"\bVALUES\s*(\((?:[^()]|\([^()]*\))*\))(?:\s*,\s*\((?:[^()]|\([^()]*\))*\))+", re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    sql = _VALUES_RE.sub(r"VALUES \1, ...", sql)
+    return _SPACES_RE.sub(" ", sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode("utf-8")).hexdigest()[:16]
+
+
+def _jsonable_params(params):
+    if params is None:
+        return []
+    try:
+        return json.loads(json.dumps(list(params), default=str))
+    except TypeError:
+        # executemany или словарь параметров — образец не сохраняем
+        return []
+
+
+class SlowQuerySampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._buffer = {}
+        self._last_flush = time.monotonic()
+
+    @property
+    def threshold(self):
+        return getattr(settings, "SLOW_QUERY_THRESHOLD_MS", 200) / 1000
+
+    @property
+    def sample_rate(self):
+        return getattr(settings, "SLOW_QUERY_SAMPLE_RATE", 1.0)
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(self._local, "flushing", False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold and random.random() < self.sample_rate:
+                self.record(context["connection"].alias, sql, None if many else params, duration)
+
+    def record(self, alias, sql, params, duration):
+        normalized = normalize_sql(sql)
+        key = fingerprint(normalized)
+        duration_ms = duration * 1000
+        with self._lock:
+            entry = self._buffer.get(key)
+            if entry is None:
+                entry = self._buffer[key] = {
+                    "normalized_sql": normalized,
+                    "database": alias,
+                    "calls": 0,
+                    "total_time_ms": 0.0,
+                    "max_time_ms": 0.0,
+                }
+            entry["calls"] += 1
+            entry["total_time_ms"] += duration_ms
+            if duration_ms >= entry["max_time_ms"]:
+                # Храним самый медленный экземпляр — его и будем EXPLAIN'ить
+                entry["max_time_ms"] = duration_ms
+                entry["sample_sql"] = sql
+                entry["sample_params"] = _jsonable_params(params)
+
+    def flush_if_due(self, **kwargs):
+        interval = getattr(settings, "SLOW_QUERY_FLUSH_INTERVAL", 30)
+        if self._buffer and time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        from .models import SlowQuery
+
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+            self._last_flush = time.monotonic()
+        if not buffer:
+            return 0
+
+        self._local.flushing = True
+        try:
+            now = timezone.now()
+            for key, entry in buffer.items():
+                with transaction.atomic():
+                    obj, created = SlowQuery.objects.get_or_create(
+                        fingerprint=key,
+                        defaults={
+                            "normalized_sql": entry["normalized_sql"],
+                            "sample_sql": entry["sample_sql"],
+                            "sample_params": entry["sample_params"],
+                            "database": entry["database"],
+                            "calls": entry["calls"],
+                            "total_time_ms": entry["total_time_ms"],
+                            "max_time_ms": entry["max_time_ms"],
+                            "last_seen": now,
+                        },
+                    )
+                    if created:
+                        continue
+                    updates = {
+                        "calls": F("calls") + entry["calls"],
+                        "total_time_ms": F("total_time_ms") + entry["total_time_ms"],
+                        "max_time_ms": Greatest(F("max_time_ms"), entry["max_time_ms"]),
+                        "last_seen": now,
+                    }
+                    if entry["max_time_ms"] > obj.max_time_ms:
+                        updates["sample_sql"] = entry["sample_sql"]
+                        updates["sample_params"] = entry["sample_params"]
+                    SlowQuery.objects.filter(pk=obj.pk).update(**updates)
+        finally:
+            self._local.flushing = False
+        return len(buffer)
+
+
+sampler = SlowQuerySampler()
+
+
+def install_slow_query_sampler(sender, connection, **kwargs):
+    if sampler not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sampler)
+
+
+# EXPLAIN
+
+def explain(slow_query, analyze=True):
+    """
+    Строит план для сохраненного образца запроса. На PostgreSQL выполняется
+    EXPLAIN (ANALYZE, BUFFERS) внутри транзакции, которая затем откатывается.
+    ANALYZE реально выполняет запрос, поэтому разрешен только для SELECT.
+    """
+    connection = connections[slow_query.database]
+    sql = slow_query.sample_sql
+    params = slow_query.sample_params or None
+    is_select = sql.lstrip().upper().startswith(("SELECT", "WITH"))
+
+    if connection.vendor == "postgresql":
+        options = "ANALYZE, BUFFERS" if analyze and is_select else "COSTS"
+        prefix = f"EXPLAIN ({options}) "
+    elif connection.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+
+    sampler._local.flushing = True
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+            transaction.set_rollback(True, using=connection.alias)
+    finally:
+        sampler._local.flushing = False
+
+    plan = "\n".join(" ".join(str(col) for col in row) for row in rows)
+    slow_query.plan = plan
+    slow_query.explained_at = timezone.now()
+    slow_query.save(update_fields=["plan", "explained_at"])
+    return plan
@@ -1,3 +1,1176 @@
-from django.test import TestCase
+import datetime
+import decimal
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.state import ProjectState
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    atlas_bundle, benchmark, cache_warming, db_router, instrumentation, local_cache, media_gc, partitions,
+    response_cache, singleflight, slow_queries, uploads,
+)
+from .admin import EstimatedCountPaginator
+from .operations import AddPostgresIndex
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .models import (
+    Account, Case, Layer, Pathology, PathologyImage, Question, SearchDocument, SlowQuery, TestResult, UserTestAnswer,
+    VideoTutorial, WorkerProfile, pack_ids,
+)
+
+
+def auth_headers(user):
+    token = RefreshToken.for_user(user).access_token
+    return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+
+class PrometheusMetricsTests(TestCase):
+    def setUp(self):
+        self.user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        pathology = Pathology.objects.create(name="Патология", description="Описание")
+        PathologyImage.objects.create(pathology=pathology, image="pathology_img/test.png")
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_exported_in_prometheus_format(self):
+        self.client.get("/api/atlas/atlas-list/", **auth_headers(self.user))
+
+        res = self.client.get("/api/metrics", HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        body = res.content.decode()
+        self.assertIn('colposcopy_request_duration_seconds_bucket{le="0.005",method="GET",view="atlas-list-info"}', body)
+        self.assertIn('colposcopy_db_queries_total{view="atlas-list-info"}', body)
+        self.assertIn("colposcopy_active_test_sessions", body)
+        self.assertIn("colposcopy_test_submissions_total", body)
+        self.assertIn("colposcopy_media_bytes_served_total", body)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token_required_when_configured(self):
+        self.assertEqual(self.client.get("/api/metrics").status_code, 401)
+        res = self.client.get("/api/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_hidden_without_token(self):
+        self.assertEqual(self.client.get("/api/metrics").status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get("/api/metrics").status_code, 200)
+
+
+class RequestInstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        instrumentation.registry.reset()
+        user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        self.headers = auth_headers(user)
+        Pathology.objects.create(name="Патология", description="Описание")
+
+    def server_timing(self, res):
+        # Запятая внутри desc="..." — не разделитель метрик
+        return dict(re.findall(r'(\w+);((?:[^,"]|"[^"]*")*)', res["Server-Timing"]))
+
+    def test_server_timing_matches_recorded_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            first = self.client.get("/api/atlas/atlas-list/", **self.headers)
+        self.assertEqual(first.status_code, 200)
+        timing = self.server_timing(first)
+        self.assertEqual(timing["db"].split(";", 1)[1], f'desc="{len(ctx)} queries, 0 new conn"')
+        self.assertRegex(timing["total"], r"^dur=\d+\.\d{2}$")
+
+        # Второй запрос — из response_cache, без промахов
+        with CaptureQueriesContext(connection) as second_ctx:
+            second = self.client.get("/api/atlas/atlas-list/", **self.headers)
+        cache_counts = [
+            [int(n) for n in re.findall(r"\d+", self.server_timing(res)["cache"])] for res in (first, second)
+        ]
+        self.assertGreater(cache_counts[0][1], 0)
+        self.assertEqual(cache_counts[1][1], 0)
+        self.assertGreater(cache_counts[1][0], 0)
+
+        stats = instrumentation.registry.snapshot()["atlas-list-info"]
+        self.assertEqual(stats["total_requests"], 2)
+        self.assertEqual(stats["avg_queries"], (len(ctx) + len(second_ctx)) / 2)
+        self.assertEqual(stats["cache_hits"], cache_counts[0][0] + cache_counts[1][0])
+        self.assertEqual(stats["cache_misses"], cache_counts[0][1] + cache_counts[1][1])
+
+
+class SlowQueryTests(TestCase):
+    def test_normalization_collapses_literals_and_in_lists(self):
+        queries = [
+            "SELECT * FROM main_case WHERE name = 'Кейс ''1''' AND id IN (1, 2, 3) LIMIT 10",
+            "SELECT *  FROM main_case\nWHERE name = 'другой' AND id IN (%s, %s) LIMIT 21",
+        ]
+        normalized = [slow_queries.normalize_sql(sql) for sql in queries]
+        self.assertEqual(normalized[0], "SELECT * FROM main_case WHERE name = ? AND id IN (...) LIMIT ?")
+        self.assertEqual(normalized[0], normalized[1])
+        self.assertEqual(slow_queries.fingerprint(normalized[0]), slow_queries.fingerprint(normalized[1]))
+        self.assertEqual(
+            slow_queries.normalize_sql('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" ("a", "b") VALUES (?, ?), ...',
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=1.0, SLOW_QUERY_FLUSH_INTERVAL=0)
+    def test_repeated_queries_add_up_in_one_row(self):
+        slow_queries.sampler.flush()
+        list(Pathology.objects.filter(id__in=[1, 2]))
+        list(Pathology.objects.filter(id__in=[3, 4, 5]))
+        # Сброс в базу — по сигналу request_finished
+        self.client.get("/api/metrics")
+        list(Pathology.objects.filter(id__in=[6]))
+        self.client.get("/api/metrics")
+
+        sql = Pathology.objects.filter(id__in=[1, 2]).query.sql_with_params()[0]
+        row = SlowQuery.objects.get(fingerprint=slow_queries.fingerprint(slow_queries.normalize_sql(sql)))
+        self.assertEqual(row.calls, 3)
+        self.assertGreater(row.total_time_ms, 0)
+        self.assertGreaterEqual(row.total_time_ms, row.max_time_ms)
+
+
+class IndexBenchmarkTests(TestCase):
+    def test_postgres_index_only_changes_state_elsewhere(self):
+        from_state = ProjectState.from_apps(apps)
+        to_state = from_state.clone()
+        operation = AddPostgresIndex("case", models.Index(fields=["name"], name="case_name_test_idx"))
+        operation.state_forwards("main", to_state)
+        self.assertIn("case_name_test_idx", [i.name for i in to_state.models["main", "case"].options["indexes"]])
+
+        editor = mock.Mock(connection=connection)
+        operation.database_forwards("main", editor, from_state, to_state)
+        operation.database_backwards("main", editor, to_state, from_state)
+        if connection.vendor == "postgresql":
+            self.assertEqual([call[0] for call in editor.method_calls], ["add_index", "remove_index"])
+        else:
+            self.assertEqual(editor.method_calls, [])
+
+    def test_index_benchmark_command(self):
+        out = io.StringIO()
+        call_command("index_benchmark", "--seed", "--users=2", "--pathologies=2", "--cases-per-pathology=2",
+                     "--results-per-user=3", "--no-analyze", "--yes", "--json", stdout=out)
+        # Перед JSON-отчетом — лог генерации фикстур
+        report = json.loads(out.getvalue()[out.getvalue().index("\n["):])
+        self.assertEqual(report[0]["endpoint"], "profile-history")
+        for item in report:
+            self.assertTrue(item["with_index"] and item["without_index"], item["endpoint"])
+        # Удаленные индексы вернулись после отката
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, TestResult._meta.db_table)
+        self.assertIn("testresult_user_created_idx", constraints)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_and_run_benchmark(self):
+        out = io.StringIO()
+        call_command("seed_benchmark", "--pathologies=2", "--cases-per-pathology=2", "--layers-per-case=1",
+                     "--questions-per-case=2", "--answers-per-question=2", "--users=2", "--results-per-user=3",
+                     "--no-images", "--legacy-share=0.5", stdout=out)
+        self.assertIn("Готово", out.getvalue())
+        self.assertEqual(Pathology.objects.count(), 2)
+        self.assertEqual(Case.objects.count(), 4)
+        self.assertEqual(TestResult.objects.count(), 6)
+        # Попытки в старом формате: кейсы в cases, по ответу на каждый вопрос в UserTestAnswer
+        legacy = TestResult.objects.filter(answer_ids_packed__isnull=True)
+        self.assertTrue(0 < legacy.count() < 6)
+        self.assertEqual(UserTestAnswer.objects.count(), 2 * TestResult.cases.through.objects.count())
+        self.assertEqual(set(UserTestAnswer.objects.values_list("test_result_id", flat=True)),
+                         set(legacy.values_list("id", flat=True)))
+        self.assertIn(f"'user_test_answers': {UserTestAnswer.objects.count()}", out.getvalue())
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command("run_benchmark", "--iterations=2", "--warmup=0", stdout=out, stderr=err)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["meta"]["iterations"], 2)
+        self.assertEqual(set(report["endpoints"]), set(benchmark.BENCHMARK_ENDPOINTS))
+        for name, result in report["endpoints"].items():
+            # Ошибки эндпоинта не роняют прогон, а попадают в statuses
+            self.assertEqual(result["requests"], 2, name)
+            self.assertTrue(set(result["statuses"]) <= {"200", "201"}, (name, result["statuses"]))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        pathology = Pathology.objects.create(name="Эктопия шейки матки", description="Цилиндрический эпителий на шейке")
+        self.case = Case.objects.create(pathology=pathology, name="Случай эктопии")
+        Layer.objects.create(case=self.case, number=1, layer_img="case_layers/1.png",
+                             layer_description="После пробы с уксусной кислотой видна эктопия")
+        Question.objects.create(case=self.case, name="Какой эпителий виден?", instruction="Выберите вариант")
+        VideoTutorial.objects.create(name="Кольпоскопическое исследование", description="Основы")
+
+    def test_search_matches_word_forms_and_filters_by_kind(self):
+        res = self.client.get("/api/search/", {"q": "эпителием"}, **auth_headers(self.user))
+        self.assertEqual({item["kind"] for item in res.json()["items"]}, {"pathology", "question"})
+
+        res = self.client.get("/api/search/", {"q": "эктопия", "kind": "layer"}, **auth_headers(self.user))
+        self.assertEqual([(i["kind"], i["parent_id"]) for i in res.json()["items"]], [("layer", self.case.id)])
+
+    def test_limit_must_be_positive(self):
+        for limit in ("-5", "0", "abc"):
+            res = self.client.get("/api/search/", {"q": "эктопия", "limit": limit}, **auth_headers(self.user))
+            self.assertEqual(res.status_code, 400, limit)
+        res = self.client.get("/api/search/", {"q": "эктопия", "limit": 1}, **auth_headers(self.user))
+        self.assertEqual(len(res.json()["items"]), 1)
+
+    def test_autocomplete_and_index_follows_deletes(self):
+        res = self.client.get("/api/search/autocomplete/", {"q": "кольпо"}, **auth_headers(self.user))
+        self.assertEqual(res.json()["items"], ["Кольпоскопическое исследование"])
+
+        VideoTutorial.objects.all().delete()
+        res = self.client.get("/api/search/autocomplete/", {"q": "кольпо"}, **auth_headers(self.user))
+        self.assertEqual(res.json()["items"], [])
+
+    def test_migration_backfills_existing_objects(self):
+        migration = importlib.import_module("main.migrations.0009_searchdocument")
+        state = MigrationLoader(connection).project_state(("main", "0009_searchdocument"))
+        SearchDocument.objects.all().delete()
+
+        migration.fill_search_documents(state.apps, None)
+
+        self.assertEqual(
+            sorted(SearchDocument.objects.values_list("kind", flat=True)),
+            ["case", "layer", "pathology", "question", "tutorial"],
+        )
+        res = self.client.get("/api/search/", {"q": "эктопия", "kind": "layer"}, **auth_headers(self.user))
+        self.assertEqual([i["title"] for i in res.json()["items"]], ["Слой 1"])
+
+
+class CaseLayersReorderTests(TestCase):
+    def setUp(self):
+        self.headers = auth_headers(Account.objects.create_superuser(
+            email="admin@test.ru", name="Админ", surname="Админов", password="pass"
+        ))
+        self.pathology = Pathology.objects.create(name="Патология", description="Описание")
+
+    def make_case(self, layers):
+        case = Case.objects.create(pathology=self.pathology, name="Кейс")
+        return case, [
+            Layer.objects.create(case=case, number=i, layer_img=f"case_layers/{i}.png", layer_description=f"Слой {i}")
+            for i in range(1, layers + 1)
+        ]
+
+    def reorder(self, case, ids):
+        return self.client.post(
+            f"/api/cases/reorder-layers/{case.id}/", {"layers": ids}, content_type="application/json", **self.headers
+        )
+
+    def test_swap_keeps_numbers_unique(self):
+        case, (first, second) = self.make_case(2)
+        res = self.reorder(case, [second.id, first.id])
+        self.assertEqual(res.status_code, 200)
+        # На PostgreSQL уникальность (case, number) отложена до коммита — проверяем ее сейчас
+        connection.check_constraints()
+        self.assertEqual(list(case.layers.values_list("id", "number")), [(second.id, 1), (first.id, 2)])
+        self.assertEqual(
+            SearchDocument.objects.get(kind=SearchDocument.Kind.LAYER, object_id=first.id).title, "Слой 2"
+        )
+
+    def test_incomplete_or_foreign_ids_rejected(self):
+        case, layers = self.make_case(3)
+        _, (foreign,) = self.make_case(1)
+        ids = [layer.id for layer in layers]
+        for bad in (ids[:2], ids[:2] + [foreign.id], ids + ids[:1]):
+            self.assertEqual(self.reorder(case, bad).status_code, 400)
+        self.assertEqual(list(case.layers.values_list("id", flat=True)), ids)
+
+    def test_query_count_does_not_grow_with_layers(self):
+        counts = []
+        for size in (3, 10):
+            case, layers = self.make_case(size)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.reorder(case, [layer.id for layer in reversed(layers)]).status_code, 200)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+
+class AdminQueryBudgetTests(TestCase):
+    # Число запросов на страницу списка не должно зависеть от количества строк
+    MAX_QUERIES = 10
+
+    def setUp(self):
+        self.superuser = Account.objects.create_superuser(email="admin@test.ru", name="Админ", surname="Админов",
+                                                          password="pass")
+        self.client.force_login(self.superuser)
+
+    def populate(self, count):
+        benchmark.seed(users=count, pathologies=count, cases_per_pathology=2, layers_per_case=2, questions_per_case=2,
+                       answers_per_question=2, results_per_user=2, log=lambda *args: None)
+        for user in Account.objects.filter(worker_profile__isnull=True, is_superuser=False):
+            WorkerProfile.objects.create(user=user, work="Клиника", position="Врач")
+            RefreshToken.for_user(user).blacklist()
+        for i in range(count):
+            SlowQuery.objects.create(fingerprint=f"{count}-{i}", normalized_sql="SELECT ?", sample_sql="SELECT 1",
+                                     database="default", calls=1, total_time_ms=1, max_time_ms=1)
+
+    def changelist_queries(self):
+        result = {}
+        for model in admin.site._registry:
+            url = reverse(f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist")
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, 200, url)
+            result[model] = len(ctx)
+        return result
+
+    def test_changelists_have_constant_query_count(self):
+        self.populate(2)
+        small = self.changelist_queries()
+        self.populate(6)
+        large = self.changelist_queries()
+
+        for model, queries in large.items():
+            with self.subTest(model=model.__name__):
+                self.assertEqual(queries, small[model])
+                self.assertLessEqual(queries, self.MAX_QUERIES)
+
+
+class JSONCompatibilityTests(TestCase):
+    """FastJSONRenderer/FastJSONParser должны давать те же байты и данные, что стандартные классы DRF."""
+
+    def assertSameRendering(self, make_data):
+        # Данные создаются заново для каждого рендерера: генераторы одноразовые
+        self.assertEqual(FastJSONRenderer().render(make_data()), JSONRenderer().render(make_data()))
+
+    def test_renderer_matches_drf_for_special_values(self):
+        moscow = datetime.timezone(datetime.timedelta(hours=3))
+        self.assertSameRendering(lambda: {
+            "text": "Эктопия \"шейки\"\n\t\x01 \u2028\u2029 😀 </script>",
+            "numbers": [0, -1, 2 ** 63 - 1, 0.5, 1.25, True, None],
+            "aware": datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            "offset": datetime.datetime(2024, 5, 1, 12, 30, tzinfo=moscow),
+            "naive": datetime.datetime(2024, 5, 1, 12, 30),
+            "date": datetime.date(2024, 5, 1),
+            "time": datetime.time(9, 5, 1, 500),
+            "duration": datetime.timedelta(minutes=90, microseconds=5),
+            "decimal": decimal.Decimal("12.50"),
+            "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "lazy": gettext_lazy("Главный администратор"),
+            "role": Account.Role.WORKER,
+            "keys": {1: "int", None: "none", 2.5: "float"},
+            # True == 1: в одном словаре с int-ключом bool-ключ затер бы его
+            "bool_keys": {True: "yes", False: "no"},
+            "nested": ({"tuple": (1, 2)}, []),
+            "generator": (i for i in range(3)),
+            "queryset": Pathology.objects.none(),
+        })
+        # Вне диапазона orjson — работает стандартный рендерер
+        self.assertSameRendering(lambda: {"big": 2 ** 70})
+        for renderer in (FastJSONRenderer(), JSONRenderer()):
+            with self.assertRaises(UnicodeEncodeError):
+                renderer.render({"surrogate": "\ud800"})
+        # orjson записал бы NaN/inf как null — стандартный рендерер их не пропускает
+        for value in (float("nan"), float("inf"), -float("inf")):
+            for make_data in (lambda: {"value": value}, lambda: [{"nested": [value]}], lambda: {value: 1},
+                              lambda: {"items": (i for i in [value])}):
+                for renderer in (FastJSONRenderer(), JSONRenderer()):
+                    with self.assertRaises(ValueError):
+                        renderer.render(make_data())
+        loose = {"strict": False}
+        self.assertEqual(
+            type("LooseFast", (FastJSONRenderer,), loose)().render({"a": [None, float("nan"), float("-inf")]}),
+            type("Loose", (JSONRenderer,), loose)().render({"a": [None, float("nan"), float("-inf")]}),
+        )
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+        self.assertEqual(
+            FastJSONRenderer().render({"a": [1]}, "application/json; indent=2"),
+            JSONRenderer().render({"a": [1]}, "application/json; indent=2"),
+        )
+        # Экспоненциальная запись float отличается только формой
+        floats = [1e-05, 1e16, 123456.789, -0.0]
+        self.assertEqual(json.loads(FastJSONRenderer().render(floats)), json.loads(JSONRenderer().render(floats)))
+
+    def test_parser_matches_drf(self):
+        bodies = [
+            '{"a": [1, 2.5, "Привет", null, true], "b": {"c": "\\u2028"}}',
+            '{"a": 1, "a": 2}',
+            str(2 ** 70),
+            '"\\ud800"',
+            "NaN",
+            "[1, 2",
+            "",
+        ]
+        for body in bodies:
+            results = []
+            for parser in (FastJSONParser(), JSONParser()):
+                try:
+                    results.append(parser.parse(io.BytesIO(body.encode("utf-8", "surrogatepass"))))
+                except ParseError as exc:
+                    results.append(str(exc))
+            self.assertEqual(results[0], results[1], body)
+
+    def test_every_endpoint_renders_identically(self):
+        benchmark.seed(users=1, pathologies=2, cases_per_pathology=2, results_per_user=2, log=lambda *args: None)
+        user = Account.objects.get(email="user0@bench.local")
+        Account.objects.filter(pk=user.pk).update(role=Account.Role.SUPERADMIN)
+        pathology = Pathology.objects.order_by("rank").first()
+        case = Case.objects.filter(pathology=pathology).first()
+        layer = case.layers.first()
+        scheme = case.schemes.first()
+        question = case.questions.first()
+        tutorial = VideoTutorial.objects.create(name="Туториал", description="Описание")
+        attempt = user.test_results.first()
+
+        urls = [
+            "/api/pathologies/", f"/api/pathologies/{pathology.id}/",
+            "/api/case_submit/", f"/api/case_submit/{case.id}/",
+            "/api/questions_submit/", f"/api/questions_submit/{question.id}/",
+            "/api/layers/", f"/api/layers/{layer.id}/",
+            "/api/schemes/", f"/api/schemes/{scheme.id}/",
+            "/api/pathology-images/", f"/api/pathology-images/{pathology.images.first().id}/",
+            "/api/atlas/atlas-list/", "/api/atlas/admin-atlas-list/", "/api/test/test-list/",
+            "/api/clincal-cases/cases/", f"/api/atlas/pathology/{pathology.id}/", "/api/atlas/snapshot/",
+            "/api/search/?q=патология", "/api/search/autocomplete/?q=пат",
+            f"/api/cases/case/{case.id}/", f"/api/test/test-tasks/{pathology.id}/",
+            "/api/account/profile/", "/api/account/try-list/", f"/api/account/attempt/{attempt.id}/",
+            "/api/tutorial/tutorials-list/", f"/api/tutorial/{tutorial.id}/",
+            "/api/monitoring/requests/", "/api/pathologies/999999/",
+        ]
+        for url in urls:
+            res = self.client.get(url, **auth_headers(user))
+            self.assertIn(res.status_code, (200, 404), url)
+            # Ответы из response_cache отрендерены заранее, исходных данных у них нет
+            data = res.data if hasattr(res, "data") else json.loads(res.content)
+            self.assertEqual(res.content, JSONRenderer().render(data), url)
+            self.assertEqual(FastJSONRenderer().render(data), res.content, url)
+
+
+class ResponseCompressionTests(TestCase):
+    def setUp(self):
+        self.user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        for i in range(40):
+            pathology = Pathology.objects.create(name=f"Патология {i}", description="Описание")
+            PathologyImage.objects.create(pathology=pathology, image="pathology_img/test.png")
+
+    def get(self, url, encoding, **extra):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING=encoding, **auth_headers(self.user), **extra)
+
+    def test_cached_catalogue_served_precompressed_and_invalidated(self):
+        plain = self.get("/api/atlas/atlas-list/", "identity")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+
+        res = self.get("/api/atlas/atlas-list/", "gzip, deflate, br")
+        self.assertEqual(res["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(res.content), plain.content)
+        res = self.get("/api/atlas/atlas-list/", "gzip;q=1.0, br;q=0")
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertEqual(self.get("/api/atlas/atlas-list/", "gzip", HTTP_IF_NONE_MATCH=res["ETag"]).status_code, 304)
+
+        Pathology.objects.filter(name="Патология 0").first().images.all().delete()
+        res = self.get("/api/atlas/atlas-list/", "identity")
+        self.assertEqual(len(res.json()["items"]), 39)
+
+    def test_browsable_api_bypasses_cached_json(self):
+        self.get("/api/atlas/atlas-list/", "identity")
+        for extra in ({"data": {"format": "api"}}, {"HTTP_ACCEPT": "text/html"}):
+            res = self.get("/api/atlas/atlas-list/", "identity", **extra)
+            self.assertEqual(res.status_code, 200)
+            self.assertTrue(res["Content-Type"].startswith("text/html"))
+            self.assertContains(res, "Патология 0")
+        self.assertTrue(self.get("/api/atlas/atlas-list/", "identity")["Content-Type"].startswith("application/json"))
+
+    def test_entries_expire_quickly_without_listener(self):
+        def names():
+            return {item["name"] for item in self.get("/api/atlas/atlas-list/", "identity").json()["items"]}
+
+        def rename_and_wait(old, new):
+            self.assertIn(old, names())
+            # update() без сигналов — как изменение в другом воркере, сброс от которого не пришел
+            Pathology.objects.filter(name=old).update(name=new)
+            self.assertIn(old, names())
+            with mock.patch("time.time", return_value=time.time() + settings.LOCAL_CACHE_TTL + 1):
+                return names()
+
+        self.assertIn("Эктопия", rename_and_wait("Патология 0", "Эктопия"))
+        response_cache.invalidate_local()
+        with mock.patch.object(local_cache.local_cache, "listening", True):
+            self.assertIn("Эктопия", rename_and_wait("Эктопия", "Цервицит"))
+
+    def test_dynamic_responses_compressed_except_auth(self):
+        res = self.client.post(
+            "/api/auth/login/", {"email": "worker@test.ru", "password": "pass"}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertFalse(res.has_header("Content-Encoding"))
+
+        res = self.get("/api/pathologies/", "gzip")
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", res["Vary"])
+        self.assertEqual(len(json.loads(gzip.decompress(res.content))), 40)
+
+
+@override_settings(ATLAS_SYNC_LAG=0)
+class AtlasSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        self.pathology = Pathology.objects.create(name="Патология", description="Описание")
+        PathologyImage.objects.create(pathology=self.pathology, image="pathology_img/test.png")
+        self.case = Case.objects.create(pathology=self.pathology, name="Кейс")
+        self.layer = Layer.objects.create(case=self.case, number=1, layer_img="case_layers/1.png")
+
+    def snapshot(self, since=None):
+        url = "/api/atlas/snapshot/" if since is None else f"/api/atlas/snapshot/?since={since}"
+        return self.client.get(url, **auth_headers(self.user))
+
+    def test_full_snapshot_and_delta(self):
+        full = self.snapshot().json()
+        self.assertTrue(full["full"])
+        self.assertEqual([p["name"] for p in full["pathologies"]], ["Патология"])
+        self.assertEqual(full["layers"][0]["image"], "http://testserver/media/case_layers/1.png")
+        self.assertEqual(set(full["layers"][0]) & {"image_width", "image_height", "image_size"},
+                         {"image_width", "image_height", "image_size"})
+        self.assertNotIn("questions", full)
+
+        delta = self.snapshot(full["version"]).json()
+        self.assertFalse(delta["full"])
+        self.assertEqual(delta["cases"], [])
+
+        Layer.objects.create(case=self.case, number=2, layer_img="case_layers/2.png")
+        layer_id = self.layer.id
+        self.layer.delete()
+        self.pathology.description = "Новое описание"
+        self.pathology.save()
+
+        delta = self.snapshot(full["version"]).json()
+        self.assertEqual([l["number"] for l in delta["layers"]], [2])
+        self.assertEqual(delta["deleted"]["layers"], [layer_id])
+        self.assertEqual(delta["pathologies"][0]["description"], "Новое описание")
+        self.assertEqual(delta["cases"], [])
+
+        self.assertEqual(self.snapshot("abc").status_code, 400)
+        self.assertTrue(self.snapshot(10 ** 9).json()["full"])
+
+
+class LocalCacheTests(TestCase):
+    def setUp(self):
+        # Выданный пользователю набор кейсов хранится в кэше Django, id в тестах повторяются
+        cache.clear()
+        self.user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        self.pathology = Pathology.objects.create(name="Патология", description="Описание")
+        self.cases = [Case.objects.create(pathology=self.pathology, name=f"Кейс {i}") for i in range(6)]
+
+    def test_test_tasks_use_cached_case_ids_and_see_changes(self):
+        local_cache.case_ids_by_pathology()
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(f"/api/test/test-tasks/{self.pathology.id}/", **auth_headers(self.user))
+        self.assertEqual(len(res.json()["items"]), 4)
+        self.assertFalse(any("main_case" in q["sql"] and "RANDOM" in q["sql"].upper() for q in ctx.captured_queries))
+
+        Case.objects.filter(pk__in=[case.pk for case in self.cases[1:]]).delete()
+        self.assertEqual(local_cache.case_ids_by_pathology(), {self.pathology.id: [self.cases[0].pk]})
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def run_threads(self, count, target):
+        barrier = threading.Barrier(count)
+        results = [None] * count
+
+        def worker(i):
+            barrier.wait()
+            results[i] = target()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_misses_build_once(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        results = self.run_threads(20, lambda: singleflight.get_or_build("sf:test", build, timeout=60))
+        self.assertEqual(results, ["value"] * 20)
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_value_served_while_one_rebuilds(self):
+        cache.set("sf:test", ("old", time.time() - 1, 0.0), 60)
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.3)
+            return "new"
+
+        results = self.run_threads(10, lambda: singleflight.get_or_build("sf:test", build, timeout=60))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), ["new"] + ["old"] * 9)
+        self.assertEqual(cache.get("sf:test")[0], "new")
+
+    def test_early_recompute_before_expiry(self):
+        # Сборка дольше оставшегося срока — пересборка почти наверняка досрочная
+        cache.set("sf:slow", ("old", time.time() + 1, 1000.0), 60)
+        self.assertEqual(singleflight.get_or_build("sf:slow", lambda: "new", timeout=60), "new")
+        cache.set("sf:fast", ("old", time.time() + 60, 0.0), 60)
+        self.assertEqual(singleflight.get_or_build("sf:fast", lambda: "new", timeout=60), "old")
+
+
+# Реплика — второе соединение с той же тестовой базой. Данные должны быть закоммичены,
+# иначе другое соединение их не увидит, поэтому TransactionTestCase
+class ReplicaRoutingTests(TransactionTestCase):
+    def setUp(self):
+        # connections.settings — тот же словарь, что settings.DATABASES
+        connections.settings[db_router.REPLICA] = {**connections[DEFAULT_DB_ALIAS].settings_dict}
+        self.addCleanup(self.remove_replica)
+        user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        self.headers = auth_headers(user)
+        pathology = Pathology.objects.create(name="П", description="О")
+        self.case = Case.objects.create(pathology=pathology, name="Кейс")
+
+    def remove_replica(self):
+        connections[db_router.REPLICA].close()
+        del connections[db_router.REPLICA]
+        del connections.settings[db_router.REPLICA]
+
+    def request(self, method, url, **kwargs):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[db_router.REPLICA]) as replica:
+            res = getattr(self.client, method)(url, **kwargs, **self.headers)
+        return res, len(primary), len(replica)
+
+    def test_reads_use_replica_until_client_writes(self):
+        res, primary, replica = self.request("get", "/api/account/try-list/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        res, primary, replica = self.request(
+            "post", "/api/test/submit/", data={"items": [{"caseId": self.case.id, "answers": []}], "duration": 3},
+            content_type="application/json",
+        )
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(replica, 0)
+        self.assertEqual(res.cookies[db_router.STICKY_COOKIE]["max-age"], settings.DB_REPLICA_STICKY_SECONDS)
+
+        # Кука db_primary сохранилась в клиенте: сразу после записи чтение идет с default
+        res, primary, replica = self.request("get", "/api/account/try-list/")
+        self.assertEqual(len(res.json()["items"]), 1)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_new_connections_counted_per_request(self):
+        # Без CaptureQueriesContext: он сам открывает соединение до запроса
+        instrumentation.registry.reset()
+        opened = []
+        for _ in range(2):
+            res = self.client.get("/api/account/try-list/", **self.headers)
+            self.assertEqual(res.status_code, 200)
+            opened.append(re.search(r'queries, (\d+) new conn"', res["Server-Timing"]).group(1))
+
+        # Соединение с репликой открыл первый запрос, второй его переиспользовал
+        self.assertIsNotNone(connections[db_router.REPLICA].connection)
+        self.assertEqual(opened, ["1", "0"])
+        stats = instrumentation.registry.snapshot()["profile-history"]
+        self.assertEqual((stats["total_requests"], stats["db_connections_opened"]), (2, 1))
+
+    def test_async_chain_is_not_adapted(self):
+        # Синхронный middleware в цепочке ASGI Django оборачивает в async_to_sync (пишет в лог при DEBUG)
+        with override_settings(DEBUG=True), self.assertNoLogs("django.request", "DEBUG"):
+            ASGIHandler()
+
+
+class TestHistoryWindowTests(TestCase):
+    def setUp(self):
+        self.user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        self.pathology = Pathology.objects.create(name="Патология", description="Описание")
+
+    def test_old_attempts_hidden_unless_all(self):
+        case = Case.objects.create(pathology=self.pathology, name="Кейс")
+        question = Question.objects.create(case=case, name="Вопрос", instruction="Выберите вариант")
+        answer = question.answers.create(text="Ответ", is_correct=True)
+        answers = [{"questionId": question.id, "selectedAnswers": [answer.id]}]
+        res = self.client.post(
+            "/api/test/submit/", {"items": [{"caseId": case.id, "answers": answers}], "duration": 3},
+            content_type="application/json", **auth_headers(self.user)
+        )
+        self.assertEqual(res.status_code, 201, res.content)
+        result = TestResult.objects.get(pk=res.json()["id"])
+        # Ответы упакованы в строку попытки, отдельных строк нет
+        self.assertEqual((result.case_ids, result.selected_answer_ids), ([case.id], {answer.id}))
+        self.assertFalse(UserTestAnswer.objects.exists())
+        detail = self.client.get(f"/api/account/attempt/{result.id}/", **auth_headers(self.user)).json()["items"]
+        self.assertEqual(len(detail), 1)
+
+        old = TestResult.objects.create(user=self.user, pathology=self.pathology, score=0, max_score=0, grade="Плохо")
+        TestResult.objects.filter(pk=old.pk).update(created_at=partitions.history_cutoff() - datetime.timedelta(days=1))
+        items = self.client.get("/api/account/try-list/", **auth_headers(self.user)).json()["items"]
+        self.assertEqual(len(items), 1)
+        items = self.client.get("/api/account/try-list/?all=1", **auth_headers(self.user)).json()["items"]
+        self.assertEqual(len(items), 2)
+
+
+class PartitionMonthTests(SimpleTestCase):
+    def test_month_arithmetic(self):
+        utc = datetime.timezone.utc
+        month = datetime.datetime(2024, 11, 1, tzinfo=utc)
+        self.assertEqual(partitions.add_months(month, 2), datetime.datetime(2025, 1, 1, tzinfo=utc))
+        self.assertEqual(partitions.add_months(month, -11), datetime.datetime(2023, 12, 1, tzinfo=utc))
+        self.assertEqual(partitions.add_months(month, -23), datetime.datetime(2022, 12, 1, tzinfo=utc))
+
+        # Секции режутся по UTC: 00:30 1 марта по Москве — еще февраль
+        moscow = datetime.timezone(datetime.timedelta(hours=3))
+        self.assertEqual(partitions.month_start(datetime.datetime(2024, 3, 1, 0, 30, tzinfo=moscow)),
+                         datetime.datetime(2024, 2, 1, tzinfo=utc))
+        self.assertEqual(partitions.month_start(datetime.datetime(2024, 3, 31, 23, 59)),
+                         datetime.datetime(2024, 3, 1, tzinfo=utc))
+
+        table = "main_testresult"
+        name = partitions.partition_name(table, month)
+        self.assertEqual(name, "main_testresult_p2024_11")
+        self.assertEqual(partitions.month_of_partition(table, name), month)
+        self.assertIsNone(partitions.month_of_partition(table, "main_testresult_default"))
+
+        with mock.patch("django.utils.timezone.now", return_value=datetime.datetime(2024, 2, 15, 10, tzinfo=utc)):
+            self.assertEqual(partitions.history_cutoff(3), datetime.datetime(2023, 11, 1, tzinfo=utc))
+            with override_settings(TEST_HISTORY_MONTHS=0):
+                self.assertEqual(partitions.history_cutoff(), datetime.datetime(2024, 2, 1, tzinfo=utc))
+
+    def test_export_streams_copy_blocks_with_psycopg3(self):
+        cursor = mock.MagicMock(spec=["copy", "rowcount"], rowcount=2)
+        cursor.copy.return_value.__enter__.return_value = iter([b"id,user_id\n", b"1,5\n2,6\n"])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "main_testresult.csv.gz")
+
+        with mock.patch("django.db.backends.postgresql.psycopg_any.is_psycopg3", True):
+            self.assertEqual(partitions._export(cursor, 'SELECT * FROM "t"', path), 2)
+
+        cursor.copy.assert_called_once_with('COPY (SELECT * FROM "t") TO STDOUT WITH (FORMAT csv, HEADER)')
+        with gzip.open(path, "rb") as f:
+            self.assertEqual(f.read(), b"id,user_id\n1,5\n2,6\n")
+        self.assertEqual(os.listdir(directory.name), ["main_testresult.csv.gz"])
+
+
+class EstimatedCountTests(TestCase):
+    def test_partitioned_table_sums_partitions(self):
+        if not partitions.is_supported():
+            self.skipTest("Секционирование и статистика pg_class — только PostgreSQL")
+        user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        pathology = Pathology.objects.create(name="Патология", description="Описание")
+        for _ in range(5):
+            TestResult.objects.create(user=user, pathology=pathology, score=0, max_score=0, grade="Плохо")
+        # Autovacuum анализирует только секции, у родителя reltuples остается -1
+        table = TestResult._meta.db_table
+        with connection.cursor() as cursor:
+            months = partitions.partitions(cursor, table)
+            for name in [partitions.partition_name(table, month) for month in months] + [f"{table}_default"]:
+                cursor.execute(f'ANALYZE "{name}"')
+
+        paginator = EstimatedCountPaginator(TestResult.objects.order_by("-id"), 10)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(paginator.count, 5)
+        # Только запрос к pg_class, без COUNT(*)
+        self.assertEqual(len(ctx), 1)
+        self.assertIn("reltuples", ctx.captured_queries[0]["sql"])
+
+
+# Потоки прогрева читают базу своими соединениями и видят только закоммиченные данные
+class CacheWarmingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        pathology = Pathology.objects.create(name="Патология", description="Описание")
+        self.cases = [Case.objects.create(pathology=pathology, name=f"Кейс {i}") for i in range(3)]
+
+    def test_warmed_case_detail_served_without_queries(self):
+        stats = cache_warming.warm(host="testserver", scheme="http", workers=2, log=lambda *args: None)
+        self.assertEqual((stats["case-detail"]["count"], stats["case-detail"]["errors"]), (3, 0))
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(f"/api/cases/case/{self.cases[0].id}/", **auth_headers(self.user))
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(any("main_layer" in q["sql"] for q in ctx.captured_queries))
+
+
+def async_urlconf():
+    """Colposcopy.urls, собранный с ASYNC_READ_VIEWS = True (как под uvicorn)."""
+    with override_settings(ASYNC_READ_VIEWS=True):
+        spec = importlib.util.find_spec("Colposcopy.urls")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+class AsyncReadViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.urlconf = async_urlconf()
+
+    def setUp(self):
+        cache.clear()
+        self.user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        self.pathology = Pathology.objects.create(name="Патология", description="Описание")
+        # Выпуск токена пишет в базу — заранее, не из async-теста. AsyncClient в Django 4.2
+        # берет заголовки только из headers=, не из HTTP_* аргументов
+        self.headers = {"Authorization": auth_headers(self.user)["HTTP_AUTHORIZATION"]}
+
+    async def test_auth_and_permissions_match_sync_views(self):
+        view = resolve(f"/api/atlas/pathology/{self.pathology.id}/", urlconf=self.urlconf).func
+        self.assertEqual(view.cls.__module__, "main.async_views")
+        with override_settings(ROOT_URLCONF=self.urlconf):
+            res = await self.async_client.get(f"/api/atlas/pathology/{self.pathology.id}/", headers=self.headers)
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.json()["description"], "Описание")
+            res = await self.async_client.get(f"/api/atlas/pathology/{self.pathology.id}/")
+            self.assertEqual(res.status_code, 401)
+            res = await self.async_client.get("/api/atlas/pathology/999999/", headers=self.headers)
+            self.assertEqual(res.status_code, 404)
+
+    async def test_cache_hit_served_without_thread(self):
+        with override_settings(ROOT_URLCONF=self.urlconf):
+            first = await self.async_client.get("/api/atlas/atlas-list/", headers=self.headers)
+            with mock.patch.object(response_cache, "cached_response", side_effect=AssertionError):
+                second = await self.async_client.get("/api/atlas/atlas-list/", headers=self.headers)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+
+    async def test_history_all_uses_async_orm(self):
+        old = await TestResult.objects.acreate(user=self.user, pathology=self.pathology, grade="Плохо")
+        await TestResult.objects.filter(pk=old.pk).aupdate(
+            created_at=partitions.history_cutoff() - datetime.timedelta(days=1)
+        )
+        with override_settings(ROOT_URLCONF=self.urlconf):
+            res = await self.async_client.get("/api/account/try-list/", headers=self.headers)
+            self.assertEqual((res.status_code, res.json()["items"]), (200, []))
+            res = await self.async_client.get("/api/account/try-list/?all=1", headers=self.headers)
+            self.assertEqual(len(res.json()["items"]), 1)
+            res = await self.async_client.get("/api/account/try-list/?all=1")
+            self.assertEqual(res.status_code, 401)
+
+
+class PathologyAdminOrderingTests(TestCase):
+    def setUp(self):
+        self.client.force_login(Account.objects.create_superuser(
+            email="admin@test.ru", name="Админ", surname="Админов", password="pass"
+        ))
+        self.pathologies = [Pathology.objects.create(name=f"П{i}", description="О") for i in range(3)]
+
+    def change(self, pathology, **data):
+        url = reverse("admin:main_pathology_change", args=[pathology.pk])
+        return self.client.post(url, {
+            "name": pathology.name, "description": pathology.description,
+            "images-TOTAL_FORMS": 0, "images-INITIAL_FORMS": 0, **data,
+        })
+
+    def order(self):
+        return list(Pathology.objects.values_list("name", flat=True))
+
+    def test_position_moves_and_number_is_read_only(self):
+        last = self.pathologies[2]
+        self.assertEqual(self.change(last, number=5).status_code, 302)
+        self.assertEqual(self.order(), ["П0", "П1", "П2"])
+        self.assertEqual(self.change(last, position=1).status_code, 302)
+        self.assertEqual(self.order(), ["П2", "П0", "П1"])
+
+    def test_bulk_delete_schedules_compaction(self):
+        url = reverse("admin:main_pathology_changelist")
+        with mock.patch("main.admin.pathology_ordering.deleted") as deleted:
+            self.client.post(url, {
+                "action": "delete_selected", "post": "yes",
+                "_selected_action": [self.pathologies[0].pk, self.pathologies[1].pk],
+            })
+        self.assertEqual(self.order(), ["П2"])
+        deleted.assert_called_once()
+
+
+class AdminImageUploadTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name, IMAGE_MAX_DIMENSION=20)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(Account.objects.create_superuser(
+            email="admin@test.ru", name="Админ", surname="Админов", password="pass"
+        ))
+
+    def test_admin_upload_is_processed(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (80, 40), "red").save(buffer, "PNG")
+        pathology = Pathology.objects.create(name="Патология", description="Описание")
+        res = self.client.post(reverse("admin:main_pathologyimage_add"), {
+            "pathology": pathology.pk, "image": SimpleUploadedFile("big.png", buffer.getvalue(), "image/png"),
+        })
+        self.assertEqual(res.status_code, 302)
+        image = PathologyImage.objects.get()
+        self.assertEqual((image.image_width, image.image_height), (20, 10))
+        self.assertEqual(image.image_size, image.image.size)
+
+
+class TestResultAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(Account.objects.create_superuser(
+            email="admin@test.ru", name="Админ", surname="Админов", password="pass"
+        ))
+        self.user = Account.objects.create_worker(email="worker@test.ru", name="Иван", surname="Иванов", password="pass")
+        self.pathology = Pathology.objects.create(name="Патология", description="Описание")
+        case = Case.objects.create(pathology=self.pathology, name="Кейс")
+        self.question = Question.objects.create(case=case, name="Вопрос", instruction="Выберите вариант")
+        self.answer = self.question.answers.create(text="Ответ", is_correct=True)
+
+    def change_view(self, result):
+        return self.client.get(reverse("admin:main_testresult_change", args=[result.pk]))
+
+    def test_legacy_attempt_shows_answer_rows(self):
+        result = TestResult.objects.create(user=self.user, pathology=self.pathology, score=1, max_score=1,
+                                           grade="Отлично")
+        UserTestAnswer.objects.create(test_result=result, question=self.question, answer=self.answer)
+        res = self.change_view(result)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.context["inline_admin_formsets"]), 1)
+        self.assertNotContains(res, "Выбранные ответы")
+
+    def test_packed_attempt_shows_selected_answers(self):
+        result = TestResult.objects.create(user=self.user, pathology=self.pathology, score=1, max_score=1,
+                                           grade="Отлично", answer_ids_packed=pack_ids([self.answer.id]))
+        res = self.change_view(result)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.context["inline_admin_formsets"], [])
+        self.assertContains(res, "Выбранные ответы")
+        self.assertContains(res, "Ответ ✓")
+
+
+class AdminAccountSearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(Account.objects.create_superuser(
+            email="admin@test.ru", name="Админ", surname="Админов", password="pass"
+        ))
+        pathology = Pathology.objects.create(name="Патология", description="Описание")
+        self.results = {}
+        for email, name, surname, work in (("ivanov@clinic.ru", "Иван", "Иванов", "Клиника"),
+                                           ("petrov@hospital.ru", "Петр", "Петров", "Больница")):
+            user = Account.objects.create_worker(email=email, name=name, surname=surname, password="pass",
+                                                 work=work, position="Врач")
+            self.results[surname] = {
+                TestResult.objects.create(user=user, pathology=pathology, grade="Отлично").pk for _ in range(2)
+            }
+
+    def search(self, model, term):
+        # Кириллица — в исходном регистре: LIKE в SQLite без учета регистра только для ASCII
+        res = self.client.get(reverse(f"admin:main_{model}_changelist"), {"q": term})
+        self.assertEqual(res.status_code, 200)
+        return [obj.pk for obj in res.context["cl"].result_list]
+
+    def test_results_found_by_account_fields_without_duplicates(self):
+        for term, surname in (("ivanov@clinic", "Иванов"), ("Петров", "Петров"), ("Петр HOSPITAL", "Петров")):
+            found = self.search("testresult", term)
+            self.assertEqual(len(found), len(set(found)), term)
+            self.assertEqual(set(found), self.results[surname], term)
+        self.assertEqual(self.search("testresult", "Иванов Больница"), [])
+
+    def test_profiles_found_by_account_and_own_fields(self):
+        profiles = dict(WorkerProfile.objects.values_list("user__surname", "pk"))
+        self.assertEqual(self.search("workerprofile", "ivanov@"), [profiles["Иванов"]])
+        self.assertEqual(self.search("workerprofile", "Больница Петров"), [profiles["Петров"]])
+        self.assertEqual(sorted(self.search("workerprofile", "Врач")), sorted(profiles.values()))
+
+
+class AtlasBundleTests(TestCase):
+    def test_interrupted_import_resumes_without_duplicates(self):
+        pathology = Pathology.objects.create(name="Эктопия", description="Описание")
+        cases = [Case.objects.create(pathology=pathology, name=f"Кейс {i}") for i in range(5)]
+        for case in cases:
+            Question.objects.create(case=case, name="Вопрос", instruction="Выберите вариант")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "atlas.zip")
+        atlas_bundle.export_bundle(path, [pathology.pk])
+        create = atlas_bundle.AtlasImportRecord.objects.bulk_create
+        calls = []
+
+        def failing_create(*args, **kwargs):
+            # Сбой на третьей пачке (вторая пачка кейсов): она откатывается вместе с соответствиями
+            calls.append(1)
+            if len(calls) == 3:
+                raise RuntimeError("сбой")
+            return create(*args, **kwargs)
+
+        with mock.patch.object(atlas_bundle.AtlasImportRecord.objects, "bulk_create", failing_create):
+            with self.assertRaises(RuntimeError):
+                atlas_bundle.import_bundle(path, batch_size=2, log=lambda *args: None)
+        self.assertEqual(Case.objects.count(), 5 + 2)
+
+        created = atlas_bundle.import_bundle(path, batch_size=2, log=lambda *args: None)
+        self.assertEqual((created["case"], created["question"]), (5, 5))
+        self.assertEqual((Pathology.objects.count(), Case.objects.count(), Question.objects.count()), (2, 10, 10))
+        imported = Pathology.objects.exclude(pk=pathology.pk).get()
+        self.assertEqual(Question.objects.filter(case__pathology=imported).count(), 5)
+        self.assertFalse(atlas_bundle.AtlasImportRecord.objects.exists())
+
+
+class MediaGCTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media = os.path.join(directory.name, "media")
+        self.quarantine = os.path.join(directory.name, "quarantine")
+        settings_override = override_settings(MEDIA_ROOT=self.media, MEDIA_QUARANTINE_DIR=self.quarantine)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.old = time.time() - 2 * 24 * 3600
+        self.write("pathology_img/used.png", self.old)
+        self.write("pathology_img/orphan.png", self.old)
+        self.write("case_layers/fresh.png")
+        pathology = Pathology.objects.create(name="Патология", description="Описание")
+        PathologyImage.objects.create(pathology=pathology, image="pathology_img/used.png")
+
+    def write(self, path, mtime=None):
+        full = os.path.join(self.media, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "wb") as f:
+            f.write(b"x")
+        if mtime is not None:
+            os.utime(full, (mtime, mtime))
+
+    def files(self, root):
+        return sorted(path for path, _ in media_gc.walk(root)) if os.path.isdir(root) else []
+
+    def collect(self, **kwargs):
+        return media_gc.collect(log=lambda *args: None, **kwargs)
+
+    def test_dry_run_deletes_nothing(self):
+        stats = self.collect(dry_run=True)
+        self.assertEqual((stats["orphaned"], stats["removed"]), (1, 0))
+        self.assertEqual(len(self.files(self.media)), 3)
+
+    def test_only_old_orphans_removed(self):
+        stats = self.collect()
+        self.assertEqual((stats["scanned"], stats["removed"]), (3, 1))
+        self.assertEqual(self.files(self.media), ["case_layers/fresh.png", "pathology_img/used.png"])
+
+    def test_quarantine_keeps_relative_path(self):
+        self.collect(quarantine=True)
+        self.assertEqual(self.files(self.quarantine), ["pathology_img/orphan.png"])
+        self.assertNotIn("pathology_img/orphan.png", self.files(self.media))
+
+    def test_file_reused_by_import_survives_grace(self):
+        sha256 = hashlib.sha256(b"x").hexdigest()
+        self.write(f"pathology_img/{sha256[:32]}.png", self.old)
+        field = PathologyImage._meta.get_field("image")
+        name = atlas_bundle._store_media(None, {"name": "pathology_img/a.png", "sha256": sha256}, field)
+
+        # Строка импорта еще не закоммичена — файл держит только свежий mtime
+        self.assertEqual(self.collect()["removed"], 1)
+        self.assertIn(name, self.files(self.media))
+
+
+class TutorialUploadTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            TUTORIAL_UPLOAD_DIR=os.path.join(directory.name, "uploads"), MEDIA_ROOT=os.path.join(directory.name, "media"),
+            TUTORIAL_UPLOAD_CHUNK_SIZE=4,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        admin_user = Account.objects.create_superuser(email="admin@test.ru", name="Админ", surname="Админов",
+                                                      password="pass")
+        self.headers = auth_headers(admin_user)
+        self.content = b"0123456789"
+
+    def start(self, sha256=None):
+        data = {"filename": "video.mp4", "size": len(self.content), "name": "Видео", "description": "Описание",
+                "sha256": sha256 or hashlib.sha256(self.content).hexdigest()}
+        res = self.client.post("/api/tutorial/uploads/", data, content_type="application/json", **self.headers)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((res.json()["total_chunks"], res.json()["next_chunk"]), (3, 0))
+        return res.json()["upload_id"]
+
+    def put(self, upload_id, index, body=None, **headers):
+        body = self.content[index * 4:index * 4 + 4] if body is None else body
+        return self.client.put(f"/api/tutorial/uploads/{upload_id}/chunks/{index}/", body,
+                               content_type="application/octet-stream", **headers, **self.headers)
+
+    def finalize(self, upload_id):
+        return self.client.post(f"/api/tutorial/uploads/{upload_id}/finalize/", **self.headers)
+
+    def test_chunks_in_order_with_retries_and_checksums(self):
+        upload_id = self.start()
+        self.assertEqual(self.put(upload_id, 0, b"").status_code, 400)
+
+        res = self.put(upload_id, 1)
+        self.assertEqual((res.status_code, res.json()["next_chunk"]), (409, 0))
+        self.assertEqual(self.put(upload_id, 0).json()["next_chunk"], 1)
+        # Ответ на часть потерялся — клиент повторяет ее
+        self.assertEqual(self.put(upload_id, 0).json()["next_chunk"], 1)
+        self.assertEqual(self.put(upload_id, 0, b"xxxx").status_code, 409)
+
+        res = self.put(upload_id, 1, HTTP_X_CHUNK_SHA256=hashlib.sha256(b"other").hexdigest())
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.put(upload_id, 1).json()["next_chunk"], 2)
+        self.assertEqual(self.finalize(upload_id).status_code, 409)
+        self.assertEqual(self.put(upload_id, 2).json()["next_chunk"], 3)
+
+        res = self.finalize(upload_id)
+        self.assertEqual(res.status_code, 201)
+        tutorial = VideoTutorial.objects.get(pk=res.json()["id"])
+        with tutorial.video.open("rb") as f:
+            self.assertEqual(f.read(), self.content)
+        # Повторное завершение возвращает тот же туториал
+        self.assertEqual(self.finalize(upload_id).json()["id"], tutorial.pk)
+        self.assertEqual(VideoTutorial.objects.count(), 1)
+
+    def test_whole_file_checksum_mismatch_rejects_upload(self):
+        upload_id = self.start(sha256=hashlib.sha256(b"other").hexdigest())
+        for index in range(3):
+            self.assertEqual(self.put(upload_id, index).status_code, 200)
+        self.assertEqual(self.finalize(upload_id).status_code, 422)
+        self.assertEqual(self.finalize(upload_id).status_code, 409)
+        self.assertFalse(VideoTutorial.objects.exists())
+
+    def test_chunk_body_read_outside_transaction(self):
+        upload_id = self.start()
+        outer = len(connection.atomic_blocks)
+        depths = []
+
+        class Body(io.BytesIO):
+            def read(self, size=-1):
+                depths.append(len(connection.atomic_blocks))
+                return super().read(size)
+
+        upload = uploads.write_chunk(upload_id, 0, Body(self.content[:4]))
+        self.assertEqual(upload.received_chunks, 1)
+        self.assertEqual(set(depths), {outer})
+        with self.assertRaises(uploads.UploadError):
+            uploads.write_chunk(upload_id, 1, Body(b"45"))
+        # Временные файлы частей удалены, в staging только принятая часть
+        self.assertEqual(os.listdir(settings.TUTORIAL_UPLOAD_DIR), [f"{upload_id}.part"])
+        with open(os.path.join(settings.TUTORIAL_UPLOAD_DIR, f"{upload_id}.part"), "rb") as f:
+            self.assertEqual(f.read(), self.content[:4])
@@ -0,0 +1,207 @@
+# uploads.py
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from .models import TutorialUpload, VideoTutorial
+
+
+# Загрузка больших видео туториалов по частям:
+#   1. init     — создается TutorialUpload, клиент получает upload_id и размер части
+#   2. PUT i    — часть читается во временный файл без блокировок, затем под блокировкой
+#                 строки дописывается строго по порядку в <TUTORIAL_UPLOAD_DIR>/<upload_id>.part,
+#                 для каждой сохраняется sha256; после обрыва клиент спрашивает next_chunk
+#                 и продолжает с него
+#   3. finalize — файл целиком переносится в хранилище, и только тогда создается
+#                 или обновляется VideoTutorial
+# Ни одна часть не держится в памяти целиком и не проходит через multipart-парсер.
+
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def staging_path(upload):
+    return os.path.join(settings.TUTORIAL_UPLOAD_DIR, f"{upload.pk}.part")
+
+
+def start_upload(user, filename, total_size, name="", description="", sha256="", tutorial=None):
+    if total_size > settings.TUTORIAL_UPLOAD_MAX_SIZE:
+        raise UploadError(f"Файл больше {settings.TUTORIAL_UPLOAD_MAX_SIZE} байт")
+    os.makedirs(settings.TUTORIAL_UPLOAD_DIR, exist_ok=True)
+    upload = TutorialUpload.objects.create(
+        user=user,
+        tutorial=tutorial,
+        name=name,
+        description=description,
+        filename=os.path.basename(filename),
+        total_size=total_size,
+        chunk_size=settings.TUTORIAL_UPLOAD_CHUNK_SIZE,
+        sha256=sha256.lower(),
+    )
+    # Пустой файл сразу: дальше части только дописываются
+    open(staging_path(upload), "wb").close()
+    return upload
+
+
+def _locked(upload_id):
+    try:
+        return TutorialUpload.objects.select_for_update().get(pk=upload_id)
+    except TutorialUpload.DoesNotExist:
+        raise UploadError("Загрузка не найдена", status=404)
+
+
+def _hash_stream(stream, limit):
+    """sha256 и длина не более limit + 1 байт из потока (лишний байт означает, что часть длиннее)."""
+    digest = hashlib.sha256()
+    size = 0
+    while size <= limit:
+        data = stream.read(min(COPY_CHUNK_SIZE, limit + 1 - size))
+        if not data:
+            break
+        digest.update(data)
+        size += len(data)
+    return digest.hexdigest(), size
+
+
+def _check_index(upload, index):
+    if upload.status != TutorialUpload.Status.UPLOADING:
+        raise UploadError("Загрузка уже завершена", status=409)
+    if not 0 <= index < upload.total_chunks:
+        raise UploadError(f"Номер части должен быть от 0 до {upload.total_chunks - 1}")
+    if index > upload.received_chunks:
+        raise UploadError("Части принимаются по порядку", status=409, next_chunk=upload.received_chunks)
+
+
+def _check_accepted(upload, index, digest):
+    if digest != upload.chunk_hashes[index]:
+        raise UploadError("Часть уже принята с другим содержимым", status=409, next_chunk=upload.received_chunks)
+
+
+def _receive(upload, index, stream):
+    """
+    Тело части — во временный файл рядом со staging. Файл оборванного запроса удалит
+    media_gc.clean_stale_uploads. Возвращает путь, sha256 и длину (не более размера части + 1 байт).
+    """
+    # Все части, кроме последней, полного размера
+    limit = min(upload.chunk_size, upload.total_size - index * upload.chunk_size)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=settings.TUTORIAL_UPLOAD_DIR, prefix=f"{upload.pk}.{index}.",
+                                     suffix=".tmp", delete=False) as f:
+        try:
+            while size <= limit:
+                data = stream.read(min(COPY_CHUNK_SIZE, limit + 1 - size))
+                if not data:
+                    break
+                digest.update(data)
+                size += len(data)
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            os.remove(f.name)
+            raise
+    return f.name, digest.hexdigest(), size
+
+
+def write_chunk(upload_id, index, stream, sha256=None):
+    """
+    Дописывает часть index. Уже принятая часть с тем же содержимым подтверждается повторно
+    (клиент мог не получить ответ), часть не по порядку отклоняется с указанием next_chunk.
+    """
+    # Тело читается без транзакции и блокировки: клиент может передавать часть долго
+    try:
+        upload = TutorialUpload.objects.get(pk=upload_id)
+    except TutorialUpload.DoesNotExist:
+        raise UploadError("Загрузка не найдена", status=404)
+    _check_index(upload, index)
+    if index < upload.received_chunks:
+        # Хэши принятых частей не меняются
+        digest, _ = _hash_stream(stream, upload.chunk_size)
+        _check_accepted(upload, index, digest)
+        return upload
+
+    path, digest, size = _receive(upload, index, stream)
+    try:
+        expected = min(upload.chunk_size, upload.total_size - upload.received_bytes)
+        if size != expected:
+            raise UploadError(f"Ожидалось {expected} байт, получено {size}")
+        if sha256 and digest != sha256.lower():
+            raise UploadError("Контрольная сумма части не совпала")
+
+        with transaction.atomic():
+            # Блокировка строки сериализует параллельные PUT одной загрузки: под ней только
+            # проверка номера и дописывание готовой части с локального диска
+            upload = _locked(upload_id)
+            _check_index(upload, index)
+            if index < upload.received_chunks:
+                # Параллельный повтор той же части успел раньше
+                _check_accepted(upload, index, digest)
+                return upload
+
+            with open(staging_path(upload), "r+b") as f, open(path, "rb") as part:
+                # Отрезаем хвост недописанной части, если прошлый запрос оборвался на середине
+                f.truncate(upload.received_bytes)
+                f.seek(upload.received_bytes)
+                shutil.copyfileobj(part, f, COPY_CHUNK_SIZE)
+                # Часть подтверждается клиенту только после того, как она на диске
+                f.flush()
+                os.fsync(f.fileno())
+
+            upload.chunk_hashes.append(digest)
+            upload.received_chunks += 1
+            upload.received_bytes += size
+            upload.save(update_fields=["chunk_hashes", "received_chunks", "received_bytes", "updated_at"])
+    finally:
+        os.remove(path)
+    return upload
+
+
+def finalize(upload_id):
+    with transaction.atomic():
+        upload = _locked(upload_id)
+        if upload.status == TutorialUpload.Status.COMPLETE:
+            return upload
+        if upload.status == TutorialUpload.Status.FAILED:
+            raise UploadError("Загрузка отклонена, начните заново", status=409)
+        if upload.received_bytes != upload.total_size:
+            raise UploadError("Загружены не все части", status=409, next_chunk=upload.received_chunks)
+
+        path = staging_path(upload)
+        if upload.sha256:
+            with open(path, "rb") as f:
+                digest, _ = _hash_stream(f, upload.total_size)
+            if digest != upload.sha256:
+                upload.status = TutorialUpload.Status.FAILED
+                upload.save(update_fields=["status", "updated_at"])
+        if upload.status != TutorialUpload.Status.FAILED:
+            _commit_tutorial(upload, path)
+    os.remove(path)
+    if upload.status == TutorialUpload.Status.FAILED:
+        raise UploadError("Контрольная сумма файла не совпала", status=422)
+    return upload
+
+
+def _commit_tutorial(upload, path):
+    tutorial = upload.tutorial or VideoTutorial(name=upload.name, description=upload.description)
+    with open(path, "rb") as f:
+        tutorial.video.save(upload.filename, File(f), save=False)
+    if upload.tutorial is not None:
+        tutorial.name = upload.name or tutorial.name
+        tutorial.description = upload.description or tutorial.description
+    tutorial.save()
+
+    upload.tutorial = tutorial
+    upload.status = TutorialUpload.Status.COMPLETE
+    upload.save(update_fields=["tutorial", "status", "updated_at"])
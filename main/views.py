@@ -1,9 +1,17 @@
 # views.py
+import os
+import random
+import uuid
+import zipfile
 from datetime import timedelta
 from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Count
 from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets, generics, permissions, response, decorators, status, views
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.views import APIView
@@ -16,22 +24,24 @@ from rest_framework import exceptions as rest_exceptions
 from django.contrib.auth import get_user_model
 
 from .models import (
-    WorkerProfile, Case, Layer, Question, Pathology, Scheme, PathologyImage, Answer, TestResult, UserTestAnswer,
-    VideoTutorial
+    WorkerProfile, Case, Layer, Question, Pathology, Scheme, PathologyImage, TestResult,
+    VideoTutorial, SearchDocument, TutorialUpload, AtlasChange, pack_ids
 )
 from .serializers import (
     AccountSerializer, WorkerRegistrationSerializer, AdminRegistrationSerializer, SuperAdminRegistrationSerializer,
     WorkerProfileSerializer, CaseSerializer, LayerSerializer, QuestionSerializer,
     PathologySerializer, SchemeSerializer, PathologyImageSerializer,
     TestSubmissionSerializer, TestResultSerializer, PathologyListSerializer, ClinicalCaseInfoSerializer,
-    PathologyDetailInfoSerializer, CaseDetailInfoSerializer, TestTaskSerializer, CaseSubmissionSerializer,
+    PathologyDetailInfoSerializer, PathologyMoveSerializer, LayerOrderSerializer, CaseDetailInfoSerializer, TestTaskSerializer, CaseSubmissionSerializer,
     TestSubmissionWrapperSerializer, UserProfileSerializer, UserTryInfoSerializer, HistoryTaskSerializer,
     VideoTutorialSerializer, TutorialListSerializer, TutorialDetailSerializer, TutorialCreateSerializer,
     TutorialDeleteSerializer, TestListSerializer, PathologyInfoSerializer, TutorialUpdateSerializer,
     SchemeUpdateSerializer, LayerUpdateSerializer, CaseUpdateSerializer,
-    CaseFullUpdateSerializer
+    CaseFullUpdateSerializer, TutorialUploadInitSerializer, TutorialUploadSerializer
 )
 from .permissions import IsSuperAdmin, IsAdminOrSuperAdmin,IsAdminOrAuthenticatedReadOnly
+from .parsers import OctetStreamParser
+from . import atlas_bundle, atlas_sync, instrumentation, local_cache, metrics, partitions, response_cache, search, uploads
 
 
 
@@ -324,34 +334,24 @@ class SubmitTestView(views.APIView):
             grade = "Неудовлетворительно"
 
         # Определение патологии (для статистики)
-        first_case = get_object_or_404(Case, pk=case_ids[0])
-        pathology = first_case.pathology
+        pathology_id = local_cache.pathology_of_case(case_ids[0])
+        if pathology_id is None:
+            # Кейс мог появиться после загрузки набора
+            pathology_id = get_object_or_404(Case, pk=case_ids[0]).pathology_id
+        # Сохраняются только ответы на вопросы этого теста
+        known_answer_ids = {ans.id for question in questions_qs for ans in question.answers.all()}
         test_result = TestResult.objects.create(
             user=request.user,
-            pathology=pathology,
+            pathology_id=pathology_id,
             score=user_score,
             max_score=max_score,
             percentage=percentage,
             grade=grade,
-            time_spent=timedelta(seconds=duration_seconds)
+            time_spent=timedelta(seconds=duration_seconds),
+            case_ids_packed=pack_ids(dict.fromkeys(case_ids)),
+            answer_ids_packed=pack_ids(sorted(known_answer_ids.intersection(user_selected_ids_flat))),
         )
 
-
-        test_result.cases.set(case_ids)
-
-        if user_selected_ids_flat:
-            selected_answers_objs = Answer.objects.filter(id__in=user_selected_ids_flat)
-            user_test_answers = []
-            for ans_obj in selected_answers_objs:
-                user_test_answers.append(
-                    UserTestAnswer(
-                        test_result=test_result,
-                        question=ans_obj.question,
-                        answer=ans_obj
-                    )
-                )
-            UserTestAnswer.objects.bulk_create(user_test_answers)
-
         user_id = request.user.id
 
         active_key_pointer = f"user_{user_id}_current_test_key"
@@ -360,48 +360,176 @@ class SubmitTestView(views.APIView):
         if actual_cache_key:
             cache.delete(actual_cache_key)
             cache.delete(active_key_pointer)
+        metrics.test_submitted(user_id)
 
         return_serializer = TestResultSerializer(test_result)
         return response.Response(return_serializer.data, status=status.HTTP_201_CREATED)
 
+# Ответы каталога и карточек атласа одинаковы для всех пользователей и отдаются
+# из response_cache: уже отрендеренными и сжатыми
+# read_replica = True — GET-запросы к представлению читают с реплики (db_router.py)
 class PathologyListInfoView(generics.ListAPIView):
     queryset = Pathology.objects.all()
     serializer_class = PathologyListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def list(self, request, *args, **kwargs):
+        return response_cache.cached_response(request, 'atlas-list', self.build)
+
+    def build(self):
         queryset = self.filter_queryset(self.get_queryset())
 
         queryset = queryset.annotate(
             images_count=Count('images')
         ).filter(
             images_count__gt=0
-        ).order_by('number')
+        ).order_by('rank', 'id')
 
         serializer = self.get_serializer(queryset, many=True)
 
-        return response.Response({
+        return {
             "items": serializer.data
-        })
+        }
 
 class AdminPathologyListInfoView(generics.ListAPIView):
     queryset = Pathology.objects.all()
     serializer_class = PathologyListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def list(self, request, *args, **kwargs):
+        return response_cache.cached_response(request, 'admin-atlas-list', self.build)
+
+    def build(self):
         queryset = self.filter_queryset(self.get_queryset())
-        queryset = queryset.order_by('number')
+        queryset = queryset.order_by('rank', 'id')
 
         serializer = self.get_serializer(queryset, many=True)
 
-        return response.Response({
+        return {
             "items": serializer.data
+        }
+
+# Весь атлас одним документом: патологии, фото, кейсы, слои и схемы. С ?since=<version>
+# только изменения после этой версии и id удаленных объектов (см. atlas_sync.py)
+class AtlasSnapshotView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
+
+    def get(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = atlas_sync.parse_version(since)
+            except ValueError:
+                return response.Response(
+                    {"detail": "since должен быть неотрицательным целым числом"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        return response_cache.cached_response(
+            request, 'atlas-snapshot', lambda: atlas_sync.snapshot(request, since),
+            'full' if since is None else since
+        )
+
+# ПЕРЕНОС АТЛАСА (архивы export_atlas / import_atlas)
+
+# GET ?pathologies=1,2 — архив отдается потоком, не собираясь в памяти
+class AtlasExportView(APIView):
+    permission_classes = [IsAdminOrSuperAdmin]
+
+    def get(self, request, *args, **kwargs):
+        raw_ids = request.query_params.get('pathologies', '')
+        try:
+            pathology_ids = [int(pk) for pk in raw_ids.split(',') if pk]
+        except ValueError:
+            return response.Response({"error": "pathologies: ID через запятую"}, status=status.HTTP_400_BAD_REQUEST)
+
+        res = StreamingHttpResponse(atlas_bundle.stream_bundle(pathology_ids or None), content_type='application/zip')
+        res['Content-Disposition'] = f'attachment; filename="atlas-{timezone.now():%Y%m%d-%H%M}.zip"'
+        return res
+
+# POST multipart с полем bundle. Повторная загрузка того же архива продолжит прерванный импорт
+class AtlasImportView(APIView):
+    permission_classes = [IsAdminOrSuperAdmin]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('bundle')
+        if upload is None:
+            return response.Response({"error": "Нужен файл bundle"}, status=status.HTTP_400_BAD_REQUEST)
+
+        os.makedirs(settings.ATLAS_BUNDLE_DIR, exist_ok=True)
+        path = os.path.join(settings.ATLAS_BUNDLE_DIR, f"upload-{uuid.uuid4().hex}.zip")
+        with open(path, 'wb') as f:
+            for chunk in upload.chunks():
+                f.write(chunk)
+        try:
+            created = atlas_bundle.import_bundle(path, log=lambda *args: None)
+        except (atlas_bundle.BundleError, zipfile.BadZipFile) as exc:
+            return response.Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            os.remove(path)
+        return response.Response({"created": created}, status=status.HTTP_201_CREATED)
+
+
+# ПОИСК
+
+SEARCH_MAX_LIMIT = 50
+
+# Полнотекстовый поиск по атласу: ?q=текст&kind=pathology,case&limit=20
+class SearchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
+
+    def get(self, request, *args, **kwargs):
+        kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind]
+        unknown = set(kinds) - set(SearchDocument.Kind.values)
+        if unknown:
+            return response.Response({"error": f"Неизвестный тип: {', '.join(sorted(unknown))}"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return response.Response({"error": "limit должен быть положительным числом"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, SEARCH_MAX_LIMIT)
+
+        return response.Response({
+            "items": search.search(request.query_params.get('q', ''), kinds=kinds, limit=limit)
+        })
+
+# Подсказки по началу слов: ?q=кольп
+class SearchAutocompleteView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
+
+    def get(self, request, *args, **kwargs):
+        return response.Response({
+            "items": search.autocomplete(request.query_params.get('q', ''))
         })
 
+# Перемещение патологии на другую позицию в атласе. Меняется только ее ранг,
+# номера остальных патологий выравниваются в фоне (см. ordering.py)
+class PathologyMoveView(APIView):
+    permission_classes = [IsAdminOrSuperAdmin]
+
+    def post(self, request, id, *args, **kwargs):
+        pathology = get_object_or_404(Pathology, id=id)
+        serializer = PathologyMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            pathology.move_to(serializer.validated_data['position'])
+
+        return response.Response(PathologyListSerializer(pathology).data)
+
 class TestListInfoView(generics.ListAPIView):
     serializer_class = TestListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def get_queryset(self):
         # Возвращаем только патологии с кейсами
@@ -409,19 +537,23 @@ class TestListInfoView(generics.ListAPIView):
             cases_count=Count('cases')
         ).filter(
             cases_count__gt=0
-        ).order_by('number')
+        ).order_by('rank', 'id')
 
     def list(self, request, *args, **kwargs):
+        return response_cache.cached_response(request, 'test-list', self.build)
+
+    def build(self):
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
-        return response.Response({
+        return {
             "items": serializer.data
-        })
+        }
 
 
 class ClinicalCaseListView(generics.ListAPIView):
     serializer_class = ClinicalCaseInfoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def get_queryset(self):
         return Pathology.objects.annotate(
@@ -431,32 +563,48 @@ class ClinicalCaseListView(generics.ListAPIView):
         ).prefetch_related("cases")
 
     def list(self, request, *args, **kwargs):
+        return response_cache.cached_response(request, 'clinical-cases', self.build)
+
+    def build(self):
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
-        return response.Response({
+        return {
             "items": serializer.data
-        })
+        }
 
 
 class PathologyDetailView(generics.RetrieveAPIView):
     queryset = Pathology.objects.prefetch_related("images").all()
     serializer_class = PathologyDetailInfoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
     lookup_field = 'id'
 
+    def retrieve(self, request, *args, **kwargs):
+        return response_cache.cached_response(
+            request, 'pathology-detail', lambda: self.get_serializer(self.get_object()).data, kwargs['id']
+        )
+
 
 class CaseDetailInfoView(generics.RetrieveAPIView):
     queryset = Case.objects.prefetch_related('layers', 'schemes').all()
     serializer_class = CaseDetailInfoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
     lookup_field = 'id'
 
-TEST_CACHE_TIMEOUT = 60 * 10
+    def retrieve(self, request, *args, **kwargs):
+        return response_cache.cached_response(
+            request, 'case-detail', lambda: self.get_serializer(self.get_object()).data, kwargs['id']
+        )
+
+TEST_CACHE_TIMEOUT = settings.TEST_SESSION_TIMEOUT
 class GetTestTasksView(generics.ListAPIView):
     serializer_class = TestTaskSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
-    def get_queryset(self):
+    def get_case_ids(self):
         pathology_ids_str = self.kwargs.get('pathology_ids', '')
         user_id = self.request.user.id
 
@@ -467,9 +615,7 @@ class GetTestTasksView(generics.ListAPIView):
 
         if saved_case_ids:
 
-            return Case.objects.filter(id__in=saved_case_ids).prefetch_related(
-                'layers', 'schemes', 'questions', 'questions__answers'
-            )
+            return saved_case_ids
 
         try:
             pathology_ids = [int(x) for x in pathology_ids_str.split('-') if x.isdigit()]
@@ -477,30 +623,49 @@ class GetTestTasksView(generics.ListAPIView):
             pathology_ids = []
 
         if not pathology_ids:
-            return Case.objects.none()
+            return []
 
         final_case_ids = []
+        cases_by_pathology = local_cache.case_ids_by_pathology()
         for p_id in pathology_ids:
             # 4 случайных кейса
-            random_cases = Case.objects.filter(pathology_id=p_id).values_list('id', flat=True).order_by('?')[:4]
-            final_case_ids.extend([int(c_id) for c_id in random_cases])
+            case_ids = cases_by_pathology.get(p_id, [])
+            final_case_ids.extend(random.sample(case_ids, min(4, len(case_ids))))
 
 
         cache.set(cache_key, final_case_ids, timeout=TEST_CACHE_TIMEOUT)
         active_key_pointer = f"user_{user_id}_current_test_key"
         cache.set(active_key_pointer, cache_key, timeout=TEST_CACHE_TIMEOUT)
+        metrics.test_session_started(user_id)
+
+        return final_case_ids
 
-        return Case.objects.filter(id__in=final_case_ids).prefetch_related(
+    def get_queryset(self):
+        return Case.objects.filter(id__in=self.get_case_ids()).prefetch_related(
             'layers', 'schemes', 'questions', 'questions__answers'
         )
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        # Кейс в тесте одинаков для всех: его данные собираются один раз на поколение атласа
+        # (response_cache + singleflight), даже если тест открывают сотни студентов сразу
+        items = []
+        for case_id in sorted(self.get_case_ids()):
+            data = self.cached_task(request, case_id)
+            if data is not None:
+                items.append(data)
         return response.Response({
-            "items": serializer.data
+            "items": items
         })
 
+    def cached_task(self, request, case_id):
+        return response_cache.cached_data(request, 'test-task', lambda: self.build_task(case_id), case_id)
+
+    def build_task(self, case_id):
+        case = Case.objects.filter(id=case_id).prefetch_related(
+            'layers', 'schemes', 'questions', 'questions__answers'
+        ).first()
+        return self.get_serializer(case).data if case else None
+
 
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserProfileSerializer
@@ -514,9 +679,14 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 class UserTestHistoryView(generics.ListAPIView):
     serializer_class = UserTryInfoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def get_queryset(self):
-        return TestResult.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = TestResult.objects.filter(user=self.request.user)
+        # Без ?all=1 — только последние TEST_HISTORY_MONTHS месяцев (старые секции не читаются)
+        if self.request.query_params.get('all') != '1':
+            queryset = queryset.filter(created_at__gte=partitions.history_cutoff())
+        return queryset.order_by('-created_at')
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
@@ -528,16 +698,15 @@ class UserTestHistoryView(generics.ListAPIView):
 
 class TestResultHistoryView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def get(self, request, *args, **kwargs):
         id = kwargs.get('id')
         test_result = get_object_or_404(TestResult, id=id, user=request.user)
 
-        selected_answer_ids = set(
-            test_result.user_answers.values_list('answer_id', flat=True)
-        )
+        selected_answer_ids = test_result.selected_answer_ids
 
-        cases = test_result.cases.all().prefetch_related(
+        cases = Case.objects.filter(id__in=test_result.case_ids).prefetch_related(
             'layers',
             'schemes',
             'questions',
@@ -563,15 +732,19 @@ class TutorialListView(generics.ListAPIView):
     queryset = VideoTutorial.objects.all()
     serializer_class = TutorialListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def list(self, request, *args, **kwargs):
+        return response_cache.cached_response(request, 'tutorials', self.build)
+
+    def build(self):
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
 
         # Оборачиваем список в ключ "items"
-        return response.Response({
+        return {
             "items": serializer.data
-        })
+        }
 
 
 # Детальная информация о туториале
@@ -579,8 +752,17 @@ class TutorialDetailView(generics.RetrieveAPIView):
     queryset = VideoTutorial.objects.all()
     serializer_class = TutorialDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
     lookup_field = 'id'
 
+    def get_object(self):
+        # Туториалы читаются из памяти воркера (local_cache.py)
+        tutorial = local_cache.tutorial(self.kwargs['id'])
+        if tutorial is None:
+            return super().get_object()
+        self.check_object_permissions(self.request, tutorial)
+        return tutorial
+
 
 class TutorialCreateView(generics.CreateAPIView):
     queryset = VideoTutorial.objects.all()
@@ -602,6 +784,73 @@ class TutorialUpdateView(generics.UpdateAPIView):
     lookup_field = 'id'
 
 
+# ЗАГРУЗКА ВИДЕО ПО ЧАСТЯМ (uploads.py)
+
+def upload_error_response(exc):
+    return response.Response({"error": str(exc), **exc.extra}, status=exc.status)
+
+
+# Начало загрузки: {"filename", "size", "sha256"?, "tutorial"? , "name", "description"}
+class TutorialUploadInitView(APIView):
+    permission_classes = [IsAdminOrSuperAdmin]
+
+    def post(self, request, *args, **kwargs):
+        serializer = TutorialUploadInitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            upload = uploads.start_upload(
+                request.user, data['filename'], data['size'], name=data['name'],
+                description=data['description'], sha256=data['sha256'], tutorial=data.get('tutorial'),
+            )
+        except uploads.UploadError as exc:
+            return upload_error_response(exc)
+        return response.Response(TutorialUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+
+# Состояние загрузки: с какой части продолжать после обрыва
+class TutorialUploadStatusView(APIView):
+    permission_classes = [IsAdminOrSuperAdmin]
+
+    def get(self, request, upload_id, *args, **kwargs):
+        upload = get_object_or_404(TutorialUpload, pk=upload_id, user=request.user)
+        return response.Response(TutorialUploadSerializer(upload).data)
+
+
+# Часть файла: тело application/octet-stream, необязательный заголовок X-Chunk-SHA256
+class TutorialUploadChunkView(APIView):
+    permission_classes = [IsAdminOrSuperAdmin]
+    parser_classes = [OctetStreamParser]
+
+    def put(self, request, upload_id, index, *args, **kwargs):
+        get_object_or_404(TutorialUpload.objects.only('pk'), pk=upload_id, user=request.user)
+        # Пустое тело DRF не передает парсеру: request.data — пустой dict, а не поток
+        if not hasattr(request.data, 'read'):
+            return response.Response({"error": "Нужно тело части (application/octet-stream)"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = uploads.write_chunk(upload_id, index, request.data, sha256=request.headers.get('X-Chunk-SHA256'))
+        except uploads.UploadError as exc:
+            return upload_error_response(exc)
+        return response.Response(TutorialUploadSerializer(upload).data)
+
+
+# Завершение: файл переносится в media, создается или обновляется туториал
+class TutorialUploadFinalizeView(APIView):
+    permission_classes = [IsAdminOrSuperAdmin]
+
+    def post(self, request, upload_id, *args, **kwargs):
+        get_object_or_404(TutorialUpload.objects.only('pk'), pk=upload_id, user=request.user)
+        try:
+            upload = uploads.finalize(upload_id)
+        except uploads.UploadError as exc:
+            return upload_error_response(exc)
+        return response.Response(
+            TutorialDetailSerializer(upload.tutorial, context={'request': request}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
 # Редактирование самого кейса (Названия)
 class CaseUpdateView(generics.UpdateAPIView):
     queryset = Case.objects.all()
@@ -609,6 +858,24 @@ class CaseUpdateView(generics.UpdateAPIView):
     permission_classes = [IsAdminOrSuperAdmin]
     lookup_field = 'id'
 
+# Новый порядок слоев кейса: {"layers": [id, id, ...]}. Применяется одним UPDATE,
+# в ответе те же данные, что отдает case-detail-info
+class CaseLayersReorderView(APIView):
+    permission_classes = [IsAdminOrSuperAdmin]
+
+    def post(self, request, id, *args, **kwargs):
+        case = get_object_or_404(Case.objects.prefetch_related('layers', 'schemes'), id=id)
+        serializer = LayerOrderSerializer(data=request.data, context={'case': case})
+        serializer.is_valid(raise_exception=True)
+
+        layers = case.reorder_layers(serializer.validated_data['layers'])
+        # UPDATE без сигналов; заголовки слоев в поиске — «Слой N»
+        atlas_sync.record(AtlasChange.Kind.LAYER, serializer.validated_data['layers'])
+        search.index_objects(layers)
+        response_cache.invalidate_on_change()
+
+        return response.Response(CaseDetailInfoSerializer(case, context={'request': request}).data)
+
 # Редактирование конкретного слоя
 class LayerUpdateView(generics.UpdateAPIView):
     queryset = Layer.objects.all()
@@ -628,3 +895,33 @@ class CaseQuestionsUpdateView(generics.RetrieveUpdateAPIView):
     serializer_class = CaseFullUpdateSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'id'
+
+
+# МОНИТОРИНГ
+
+class RequestMetricsView(views.APIView):
+    permission_classes = [IsAdminOrSuperAdmin]
+
+    def get(self, request, *args, **kwargs):
+        return response.Response({
+            "pid": os.getpid(),
+            "items": instrumentation.registry.snapshot()
+        })
+
+    def delete(self, request, *args, **kwargs):
+        instrumentation.registry.reset()
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Prometheus. Требуется заголовок "Authorization: Bearer <METRICS_TOKEN>"; без токена
+# эндпоинт есть только при DEBUG
+@require_GET
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token and not settings.DEBUG:
+        raise Http404
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+
+    payload, content_type = metrics.render_latest()
+    return HttpResponse(payload, content_type=content_type)